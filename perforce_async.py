@@ -0,0 +1,288 @@
+# Asyncio access to the perforce schema on PostgreSQL, through an asyncpg pool.
+#
+# asyncpg is an optional dependency (pip install asyncpg), needed only by
+# this module; the rest of the package runs without it.
+#
+#   async with AsyncDatabase('postgresql://p4:...@db/p4') as db:
+#       trace = await AsyncCorrelation(db).trace('abc123')
+#
+# SQLAlchemy 1.3 has no asyncio support, so statements are still built with
+# the model classes and compiled once by the PostgreSQL dialect, with $n
+# placeholders, into SQL that asyncpg prepares and caches per connection.
+# A query is a Query(stmt) holding that SQL and the order of its bind
+# parameters; run it with keyword values through AsyncDatabase.fetch*.
+# Records come back as asyncpg Records (mapping and tuple access); json and
+# jsonb columns are decoded. Expanding IN parameters are not supported: pass
+# arrays with `column == any_(bindparam('values'))` instead.
+#
+# AsyncCorrelation.trace() follows one command to its change, files,
+# description and submitter, running the lookups that do not depend on each
+# other concurrently on separate pooled connections. load_test() compares it
+# with the same lookups on a thread per request through the sync engine.
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects.postgresql.base import PGCompiler, PGDialect
+
+from perforce_log_model import CommandChange, CommandEvents
+from perforce_model import Change, Desc, Rev, User
+
+try:
+    import asyncpg
+except ImportError:  # optional dependency
+    asyncpg = None
+
+
+class _DollarCompiler(PGCompiler):
+    # ':[_POSITION]' from the numeric paramstyle becomes '$[_POSITION]',
+    # which the compiler then numbers in order
+    def bindparam_string(self, name, **kw):
+        return '$' + super(_DollarCompiler, self).bindparam_string(name, **kw)[1:]
+
+
+class _AsyncpgDialect(PGDialect):
+    statement_compiler = _DollarCompiler
+
+
+_dialect = _AsyncpgDialect(paramstyle='numeric')
+
+
+class Query(object):
+    def __init__(self, stmt):
+        compiled = stmt.compile(dialect=_dialect)
+        if compiled.contains_expanding_parameters:
+            raise ValueError('expanding IN parameters are not supported; use any_()')
+        self.stmt = stmt
+        self.sql = compiled.string
+        self.names = list(compiled.positiontup)
+        self.defaults = compiled.params
+
+    def args(self, params):
+        values = dict(self.defaults, **params) if params else self.defaults
+        return [values[name] for name in self.names]
+
+
+def _dsn(url):
+    # postgresql+psycopg2://... -> postgresql://...
+    scheme, rest = str(url).split('://', 1)
+    return scheme.split('+', 1)[0] + '://' + rest
+
+
+class AsyncDatabase(object):
+    def __init__(self, url, min_size=4, max_size=32, statement_cache_size=1024):
+        if asyncpg is None:
+            raise RuntimeError('asyncpg is required for async access (pip install asyncpg)')
+        self.dsn = _dsn(url)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.pool = None
+
+    @staticmethod
+    async def _init(conn):
+        for name in ('json', 'jsonb'):
+            await conn.set_type_codec(name, encoder=json.dumps, decoder=json.loads,
+                                      schema='pg_catalog')
+
+    async def open(self):
+        if self.pool is None:
+            self.pool = await asyncpg.create_pool(
+                self.dsn, min_size=self.min_size, max_size=self.max_size, init=self._init,
+                statement_cache_size=self.statement_cache_size)
+        return self
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def fetch(self, query, **params):
+        return await self.pool.fetch(query.sql, *query.args(params))
+
+    async def fetchrow(self, query, **params):
+        return await self.pool.fetchrow(query.sql, *query.args(params))
+
+    async def fetchval(self, query, **params):
+        return await self.pool.fetchval(query.sql, *query.args(params))
+
+
+# The statements of a trace, shared by the async and threaded paths
+QUERIES = OrderedDict([
+    ('command', Query(select([
+        CommandEvents.cmdident, CommandEvents.user_name, CommandEvents.client,
+        CommandEvents.func, CommandEvents.host, CommandEvents.serverid, CommandEvents.args,
+        CommandEvents.command_start_timestamp, CommandEvents.command_end_timestamp,
+        CommandEvents.lapse_ms, CommandEvents.is_complete]).where(
+            CommandEvents.cmdident == bindparam('cmdident')))),
+    ('command_change', Query(select([
+        CommandChange.change, CommandChange.file_count, CommandChange.total_bytes,
+        CommandChange.source]).where(CommandChange.cmdident == bindparam('cmdident')))),
+    ('change', Query(select([
+        Change.change, Change.descKey, Change.client, Change.user, Change.date, Change.status,
+        Change.stream]).where(Change.change == bindparam('change')))),
+    ('files', Query(select([Rev.depotFile, Rev.depotRev, Rev.action, Rev.type, Rev.size]).where(
+        Rev.change == bindparam('change')).order_by(Rev.depotFile).limit(bindparam('limit')))),
+    ('desc', Query(select([Desc.description]).where(Desc.descKey == bindparam('descKey')))),
+    ('user', Query(select([User.user, User.email, User.fullName]).where(
+        User.user == bindparam('user')))),
+])
+
+
+def _dict(row):
+    return OrderedDict(row.items()) if row is not None else None
+
+
+class AsyncCorrelation(object):
+    def __init__(self, db, max_files=1000):
+        self.db = db
+        self.max_files = max_files
+
+    # command -> (command_change) -> change + files -> desc + user
+    async def trace(self, cmdident):
+        db = self.db
+        command, resolved = await asyncio.gather(
+            db.fetchrow(QUERIES['command'], cmdident=cmdident),
+            db.fetchrow(QUERIES['command_change'], cmdident=cmdident))
+        trace = OrderedDict([('cmdident', cmdident), ('command', _dict(command)),
+                             ('resolution', _dict(resolved))])
+        if resolved is None or resolved['change'] is None:
+            return trace
+        change, files = await asyncio.gather(
+            db.fetchrow(QUERIES['change'], change=resolved['change']),
+            db.fetch(QUERIES['files'], change=resolved['change'], limit=self.max_files))
+        trace['change'] = _dict(change)
+        trace['files'] = [_dict(f) for f in files]
+        if change is not None:
+            description, user = await asyncio.gather(
+                db.fetchval(QUERIES['desc'], descKey=change['descKey']),
+                db.fetchrow(QUERIES['user'], user=change['user']))
+            trace['change']['description'] = description
+            trace['user'] = _dict(user)
+        return trace
+
+    # Many traces at once, at most `concurrency` in flight
+    async def trace_many(self, cmdidents, concurrency=64):
+        gate = asyncio.Semaphore(concurrency)
+
+        async def one(ident):
+            async with gate:
+                return await self.trace(ident)
+        return await asyncio.gather(*[one(i) for i in cmdidents])
+
+
+# The same trace, one statement after another on a pooled sync connection
+class SyncCorrelation(object):
+    def __init__(self, engine, max_files=1000):
+        self.engine = engine
+        self.max_files = max_files
+
+    def trace(self, cmdident):
+        def row(conn, name, **params):
+            return _dict(conn.execute(QUERIES[name].stmt, params).first())
+
+        with self.engine.connect() as conn:
+            trace = OrderedDict([('cmdident', cmdident),
+                                 ('command', row(conn, 'command', cmdident=cmdident)),
+                                 ('resolution', row(conn, 'command_change', cmdident=cmdident))])
+            resolved = trace['resolution']
+            if resolved is None or resolved['change'] is None:
+                return trace
+            change = trace['change'] = row(conn, 'change', change=resolved['change'])
+            trace['files'] = [_dict(f) for f in conn.execute(QUERIES['files'].stmt, {
+                'change': resolved['change'], 'limit': self.max_files})]
+            if change is not None:
+                change['description'] = conn.execute(
+                    QUERIES['desc'].stmt, {'descKey': change['descKey']}).scalar()
+                trace['user'] = row(conn, 'user', user=change['user'])
+        return trace
+
+
+def _latency(timings, elapsed):
+    timings = sorted(timings)
+    n = len(timings)
+    return OrderedDict([
+        ('requests', n),
+        ('requests_per_sec', round(n / elapsed, 1) if elapsed else None),
+        ('p50_ms', round(timings[n // 2] * 1000, 2) if n else None),
+        ('p99_ms', round(timings[min(n - 1, int(n * 0.99))] * 1000, 2) if n else None),
+    ])
+
+
+# requests traces over the resolved commands, async vs thread per request
+def load_test(url, requests=5000, concurrency=64, sample=1000):
+    from perforce_model import create_engine
+
+    engine = create_engine(url, pool_size=concurrency, max_overflow=0)
+    with engine.connect() as conn:
+        idents = [r[0] for r in conn.execute(select([CommandChange.cmdident]).limit(sample))]
+    if not idents:
+        raise SystemExit('perforce.command_change is empty; load or bench some commands first')
+    work = [idents[i % len(idents)] for i in range(requests)]
+
+    sync = SyncCorrelation(engine)
+    timings = []
+    lock = threading.Lock()
+
+    def timed(ident):
+        t0 = time.perf_counter()
+        sync.trace(ident)
+        with lock:
+            timings.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(timed, work))
+    threaded = _latency(timings, time.perf_counter() - started)
+    engine.dispose()
+
+    async def run_async():
+        async with AsyncDatabase(url, min_size=concurrency, max_size=concurrency) as db:
+            correlation = AsyncCorrelation(db)
+            gate = asyncio.Semaphore(concurrency)
+            found = []
+
+            async def one(ident):
+                async with gate:
+                    t0 = time.perf_counter()
+                    await correlation.trace(ident)
+                    found.append(time.perf_counter() - t0)
+
+            await correlation.trace(work[0])
+            t0 = time.perf_counter()
+            await asyncio.gather(*[one(i) for i in work])
+            return _latency(found, time.perf_counter() - t0)
+
+    return OrderedDict([('concurrency', concurrency), ('threads', threaded),
+                        ('asyncio', asyncio.run(run_async()))])
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Trace commands through asyncpg')
+    parser.add_argument('url')
+    parser.add_argument('cmdidents', nargs='*')
+    parser.add_argument('--load-test', action='store_true',
+                        help='compare asyncio and thread-per-request throughput')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    args = parser.parse_args()
+
+    if args.load_test:
+        print(json.dumps(load_test(args.url, args.requests, args.concurrency), indent=2))
+    else:
+        async def main():
+            async with AsyncDatabase(args.url) as db:
+                return await AsyncCorrelation(db).trace_many(args.cmdidents)
+        print(json.dumps(asyncio.run(main()), indent=2, default=str))
@@ -0,0 +1,422 @@
+# Benchmark harness for the perforce schema on synthetic depots.
+#
+#   python perforce_bench.py sqlite:////tmp/bench.db --files 20000 --out a.json
+#   python perforce_bench.py postgresql://localhost/bench --reset --out b.json
+#   python perforce_bench.py --compare a.json b.json
+#   python perforce_bench.py --imports          # cold import times only
+#
+# A seeded generator fills change/desc/rev/revcx/have/working/integed/storage
+# (plus user, command_events and command_change for the log-side chain) with
+# skewed, depot-like distributions, then times the canonical queries from the
+# READMEs. Results are written as JSON so runs can be compared across commits.
+# Cold import times of the model module, each in a fresh interpreter, are
+# recorded alongside since short-lived tools pay them on every run.
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+import sqlalchemy
+from sqlalchemy import and_, func, select, text
+
+from perforce_journal import journal_columns
+from perforce_loader import BatchWriter
+from perforce_log_model import CommandChange, CommandEvents
+from perforce_model import (Base, Change, Desc, Have, IntegEd, Rev, Revcx, Storage, User,
+                            Working, create_engine)
+
+POPULATED = (User, Change, Desc, Rev, Revcx, Have, Working, IntegEd, Storage,
+             CommandEvents, CommandChange)
+
+DEFAULTS = OrderedDict([
+    ('users', 200),
+    ('changes', 20000),
+    ('files', 50000),
+    ('revs_per_file', 4),
+    ('clients', 100),
+    ('branch_ratio', 0.3),
+    ('seed', 1),
+])
+
+EPOCH = 1700000000
+
+
+class Generator(object):
+    def __init__(self, users, changes, files, revs_per_file, clients, branch_ratio, seed):
+        self.rnd = random.Random(seed)
+        self.users = ['user%04d' % i for i in range(users)]
+        self.changes = changes
+        self.files = files
+        self.revs_per_file = revs_per_file
+        self.clients = ['ws%04d' % i for i in range(clients)]
+        self.branch_ratio = branch_ratio
+        self.dirs = ['//depot/main/%s/%s' % (a, b)
+                     for a in ('src', 'lib', 'tools', 'docs', 'assets')
+                     for b in range(max(1, files // 500))]
+        self.heads = {}
+        self.revs = []
+
+    def _user(self):
+        # a few heavy committers and a long tail
+        return self.users[min(len(self.users) - 1, int(self.rnd.paretovariate(1.2)) - 1)]
+
+    def _size(self):
+        return int(self.rnd.lognormvariate(9, 1.8))
+
+    def users_rows(self):
+        for u in self.users:
+            yield {'user': u, 'email': u + '@example.com', 'fullName': u, 'type': 'standard',
+                   'updateDate': EPOCH, 'accessDate': EPOCH}
+
+    # Every file gets 1..2*revs_per_file revisions; change numbers increase
+    # with time and a change touches a Pareto-distributed number of files.
+    def rev_rows(self):
+        rnd = self.rnd
+        paths = ['%s/file%06d.c' % (rnd.choice(self.dirs), i) for i in range(self.files)]
+        events = []
+        for path in paths:
+            for rev in range(1, rnd.randint(1, 2 * self.revs_per_file) + 1):
+                events.append((rnd.random(), path, rev))
+        events.sort()
+        per_change = max(1, len(events) // self.changes)
+        change = 1
+        seen = {}
+        last = {}
+        for i, (_, path, _) in enumerate(events):
+            if i and i % per_change == 0 and change < self.changes:
+                change += 1
+            # a change holds at most one revision of a file
+            if last.get(path) == change:
+                continue
+            last[path] = change
+            rev = seen.get(path, 0) + 1
+            seen[path] = rev
+            action = 'add' if rev == 1 else rnd.choice(('edit',) * 8 + ('integrate', 'delete'))
+            size = self._size()
+            row = {
+                'depotFile': path, 'depotRev': rev, 'type': 'text', 'action': action,
+                'change': change, 'date': EPOCH + change * 60, 'modTime': EPOCH + change * 60,
+                'digest': '%032X' % rnd.getrandbits(128), 'size': size, 'traitLot': 0,
+                'lbrIsLazy': '0', 'lbrFile': path, 'lbrRev': '1.%d' % change, 'lbrType': 'text',
+            }
+            self.heads[path] = row
+            self.revs.append((path, rev, change, action, size))
+            yield row
+        self.changes = change
+
+    def change_rows(self):
+        for change in range(1, self.changes + 1):
+            user = self._user()
+            yield {'change': change, 'descKey': change, 'client': 'ws_' + user, 'user': user,
+                   'date': EPOCH + change * 60, 'status': 'submitted',
+                   'description': 'change %d' % change, 'update': EPOCH + change * 60}
+
+    def desc_rows(self):
+        for change in range(1, self.changes + 1):
+            yield {'descKey': change, 'description': 'fix for issue %d\n' % self.rnd.randint(1, 10 ** 5)}
+
+    def revcx_rows(self):
+        for path, rev, change, action, _ in self.revs:
+            yield {'change': change, 'depotFile': path, 'depotRev': rev, 'action': action}
+
+    def storage_rows(self):
+        for path, rev, change, _, size in self.revs:
+            yield {'file': path, 'rev': '1.%d' % change, 'type': 'text', 'refCount': 1,
+                   'digest': None, 'size': size, 'serverSize': size // 3, 'compCksum': None,
+                   'date': EPOCH + change * 60}
+
+    # Clients sync a random slice of the depot, mostly at head
+    def have_rows(self):
+        paths = sorted(self.heads)
+        for client in self.clients:
+            start = self.rnd.randrange(len(paths))
+            for path in paths[start:start + self.rnd.randint(1, max(2, len(paths) // 10))]:
+                head = self.heads[path]['depotRev']
+                rev = head if self.rnd.random() < 0.8 else self.rnd.randint(1, head)
+                yield {'clientFile': '//%s/%s' % (client, path[8:]), 'depotFile': path,
+                       'haveRev': rev, 'type': 'text', 'time': EPOCH}
+
+    def working_rows(self):
+        paths = sorted(self.heads)
+        for client in self.clients:
+            user = self._user()
+            for path in self.rnd.sample(paths, min(len(paths), self.rnd.randint(0, 50))):
+                head = self.heads[path]['depotRev']
+                yield {'clientFile': '//%s/%s' % (client, path[8:]), 'depotFile': path,
+                       'client': client, 'user': user, 'haveRev': head, 'workRev': head + 1,
+                       'isVirtual': 0, 'type': 'text', 'action': 'edit', 'change': 0,
+                       'modTime': EPOCH, 'isLocked': '0', 'size': 0, 'traitLot': 0}
+
+    # A share of main files is branched to release lines, some re-integrated
+    def integ_rows(self):
+        paths = sorted(self.heads)
+        for path in self.rnd.sample(paths, int(len(paths) * self.branch_ratio)):
+            head = self.heads[path]
+            for n, release in enumerate(('rel1', 'rel2', 'rel3')[:self.rnd.randint(1, 3)]):
+                target = path.replace('//depot/main/', '//depot/%s/' % release)
+                source = path if n == 0 else path.replace('//depot/main/', '//depot/rel%d/' % n)
+                yield {'toFile': target, 'fromFile': source, 'startFromRev': 0,
+                       'endFromRev': head['depotRev'], 'startToRev': 0, 'endToRev': 1,
+                       'how': 'branch from', 'change': head['change']}
+                yield {'toFile': source, 'fromFile': target, 'startFromRev': 0, 'endFromRev': 1,
+                       'startToRev': head['depotRev'] - 1, 'endToRev': head['depotRev'],
+                       'how': 'branch into', 'change': head['change']}
+
+    # One submit per change plus syncs, each CommandEnd with a skewed lapse
+    def command_rows(self):
+        for change in range(1, self.changes + 1):
+            ts = EPOCH + change * 60
+            yield {'cmdident': 'cmd-%d' % change, 'command_start_timestamp': ts - 2,
+                   'command_end_timestamp': ts, 'user_name': self._user(), 'func': 'user-submit',
+                   'host': '10.0.%d.%d' % (change % 7, change % 250), 'serverid': 'commit',
+                   'lapse_ms': int(self.rnd.lognormvariate(6, 1.5)), 'event_count': 3,
+                   'audit_events': [], 'error_events': [], 'is_complete': True,
+                   'last_updated': ts}
+
+    def command_change_rows(self):
+        for change in range(1, self.changes + 1):
+            yield {'cmdident': 'cmd-%d' % change, 'change': change, 'file_count': 1,
+                   'total_bytes': 0, 'source': 'rev', 'updated': EPOCH}
+
+
+def _write(engine, model, rows, batch_size=10000):
+    table = model.__table__
+    columns = journal_columns(table)
+    writer = BatchWriter(engine, table, columns)
+    keys = [c.key for c in columns]
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(tuple(row.get(k) for k in keys))
+        if len(batch) >= batch_size:
+            writer.write(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        writer.write(batch)
+        count += len(batch)
+    return count
+
+
+# JSON columns need the SQLAlchemy bind processing, so they go through Core
+def _insert(engine, model, rows, batch_size=10000):
+    count = 0
+    rows = iter(rows)
+    while True:
+        batch = [r for _, r in zip(range(batch_size), rows)]
+        if not batch:
+            return count
+        with engine.begin() as conn:
+            conn.execute(model.__table__.insert(), batch)
+        count += len(batch)
+
+
+def populate(engine, params):
+    gen = Generator(**params)
+    steps = [
+        (User, gen.users_rows, _write),
+        (Rev, gen.rev_rows, _write),
+        (Change, gen.change_rows, _write),
+        (Desc, gen.desc_rows, _write),
+        (Revcx, gen.revcx_rows, _write),
+        (Storage, gen.storage_rows, _write),
+        (Have, gen.have_rows, _write),
+        (Working, gen.working_rows, _write),
+        (IntegEd, gen.integ_rows, _write),
+        (CommandEvents, gen.command_rows, _insert),
+        (CommandChange, gen.command_change_rows, _insert),
+    ]
+    results = OrderedDict()
+    for model, rows, write in steps:
+        t0 = time.time()
+        count = write(engine, model, rows())
+        seconds = time.time() - t0
+        results[model.__table__.name] = {'rows': count, 'seconds': round(seconds, 3),
+                                         'rows_per_sec': round(count / seconds, 1) if seconds else 0}
+    return gen, results
+
+
+def _queries(gen):
+    rnd = random.Random(7)
+    paths = sorted(gen.heads)
+    branched = sorted(set(p.replace('//depot/main/', '//depot/rel1/') for p in paths))
+    return OrderedDict([
+        ('cmdident_to_change', (
+            lambda: select([Change.change, Change.user, Desc.description, User.email])
+            .select_from(CommandChange.__table__
+                         .join(Change.__table__, Change.change == CommandChange.change)
+                         .join(Desc.__table__, Desc.descKey == Change.descKey)
+                         .join(User.__table__, User.user == Change.user))
+            .where(CommandChange.cmdident == 'cmd-%d' % rnd.randint(1, gen.changes)))),
+        ('audit_rev_to_change', (
+            lambda: (lambda r: select([Change.change, Change.user, Change.description])
+                     .select_from(Rev.__table__.join(Change.__table__, Change.change == Rev.change))
+                     .where(and_(Rev.depotFile == r[0], Rev.depotRev == r[1])))(
+                rnd.choice(gen.revs)))),
+        ('files_in_change', (
+            lambda: select([Rev.depotFile, Rev.depotRev, Rev.action])
+            .where(Rev.change == rnd.randint(1, gen.changes)))),
+        ('files_in_change_revcx', (
+            lambda: select([Revcx.depotFile, Revcx.depotRev])
+            .where(Revcx.change == rnd.randint(1, gen.changes)))),
+        ('client_have_size', (
+            lambda: (lambda c: select([func.count()]).where(and_(
+                Have.clientFile >= '//%s/' % c, Have.clientFile < '//%s0' % c)))(
+                rnd.choice(gen.clients)))),
+        ('integration_history', (
+            lambda: text('''
+                WITH RECURSIVE history(file, depth) AS (
+                    SELECT CAST(:file AS VARCHAR), 0
+                    UNION
+                    SELECT i."fromFile", h.depth + 1 FROM perforce.integed i
+                    JOIN history h ON i."toFile" = h.file
+                    WHERE h.depth < 8 AND i.how LIKE '%from%')
+                SELECT file, depth FROM history''').bindparams(file=rnd.choice(branched)))),
+        ('user_latency_rollup', (
+            lambda: select([CommandEvents.user_name, func.count(), func.avg(CommandEvents.lapse_ms),
+                            func.max(CommandEvents.lapse_ms)])
+            .group_by(CommandEvents.user_name))),
+    ])
+
+
+# Statements timed from interpreter start, each in a fresh process
+IMPORT_SCENARIOS = OrderedDict([
+    ('sqlalchemy', 'import sqlalchemy.orm, sqlalchemy.ext.declarative'),
+    ('perforce_model', 'import perforce_model'),
+    ('rev_and_change', 'from perforce_model import Rev, Change'),
+    ('all_models', 'import perforce_model; perforce_model.load_all()'),
+])
+
+
+def import_times(runs=10):
+    script = 'import time; t0 = time.perf_counter(); %s; print(time.perf_counter() - t0)'
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = OrderedDict()
+    for name, statement in IMPORT_SCENARIOS.items():
+        timings = sorted(
+            float(subprocess.check_output([sys.executable, '-c', script % statement], cwd=here))
+            * 1000 for _ in range(runs))
+        results[name] = {
+            'runs': runs,
+            'min_ms': round(timings[0], 3),
+            'median_ms': round(timings[len(timings) // 2], 3),
+        }
+    return results
+
+
+def run_queries(engine, gen, runs=50):
+    results = OrderedDict()
+    with engine.connect() as conn:
+        for name, build in _queries(gen).items():
+            timings = []
+            for _ in range(runs):
+                stmt = build()
+                t0 = time.perf_counter()
+                conn.execute(stmt).fetchall()
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            results[name] = {
+                'runs': runs,
+                'min_ms': round(timings[0], 3),
+                'median_ms': round(timings[len(timings) // 2], 3),
+                'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            }
+    return results
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(url, params, runs=50, reset=False):
+    engine = create_engine(url)
+    tables = [m.__table__ for m in POPULATED]
+    if reset:
+        Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    with engine.connect() as conn:
+        if conn.scalar(select([func.count()]).select_from(Rev.__table__)):
+            raise SystemExit('perforce.rev is not empty; rerun with --reset on a scratch database')
+    gen, populated = populate(engine, params)
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT').execute('ANALYZE')
+    return OrderedDict([
+        ('meta', OrderedDict([
+            ('commit', _commit()),
+            ('timestamp', int(time.time())),
+            ('dialect', engine.dialect.name),
+            ('server_version', '.'.join(map(str, engine.dialect.server_version_info or ()))),
+            ('python', platform.python_version()),
+            ('sqlalchemy', sqlalchemy.__version__),
+            ('params', params),
+        ])),
+        ('populate', populated),
+        ('queries', run_queries(engine, gen, runs)),
+        ('imports', import_times()),
+    ])
+
+
+def compare(old, new):
+    lines = ['%-24s %12s %12s %8s' % ('query', 'old median', 'new median', 'ratio')]
+    for section in ('queries', 'imports'):
+        for name, result in new.get(section, {}).items():
+            before = old.get(section, {}).get(name)
+            if before is None:
+                continue
+            ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else 0
+            lines.append('%-24s %10.3fms %10.3fms %7.2fx' % (
+                name, before['median_ms'], result['median_ms'], ratio))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the perforce schema')
+    parser.add_argument('url', nargs='?')
+    parser.add_argument('--out')
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--reset', action='store_true',
+                        help='drop and recreate the benchmark tables first')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--imports', action='store_true',
+                        help='only time cold imports of the model module')
+    for name, default in DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as a, open(args.compare[1]) as b:
+            print(compare(json.load(a), json.load(b)))
+        return
+    if args.imports:
+        result = OrderedDict([
+            ('meta', OrderedDict([('commit', _commit()), ('timestamp', int(time.time())),
+                                  ('python', platform.python_version()),
+                                  ('sqlalchemy', sqlalchemy.__version__)])),
+            ('imports', import_times(args.runs)),
+        ])
+    elif not args.url:
+        parser.error('a database url is required')
+    else:
+        params = OrderedDict((name, getattr(args, name)) for name in DEFAULTS)
+        result = benchmark(args.url, params, runs=args.runs, reset=args.reset)
+    output = json.dumps(result, indent=2)
+    if args.out:
+        with open(args.out, 'w') as fh:
+            fh.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
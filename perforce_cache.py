@@ -0,0 +1,170 @@
+# Read-through LRU cache for the small, rarely changing spec tables.
+#
+# Entries are keyed on (table, primary key) and hold detached model
+# instances (or None for keys that do not exist). They expire after ttl
+# seconds and are invalidated early by:
+#   - journal_listener(), hooked into JournalTailer, for any replicated row
+#   - refresh(), which polls Domain.updateDate / User.updateDate /
+#     Protect.update and drops the specs that changed since the last poll.
+#     Dates have one second resolution, so rows at the last mark are
+#     invalidated again on every poll rather than missed
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from perforce_model import Depot, Domain, Group, Protect, Stream, User
+
+SPEC_MODELS = (User, Group, Protect, Depot, Stream, Domain)
+
+# Domain types that mirror a spec table of their own, by letter and as the
+# numeric codes checkpoints and journals carry (the letter's ordinal)
+_DOMAIN_SPECS = {'d': Depot, 's': Stream}
+for _type, _spec in list(_DOMAIN_SPECS.items()):
+    # type is a string column, so loaded codes may come back as '100'
+    _DOMAIN_SPECS[ord(_type)] = _DOMAIN_SPECS[str(ord(_type))] = _spec
+del _type, _spec
+
+_MISSING = object()
+
+
+class CacheStats(object):
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / float(total) if total else 0.0
+
+    def as_dict(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'hit_ratio': round(self.hit_ratio, 4),
+        }
+
+
+class SpecCache(object):
+    def __init__(self, engine, maxsize=10000, ttl=300, models=SPEC_MODELS):
+        self.engine = engine
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.models = dict((m.__table__.name, m) for m in models)
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._marks = {}
+
+    def get(self, model, *pk):
+        key = (model.__table__.name, pk)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.stats.hits += 1
+                    return value
+                del self._entries[key]
+                self.stats.expirations += 1
+            self.stats.misses += 1
+        value = self._fetch(model, pk)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+        return value
+
+    def _fetch(self, model, pk):
+        session = Session(bind=self.engine)
+        try:
+            value = session.query(model).get(pk if len(pk) > 1 else pk[0])
+            session.expunge_all()
+            return value
+        finally:
+            session.close()
+
+    def invalidate(self, model, *pk):
+        with self._lock:
+            if self._entries.pop((model.__table__.name, pk), None) is not None:
+                self.stats.invalidations += 1
+
+    def invalidate_table(self, model):
+        name = model.__table__.name
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == name]:
+                del self._entries[key]
+                self.stats.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # Listener for JournalTailer
+    def journal_listener(self, op, table, rows):
+        model = self.models.get(table.name)
+        if model is None:
+            return
+        keys = [c.key for c in table.primary_key.columns]
+        for row in rows:
+            self.invalidate(model, *[row[k] for k in keys])
+            if model is Domain:
+                self._invalidate_domain(row.get('name'), row.get('type'))
+
+    def _invalidate_domain(self, name, type_):
+        spec = _DOMAIN_SPECS.get(type_)
+        if spec is not None and spec.__table__.name in self.models:
+            self.invalidate(spec, name)
+
+    # Drop entries for specs updated since the previous call; the first call
+    # only records the high-water marks. Returns the number of specs that
+    # changed, not counting rows already seen at the previous mark.
+    def refresh(self):
+        changed = 0
+        with self.engine.connect() as conn:
+            for model, column, extra in ((Domain, Domain.updateDate, Domain.type),
+                                         (User, User.updateDate, None)):
+                if model.__table__.name not in self.models:
+                    continue
+                key = model.__mapper__.primary_key[0]
+                previous = self._marks.get(model.__table__.name)
+                if previous is None:
+                    mark = conn.scalar(select([func.max(column)])) or 0
+                    seen = set(r[0] for r in conn.execute(select([key]).where(column == mark)))
+                    self._marks[model.__table__.name] = (mark, seen)
+                    continue
+                mark, seen = previous
+                cols = [key, column] + ([extra] if extra is not None else [])
+                rows = conn.execute(select(cols).where(column >= mark)).fetchall()
+                for row in rows:
+                    self.invalidate(model, row[0])
+                    if model is Domain:
+                        self._invalidate_domain(row[0], row[2])
+                    if row[1] != mark or row[0] not in seen:
+                        changed += 1
+                if rows:
+                    mark = max(row[1] for row in rows)
+                    seen = set(row[0] for row in rows if row[1] == mark)
+                self._marks[model.__table__.name] = (mark, seen)
+            if 'protect' in self.models:
+                mark = tuple(conn.execute(select([func.max(Protect.update), func.count()])).first())
+                if self._marks.get('protect', mark) != mark:
+                    self.invalidate_table(Protect)
+                    changed += 1
+                self._marks['protect'] = mark
+        return changed
@@ -0,0 +1,156 @@
+# Maintained f_cmdident -> changelist index (perforce.command_change).
+#
+# Resolution order for each command, as in README_correlation.md:
+#   1. a changelist named in f_args (submit -c N, change=N, ...@=N)
+#   2. its Audit (f_file, f_rev) pairs looked up in perforce.rev
+#   3. for commands without files, a change by the same user within
+#      +/- fuzz seconds of the command
+# Audit pairs whose rev rows have not arrived yet are parked and resolved
+# when the journal tail delivers them, so lookups are a primary-key probe.
+import re
+import time
+from collections import Counter, OrderedDict
+
+from sqlalchemy import and_, select
+
+from perforce_log_model import CommandChange
+from perforce_model import Change, Rev
+from perforce_sql import upsert
+
+# A plain @N is a revision spec (sync //...@N reads as of change N), not the
+# command's own change; @=N names the shelved change N itself.
+_HINTS = (
+    re.compile(r'(?:^|:)-c:?(\d+)(?=:|$)'),
+    re.compile(r'(?:^|[:\s])change=(\d+)'),
+    re.compile(r'@=(\d+)(?=:|$)'),
+)
+
+
+# Changelist named in an encoded f_args string, or None
+def parse_change_hint(args):
+    if not args:
+        return None
+    for pattern in _HINTS:
+        m = pattern.search(args)
+        if m:
+            return int(m.group(1))
+    return None
+
+
+class CorrelationIndex(object):
+    def __init__(self, engine, fuzz=60, max_pending=100000, chunk_size=500):
+        self.engine = engine
+        self.fuzz = fuzz
+        self.max_pending = max_pending
+        self.chunk_size = chunk_size
+        # (depotFile, depotRev) -> [cmdident] waiting for the rev row
+        self.pending = OrderedDict()
+        # cmdident -> {(depotFile, depotRev): (change, size)}, most recent last
+        self.resolved = OrderedDict()
+
+    # Sink for CommandIngester: rows are command_events dicts
+    def add_commands(self, commands):
+        out = []
+        pairs = {}
+        for cmd in commands:
+            ident = cmd['cmdident']
+            audits = [a for a in cmd.get('audit_events') or () if a.get('file') and a.get('rev')]
+            hint = parse_change_hint(cmd.get('args'))
+            if hint is not None:
+                out.append(self._row(ident, hint, len(audits),
+                                     sum(a.get('filesize') or 0 for a in audits), 'args'))
+            elif audits:
+                for a in audits:
+                    pairs.setdefault((a['file'], a['rev']), []).append(ident)
+            elif cmd.get('user_name') and cmd.get('command_start_timestamp'):
+                change = self._by_time(cmd)
+                if change is not None:
+                    out.append(self._row(ident, change, 0, 0, 'time'))
+        if pairs:
+            found = self._lookup(pairs)
+            touched = set()
+            for pair, idents in pairs.items():
+                if pair in found:
+                    for ident in idents:
+                        self._resolve(ident, pair, found[pair])
+                        touched.add(ident)
+                else:
+                    self._park(pair, idents)
+            out.extend(self._summary(ident) for ident in touched)
+        self._write([row for row in out if row is not None])
+
+    # Listener for JournalTailer / rows freshly loaded into perforce.rev
+    def journal_listener(self, op, table, rows):
+        if op == 'pv' and table.name == 'rev':
+            self.add_revs(rows)
+
+    def add_revs(self, rows):
+        touched = set()
+        for row in rows:
+            pair = (row['depotFile'], row['depotRev'])
+            idents = self.pending.pop(pair, None)
+            if idents is None:
+                continue
+            for ident in idents:
+                self._resolve(ident, pair, (row['change'], row.get('size') or 0))
+                touched.add(ident)
+        self._write([row for row in map(self._summary, touched) if row is not None])
+
+    def lookup(self, cmdident):
+        with self.engine.connect() as conn:
+            return conn.execute(CommandChange.__table__.select().where(
+                CommandChange.cmdident == cmdident)).first()
+
+    def _resolve(self, ident, pair, value):
+        files = self.resolved.pop(ident, None) or {}
+        files[pair] = value
+        self.resolved[ident] = files
+        while len(self.resolved) > self.max_pending:
+            self.resolved.popitem(last=False)
+
+    def _park(self, pair, idents):
+        self.pending.setdefault(pair, []).extend(idents)
+        while len(self.pending) > self.max_pending:
+            self.pending.popitem(last=False)
+
+    def _lookup(self, pairs):
+        found = {}
+        files = sorted(set(f for f, _ in pairs))
+        with self.engine.connect() as conn:
+            for i in range(0, len(files), self.chunk_size):
+                rows = conn.execute(select([Rev.depotFile, Rev.depotRev, Rev.change, Rev.size])
+                                    .where(Rev.depotFile.in_(files[i:i + self.chunk_size])))
+                for depot_file, rev, change, size in rows:
+                    if (depot_file, rev) in pairs:
+                        found[(depot_file, rev)] = (change, size or 0)
+        return found
+
+    def _by_time(self, cmd):
+        start = cmd['command_start_timestamp']
+        end = cmd.get('command_end_timestamp') or start
+        with self.engine.connect() as conn:
+            rows = conn.execute(select([Change.change, Change.date]).where(and_(
+                Change.user == cmd['user_name'],
+                Change.date.between(start - self.fuzz, end + self.fuzz)))).fetchall()
+        if not rows:
+            return None
+        return min(rows, key=lambda r: abs(r.date - start)).change
+
+    # Most files of a command resolve to one change; that one wins
+    def _summary(self, ident):
+        files = self.resolved.get(ident)
+        if not files:
+            return None
+        files = files.values()
+        change, count = Counter(c for c, _ in files).most_common(1)[0]
+        total = sum(size for c, size in files if c == change)
+        return self._row(ident, change, count, total, 'rev')
+
+    def _row(self, ident, change, files, total, source):
+        return {'cmdident': ident, 'change': change, 'file_count': files,
+                'total_bytes': total, 'source': source, 'updated': int(time.time())}
+
+    def _write(self, rows):
+        if rows:
+            with self.engine.begin() as conn:
+                upsert(conn, CommandChange.__table__, rows)
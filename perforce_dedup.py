@@ -0,0 +1,191 @@
+# Duplicate-content analysis over the librarian tables.
+#
+#   python perforce_dedup.py postgresql://... --passes 64 --candidates lazy.jsonl
+#
+# Archive records of storage, storagesh and storageg are grouped by
+# (digest, size). To bound memory the digest space is split into `passes`
+# ranges of the leading hex digits and each range is read and grouped on its
+# own, so a pass holds about 1/passes of the records. In every group of
+# two or more records one archive is kept (highest refCount, then first by
+# key) and the stored bytes (serverSize, else size) of the rest count as
+# reclaimable, rolled up per depot and per path prefix.
+#
+# The candidate list pairs each duplicate archive with the one to keep: rev
+# rows whose lbrFile/lbrRev name the duplicate can be repointed at the kept
+# archive as lazy copies (lbrIsLazy), after which the duplicate is unused.
+# storageg (graph depots) has no sizes, so its groups are counted without
+# bytes. Digests are compared in upper case: p4d writes MD5s in upper case
+# but storageg SHAs in lower case. A pass reads both cases of its range (two
+# range scans of the digest indexes idx_storage_digest_size,
+# idx_storagesh_digest_size and idx_storageg_sha, as hex orders the same
+# either way) and keeps the rows whose upper-cased digest falls in it, so
+# every record lands in one pass.
+import heapq
+import json
+from collections import OrderedDict
+
+from sqlalchemy import and_, or_, select
+
+from perforce_model import Storage, Storageg, Storagesh
+
+# name: (table, file column, rev column, digest column, size column, stored size column)
+SOURCES = OrderedDict([
+    ('storage', (Storage.__table__, 'file', 'rev', 'digest', 'size', 'serverSize')),
+    ('storagesh', (Storagesh.__table__, 'file', 'rev', 'digest', 'size', 'serverSize')),
+    ('storageg', (Storageg.__table__, 'repo', 'sha', 'sha', None, None)),
+])
+
+_HEX = '0123456789ABCDEF'
+
+
+def digest_ranges(passes):
+    # split the 256 two-digit prefixes into contiguous [lo, hi) ranges
+    passes = max(1, min(256, passes))
+    prefixes = [a + b for a in _HEX for b in _HEX]
+    cuts = [prefixes[i * 256 // passes] for i in range(passes)]
+    return [(lo, cuts[i + 1] if i + 1 < len(cuts) else None) for i, lo in enumerate(cuts)]
+
+
+def path_prefix(path, depth):
+    parts = path.split('/')
+    # '//depot/a/b' splits to ['', '', 'depot', 'a', 'b']
+    if len(parts) <= depth + 2:
+        return path.rsplit('/', 1)[0] + '/'
+    return '/'.join(parts[:depth + 2]) + '/'
+
+
+class DedupReport(object):
+    def __init__(self, prefix_depth, top):
+        self.prefix_depth = prefix_depth
+        self.top = top
+        self.records = 0
+        self.groups = 0
+        self.duplicates = 0
+        self.reclaimable = 0
+        self.by_depot = {}
+        self.by_prefix = {}
+        self.by_source = {}
+        self._largest = []
+
+    def add_group(self, digest, size, keep, duplicates):
+        self.groups += 1
+        wasted = 0
+        for dup in duplicates:
+            source, path, _, stored = dup
+            self.duplicates += 1
+            self.by_source[source] = self.by_source.get(source, 0) + 1
+            if not stored:
+                continue
+            wasted += stored
+            depot = path_prefix(path, 1)
+            prefix = path_prefix(path, self.prefix_depth)
+            self.by_depot[depot] = self.by_depot.get(depot, 0) + stored
+            self.by_prefix[prefix] = self.by_prefix.get(prefix, 0) + stored
+        self.reclaimable += wasted
+        entry = (wasted, digest, size or 0, len(duplicates) + 1)
+        if len(self._largest) < self.top:
+            heapq.heappush(self._largest, entry)
+        elif entry > self._largest[0]:
+            heapq.heapreplace(self._largest, entry)
+
+    def as_dict(self):
+        ordered = lambda d: OrderedDict(sorted(d.items(), key=lambda i: -i[1]))
+        return OrderedDict([
+            ('records', self.records),
+            ('duplicate_groups', self.groups),
+            ('duplicate_records', self.duplicates),
+            ('reclaimable_bytes', self.reclaimable),
+            ('by_source', self.by_source),
+            ('by_depot', ordered(self.by_depot)),
+            ('by_prefix', ordered(self.by_prefix)),
+            ('largest_groups', [OrderedDict([('digest', d), ('size', s), ('copies', n),
+                                             ('reclaimable_bytes', w)])
+                                for w, d, s, n in sorted(self._largest, reverse=True)]),
+        ])
+
+
+class DedupAnalyzer(object):
+    def __init__(self, engine, passes=16, prefix_depth=3, top=100, sources=None,
+                 fetch_size=50000):
+        self.engine = engine
+        self.passes = passes
+        self.prefix_depth = prefix_depth
+        self.top = top
+        self.sources = sources or list(SOURCES)
+        self.fetch_size = fetch_size
+
+    def _records(self, conn, lo, hi):
+        for name in self.sources:
+            table, file_col, rev_col, digest_col, size_col, stored_col = SOURCES[name]
+            digest = table.c[digest_col]
+            cols = [table.c[file_col], table.c[rev_col], digest,
+                    table.c[size_col] if size_col else None,
+                    table.c[stored_col] if stored_col else None, table.c.refCount]
+            where = or_(*[digest >= b if hi is None else and_(digest >= b, digest < e)
+                          for b, e in ((lo, hi), (lo.lower(), hi and hi.lower()))])
+            # labelled, as storageg selects sha twice (rev and digest)
+            result = conn.execution_options(stream_results=True).execute(
+                select([c.label('c%d' % i) for i, c in enumerate(cols) if c is not None])
+                .where(where))
+            while True:
+                rows = result.fetchmany(self.fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    key = row[2].upper()
+                    if key < lo or (hi is not None and key >= hi):
+                        continue
+                    size = row[3] if size_col else None
+                    stored = (row[4] if row[4] is not None else size) if stored_col else None
+                    yield name, row[0], row[1], key, size, stored, row[-1] or 0
+
+    def run(self, candidates=None):
+        report = DedupReport(self.prefix_depth, self.top)
+        out = open(candidates, 'w') if candidates else None
+        try:
+            for lo, hi in digest_ranges(self.passes):
+                groups = {}
+                with self.engine.connect() as conn:
+                    for name, path, rev, digest, size, stored, refs in self._records(conn, lo, hi):
+                        report.records += 1
+                        groups.setdefault((digest, size), []).append(
+                            (-refs, name, path, rev, stored))
+                for (digest, size), members in groups.items():
+                    if len(members) < 2:
+                        continue
+                    members.sort()
+                    keep = members[0][1:]
+                    duplicates = [m[1:] for m in members[1:]]
+                    report.add_group(digest, size, keep, duplicates)
+                    if out is not None and keep[0] != 'storageg':
+                        for dup in duplicates:
+                            out.write(json.dumps(OrderedDict([
+                                ('digest', digest), ('size', size),
+                                ('keep', OrderedDict([('table', keep[0]), ('file', keep[1]),
+                                                      ('rev', keep[2])])),
+                                ('duplicate', OrderedDict([('table', dup[0]), ('file', dup[1]),
+                                                           ('rev', dup[2])])),
+                                ('bytes', dup[3]),
+                            ])) + '\n')
+        finally:
+            if out is not None:
+                out.close()
+        return report.as_dict()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from perforce_model import create_engine
+
+    parser = argparse.ArgumentParser(description='Report duplicate archive content')
+    parser.add_argument('url')
+    parser.add_argument('--passes', type=int, default=16)
+    parser.add_argument('--prefix-depth', type=int, default=3)
+    parser.add_argument('--top', type=int, default=100)
+    parser.add_argument('--candidates', help='write lazy-copy candidates as JSON lines')
+    args = parser.parse_args()
+
+    analyzer = DedupAnalyzer(create_engine(args.url), passes=args.passes,
+                             prefix_depth=args.prefix_depth, top=args.top)
+    print(json.dumps(analyzer.run(args.candidates), indent=2))
@@ -0,0 +1,288 @@
+# Columnar export of perforce tables to Parquet for analytics.
+#
+#   python perforce_export.py postgresql://... /data/p4 rev change --incremental
+#
+# Each table is streamed through a server-side cursor and written as Hive
+# partitioned Parquet (<root>/<table>/<column>=<value>/part-NNNNN.parquet),
+# one row group per batch, so memory stays at about row_group_size rows per
+# open partition. Arrow types follow the SQLAlchemy column types; epoch
+# BigInteger columns become UTC timestamps and are partitioned by month
+# (<column>_month=YYYY-MM, so the directory key does not shadow the column).
+#
+# Incremental runs only read rows whose key column (Change.change, Rev.date,
+# ...) is at or above the mark saved in <root>/<table>/_state.json by the
+# previous run and add new part files next to the old ones. The primary keys
+# of the rows exported at the mark are saved with it and skipped, so rows
+# that land later with the same key value (the same second of Rev.date) are
+# still picked up once. Rows with a NULL key are only exported by full runs.
+# Incremental runs append only: rows updated in place below the mark (a
+# pending change being submitted) need a full export to show up.
+#
+# JSON columns are written as their JSON text; DuckDB reads them back with
+# json(<column>).
+#
+# DuckDB: SELECT ... FROM read_parquet('/data/p4/rev/**/*.parquet', hive_partitioning = 1)
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from sqlalchemy import JSON, BigInteger, Boolean, DateTime, Integer, SmallInteger, select
+from sqlalchemy.types import TypeDecorator, _Binary
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pq = None
+
+log = logging.getLogger(__name__)
+
+# BigInteger columns holding epoch seconds
+EPOCH_COLUMNS = frozenset((
+    'date', 'modTime', 'modtime', 'accessDate', 'updateDate', 'update', 'time', 'access',
+    'startDate', 'endDate', 'startdate', 'enddate', 'jdate', 'xdate', 'passDate',
+    'passExpire', 'lastSeenDate', 'lastUpdate', 'created', 'pushed',
+    'command_start_timestamp', 'command_end_timestamp', 'f_timestamp',
+    'last_updated', 'updated', 'ingested_at',
+))
+
+# Default incremental key and partition column per table
+INCREMENTAL_KEYS = {'change': 'change', 'rev': 'date', 'revcx': 'change', 'desc': 'descKey',
+                    'integed': 'change', 'command_events': 'command_start_timestamp'}
+PARTITIONS = {'change': 'date', 'rev': 'date', 'command_events': 'command_start_timestamp'}
+
+
+def _require():
+    if pa is None:
+        raise RuntimeError('pyarrow is required for Parquet export (pip install pyarrow)')
+
+
+# The type a column is stored as, through JSONType and other variants
+def _impl(type_):
+    while isinstance(type_, TypeDecorator):
+        type_ = type_.impl
+    return type_
+
+
+def is_epoch(column):
+    return isinstance(_impl(column.type), BigInteger) and column.name in EPOCH_COLUMNS
+
+
+def is_json(column):
+    return isinstance(_impl(column.type), JSON)
+
+
+def arrow_type(column):
+    _require()
+    t = _impl(column.type)
+    if is_epoch(column):
+        return pa.timestamp('s', tz='UTC')
+    if isinstance(t, SmallInteger):
+        return pa.int16()
+    if isinstance(t, BigInteger):
+        return pa.int64()
+    if isinstance(t, Integer):
+        return pa.int32()
+    if isinstance(t, Boolean):
+        return pa.bool_()
+    if isinstance(t, DateTime):
+        return pa.timestamp('us')
+    if isinstance(t, _Binary):
+        return pa.binary()
+    return pa.string()
+
+
+# A column's values as pa.array takes them for arrow_type(column)
+def arrow_values(column, values):
+    if is_json(column):
+        return [json.dumps(v, sort_keys=True) if v is not None else None for v in values]
+    if isinstance(_impl(column.type), _Binary):
+        # psycopg2 hands bytea back as memoryview
+        return [bytes(v) if v is not None else None for v in values]
+    return values
+
+
+def arrow_schema(table):
+    _require()
+    return pa.schema([pa.field(c.name, arrow_type(c), nullable=not c.primary_key)
+                      for c in table.columns])
+
+
+def _same(value):
+    return value
+
+
+def _month(value):
+    return time.strftime('%Y-%m', time.gmtime(value)) if value is not None else None
+
+
+class ParquetExporter(object):
+    def __init__(self, engine, root, row_group_size=100000, compression='zstd',
+                 partitions=PARTITIONS, incremental_keys=INCREMENTAL_KEYS):
+        _require()
+        self.engine = engine
+        self.root = root
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.partitions = partitions
+        self.incremental_keys = incremental_keys
+
+    def _state_path(self, table):
+        return os.path.join(self.root, table.name, '_state.json')
+
+    def state(self, table):
+        try:
+            with open(self._state_path(table)) as fh:
+                return json.load(fh)
+        except (IOError, ValueError):
+            return {'mark': None, 'runs': 0}
+
+    def _save_state(self, table, state):
+        path = self._state_path(table)
+        with open(path + '.tmp', 'w') as fh:
+            json.dump(state, fh)
+        os.replace(path + '.tmp', path)
+
+    def export(self, model, incremental=False, key=None):
+        table = getattr(model, '__table__', model)
+        key = key or self.incremental_keys.get(table.name)
+        if incremental and key is None:
+            raise ValueError('no incremental key for %s' % table.name)
+        state = self.state(table) if incremental else {'mark': None, 'runs': 0}
+        if not incremental and os.path.isdir(os.path.join(self.root, table.name)):
+            self._clear(table)
+
+        schema = arrow_schema(table)
+        names = [c.name for c in table.columns]
+        part_col = self.partitions.get(table.name)
+        part_index = names.index(part_col) if part_col in names else None
+        part_fn, part_key = _same, part_col
+        if part_index is not None and is_epoch(table.c[part_col]):
+            part_fn, part_key = _month, part_col + '_month'
+
+        stmt = select([table])
+        pk_index = [names.index(c.name) for c in table.primary_key.columns]
+        # primary keys already exported at the mark; None for states saved
+        # before they were recorded, which only read rows above the mark
+        seen = state.get('seen')
+        seen = set(tuple(pk) for pk in seen) if seen is not None else None
+        if key is not None:
+            if state['mark'] is not None:
+                column = table.c[key]
+                stmt = stmt.where(column >= state['mark'] if seen is not None
+                                  else column > state['mark'])
+            stmt = stmt.order_by(table.c[key])
+        key_index = names.index(key) if key is not None else None
+
+        run = state['runs'] + 1
+        writers = {}
+        rows = 0
+        mark = state['mark']
+        mark_keys = seen or set()
+        t0 = time.time()
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(stmt)
+            while True:
+                batch = result.fetchmany(self.row_group_size)
+                if not batch:
+                    break
+                if key_index is not None:
+                    batch, mark = self._advance(batch, key_index, pk_index, mark, mark_keys)
+                    if not batch:
+                        continue
+                rows += len(batch)
+                groups = OrderedDict()
+                if part_index is None:
+                    groups[None] = batch
+                else:
+                    for row in batch:
+                        groups.setdefault(part_fn(row[part_index]), []).append(row)
+                for part, group in groups.items():
+                    writer = writers.get(part)
+                    if writer is None:
+                        writer = writers[part] = self._writer(table, schema, part_key, part, run)
+                    writer.write_table(self._to_arrow(table, schema, group))
+        for writer in writers.values():
+            writer.close()
+        if key is not None:
+            self._save_state(table, {'mark': mark, 'runs': run, 'key': key,
+                                     'seen': sorted(list(pk) for pk in mark_keys)})
+        seconds = time.time() - t0
+        log.info('%s: %d rows in %d files, %.1fs', table.name, rows, len(writers), seconds)
+        return OrderedDict([('table', table.name), ('rows', rows), ('files', len(writers)),
+                            ('mark', mark), ('seconds', round(seconds, 3))])
+
+    # Drops the rows already exported at the mark and moves the mark to the
+    # highest non-NULL key; mark_keys holds the primary keys at the mark
+    @staticmethod
+    def _advance(batch, key_index, pk_index, mark, mark_keys):
+        kept = []
+        for row in batch:
+            value = row[key_index]
+            if value is not None and mark is not None and value <= mark:
+                pk = tuple(row[i] for i in pk_index)
+                if value < mark or pk in mark_keys:
+                    continue
+                mark_keys.add(pk)
+            elif value is not None:
+                mark = value
+                mark_keys.clear()
+                mark_keys.add(tuple(row[i] for i in pk_index))
+            kept.append(row)
+        return kept, mark
+
+    def _to_arrow(self, table, schema, rows):
+        arrays = [pa.array(arrow_values(column, values), type=field.type)
+                  for column, values, field in zip(table.columns, zip(*rows), schema)]
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def _writer(self, table, schema, part_key, part, run):
+        path = os.path.join(self.root, table.name)
+        if part_key is not None:
+            path = os.path.join(path, '%s=%s' % (part_key, '__HIVE_DEFAULT_PARTITION__'
+                                                 if part is None else part))
+        os.makedirs(path, exist_ok=True)
+        return pq.ParquetWriter(os.path.join(path, 'part-%05d.parquet' % run), schema,
+                                compression=self.compression)
+
+    def _clear(self, table):
+        base = os.path.join(self.root, table.name)
+        for dirpath, _, files in os.walk(base, topdown=False):
+            for name in files:
+                if name.endswith('.parquet') or name == '_state.json':
+                    os.remove(os.path.join(dirpath, name))
+            if dirpath != base and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+
+def main(argv=None):
+    import argparse
+
+    from perforce_model import create_engine
+    from perforce_model import table as model_table
+
+    parser = argparse.ArgumentParser(description='Export perforce tables to Parquet')
+    parser.add_argument('url')
+    parser.add_argument('root')
+    parser.add_argument('tables', nargs='+', help='table names, e.g. rev change')
+    parser.add_argument('--incremental', action='store_true')
+    parser.add_argument('--key', help='incremental key column (default per table)')
+    parser.add_argument('--row-group-size', type=int, default=100000)
+    parser.add_argument('--compression', default='zstd')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    engine = create_engine(args.url)
+    exporter = ParquetExporter(engine, args.root, row_group_size=args.row_group_size,
+                               compression=args.compression)
+    for name in args.tables:
+        table = model_table(name)
+        if table is None:
+            parser.error('unknown table %s' % name)
+        print(json.dumps(exporter.export(table, incremental=args.incremental, key=args.key)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+# Maintained head-revision table (perforce.headrev).
+#
+# One row per depotFile holding its highest rev, kept current from the same
+# streams that fill perforce.rev:
+#   heads = HeadRevIndex(engine)
+#   loader.add_transform(heads.transform)       # CheckpointLoader batches
+#   tailer.add_writer(heads.journal_writer)     # JournalTailer @pv@/@dv@
+# Inserts only ever move a head forward. Deleting the head rev (obliterate,
+# journal @dv@) recomputes that file's head from rev, or drops the row when
+# no revisions are left. rebuild() recreates the table from rev in one pass.
+# journal_writer runs in the tailer's batch transaction, so heads commit (or
+# roll back and are replayed) together with the rev records.
+from sqlalchemy import and_, case, func, select
+
+from perforce_model import HeadRev, Rev
+from perforce_paths import prefix_range
+from perforce_sql import upsert
+
+# Head actions that leave the file deleted at head, by name and as the
+# numbers checkpoints and journals carry (db.rev action 2 delete, 8
+# move/delete); action is a string column, so loaded codes come back as '2'
+DELETED_ACTIONS = ('delete', 'move/delete', '2', '8')
+
+
+def is_deleted(action):
+    return action is not None and str(action) in DELETED_ACTIONS
+
+_COLUMNS = ('depotFile', 'depotRev', 'type', 'action', 'change', 'date', 'digest', 'size')
+
+
+def head_row(row):
+    head = dict((k, row.get(k)) for k in _COLUMNS)
+    head['isDeleted'] = 1 if is_deleted(row.get('action')) else 0
+    return head
+
+
+class HeadRevIndex(object):
+    def __init__(self, engine, chunk_size=500):
+        self.engine = engine
+        self.chunk_size = chunk_size
+        self.table = HeadRev.__table__
+
+    def head(self, depot_file):
+        with self.engine.connect() as conn:
+            return conn.execute(self.table.select().where(
+                HeadRev.depotFile == depot_file)).first()
+
+    # Heads under a '//depot/dir/' prefix, in path order
+    def heads(self, prefix, include_deleted=False):
+        stmt = self.table.select().where(prefix_range(HeadRev.depotFile, prefix))
+        if not include_deleted:
+            stmt = stmt.where(HeadRev.isDeleted == 0)
+        with self.engine.connect() as conn:
+            for row in conn.execution_options(stream_results=True).execute(
+                    stmt.order_by(HeadRev.depotFile)):
+                yield row
+
+    def rebuild(self):
+        latest = select([Rev.depotFile, func.max(Rev.depotRev).label('depotRev')]) \
+            .group_by(Rev.depotFile).alias('latest')
+        rev = Rev.__table__
+        source = select([rev.c[k] for k in _COLUMNS] + [
+            case([(Rev.action.in_(DELETED_ACTIONS), 1)], else_=0)]).select_from(
+            rev.join(latest, and_(Rev.depotFile == latest.c.depotFile,
+                                  Rev.depotRev == latest.c.depotRev)))
+        with self.engine.begin() as conn:
+            conn.execute(self.table.delete())
+            result = conn.execute(self.table.insert().from_select(
+                list(_COLUMNS) + ['isDeleted'], source))
+        return result.rowcount
+
+    # Apply rev dicts: keep the highest rev per file, never move a head back
+    def add_revs(self, rows):
+        heads = self._heads(rows)
+        if not heads:
+            return
+        with self.engine.begin() as conn:
+            self._add_heads(conn, heads)
+
+    def _add_heads(self, conn, heads):
+        if conn.dialect.name == 'postgresql':
+            self._upsert_forward(conn, [head_row(r) for r in heads.values()])
+        else:
+            existing = self._existing(conn, list(heads))
+            upsert(conn, self.table, [head_row(r) for f, r in heads.items()
+                                      if existing.get(f, 0) <= r['depotRev']])
+
+    @staticmethod
+    def _heads(rows):
+        heads = {}
+        for row in rows:
+            current = heads.get(row['depotFile'])
+            if current is None or row['depotRev'] > current['depotRev']:
+                heads[row['depotFile']] = row
+        return heads
+
+    def _upsert_forward(self, conn, rows):
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+        stmt = pg_insert(self.table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[HeadRev.depotFile],
+            set_=dict((c.name, stmt.excluded[c.name]) for c in self.table.columns
+                      if not c.primary_key),
+            where=HeadRev.depotRev <= stmt.excluded.depotRev)
+        conn.execute(stmt, rows)
+
+    def _existing(self, conn, files):
+        found = {}
+        for i in range(0, len(files), self.chunk_size):
+            found.update(conn.execute(select([HeadRev.depotFile, HeadRev.depotRev]).where(
+                HeadRev.depotFile.in_(files[i:i + self.chunk_size]))).fetchall())
+        return found
+
+    # Recompute heads of files whose current head rev was deleted from rev
+    def remove_revs(self, rows):
+        with self.engine.begin() as conn:
+            self._remove_revs(conn, rows)
+
+    def _remove_revs(self, conn, rows):
+        files = sorted(set(r['depotFile'] for r in rows))
+        existing = self._existing(conn, files)
+        stale = sorted(set(r['depotFile'] for r in rows
+                           if existing.get(r['depotFile']) == r['depotRev']))
+        for i in range(0, len(stale), self.chunk_size):
+            chunk = stale[i:i + self.chunk_size]
+            latest = select([Rev.depotFile, func.max(Rev.depotRev).label('depotRev')]) \
+                .where(Rev.depotFile.in_(chunk)).group_by(Rev.depotFile).alias('latest')
+            replacements = [dict(r) for r in conn.execute(
+                select([Rev.__table__.c[k] for k in _COLUMNS]).select_from(
+                    Rev.__table__.join(latest, and_(Rev.depotFile == latest.c.depotFile,
+                                                    Rev.depotRev == latest.c.depotRev))))]
+            conn.execute(self.table.delete().where(HeadRev.depotFile.in_(chunk)))
+            if replacements:
+                conn.execute(self.table.insert(), [head_row(r) for r in replacements])
+
+    # CheckpointLoader transform; rows pass through unchanged
+    def transform(self, table, columns, rows):
+        if table.name == 'rev':
+            keys = [c.key for c in columns]
+            self.add_revs([dict(zip(keys, row)) for row in rows])
+        return columns, rows
+
+    # Writer for JournalTailer: runs in the transaction that applies the revs
+    def journal_writer(self, conn, op, table, rows):
+        if table.name != 'rev':
+            return
+        if op == 'dv':
+            self._remove_revs(conn, rows)
+        else:
+            heads = self._heads(rows)
+            if heads:
+                self._add_heads(conn, heads)
@@ -0,0 +1,96 @@
+# Secondary index management for the perforce schema.
+#
+# The indexes are declared on the model classes (__table_args__), so
+# Base.metadata.create_all() builds them with the tables. For bulk loads the
+# tables can be created bare and the indexes built afterwards, on PostgreSQL
+# with CREATE INDEX CONCURRENTLY so readers are not blocked.
+import logging
+import time
+
+from sqlalchemy import inspect
+from sqlalchemy.schema import CreateIndex, CreateTable, DropIndex
+
+from perforce_model import Base, load_all
+
+log = logging.getLogger(__name__)
+
+
+def _tables(tables=None):
+    metadata = load_all()
+    if tables is None:
+        return metadata.sorted_tables
+    names = set(tables)
+    return [t for t in metadata.sorted_tables if t.name in names or t.key in names]
+
+
+def secondary_indexes(tables=None):
+    return [index for table in _tables(tables)
+            for index in sorted(table.indexes, key=lambda i: i.name)]
+
+
+def existing_indexes(engine, table):
+    return set(i['name'] for i in inspect(engine).get_indexes(table.name, schema=table.schema))
+
+
+# Create the tables, optionally leaving out every secondary index
+def create_tables(engine, with_indexes=True, tables=None):
+    if with_indexes:
+        Base.metadata.create_all(engine, tables=_tables(tables))
+        return
+    with engine.begin() as conn:
+        for table in _tables(tables):
+            if not engine.dialect.has_table(conn, table.name, schema=table.schema):
+                conn.execute(CreateTable(table))
+
+
+# CREATE INDEX for index on dialect; concurrently sets the index's
+# postgresql_concurrently option for the compile only, as the Index objects
+# are shared with the model tables
+def create_index_sql(index, dialect, concurrently=False):
+    options = index.dialect_options['postgresql']
+    saved = options['concurrently']
+    options['concurrently'] = concurrently
+    try:
+        return str(CreateIndex(index).compile(dialect=dialect))
+    finally:
+        options['concurrently'] = saved
+
+
+# Build missing secondary indexes; returns [(name, seconds)]
+def create_indexes(engine, concurrently=False, tables=None):
+    concurrently = concurrently and engine.dialect.name == 'postgresql'
+    built = []
+    conn = engine.connect()
+    if concurrently:
+        conn = conn.execution_options(isolation_level='AUTOCOMMIT')
+    try:
+        for table in _tables(tables):
+            if not table.indexes:
+                continue
+            present = existing_indexes(engine, table)
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                if index.name in present:
+                    continue
+                sql = create_index_sql(index, engine.dialect, concurrently)
+                t0 = time.time()
+                conn.execute(sql)
+                built.append((index.name, time.time() - t0))
+                log.info('built %s in %.1fs', index.name, built[-1][1])
+    finally:
+        conn.close()
+    return built
+
+
+# Drop secondary indexes, e.g. ahead of a reload of the heavy tables
+def drop_indexes(engine, tables=None):
+    dropped = []
+    with engine.begin() as conn:
+        for table in _tables(tables):
+            if not table.indexes:
+                continue
+            present = existing_indexes(engine, table)
+            for index in table.indexes:
+                if index.name in present:
+                    conn.execute(DropIndex(index))
+                    dropped.append(index.name)
+    return dropped
@@ -0,0 +1,245 @@
+# In-memory integration graph over perforce.integed / perforce.integtx.
+#
+# Files are interned to ints and every "... from" integration record becomes
+# an edge fromFile -> toFile carrying its rev ranges and change. Edges live
+# in parallel arrays and are indexed in CSR form (offsets + edge numbers)
+# in both directions; records arriving after the last compact() sit in small
+# per-node delta lists until the next one. The "... into" records are the
+# mirror image of the "from" ones and are skipped.
+#
+# Traversals follow content through revisions:
+#   forward  (f, r) -> (toFile, endToRev)   via edges with endFromRev >= r
+#   backward (f, r) -> (fromFile, endFromRev) via edges with endToRev <= r
+#
+#   graph = IntegrationGraph(engine).load()
+#   graph.ancestors('//depot/rel/a.c')
+#   graph.propagated(12345, '//depot/rel/')
+#   tailer.add_listener(graph.journal_listener)
+from array import array
+from collections import OrderedDict, defaultdict, deque
+
+from sqlalchemy import select
+
+from perforce_model import IntegEd, Integtx, Revcx
+
+# how values recorded on the receiving (toFile) side
+HOWS = ('merge from', 'copy from', 'branch from', 'delete from', 'edit from', 'add from',
+        'moved from', 'ignored', 'undid')
+# the same, as the numbers checkpoints and journals carry (db.integed how);
+# the odd "... into" numbers are the mirror records
+HOW_NUMBERS = {0: 'merge from', 2: 'branch from', 4: 'copy from', 6: 'ignored',
+               8: 'delete from', 12: 'edit from', 13: 'add from', 14: 'moved from', 17: 'undid'}
+_HOW_CODES = dict((h, i) for i, h in enumerate(HOWS))
+for _number, _how in HOW_NUMBERS.items():
+    # how is a string column, so loaded codes may come back as '2'
+    _HOW_CODES[_number] = _HOW_CODES[str(_number)] = _HOW_CODES[_how]
+del _number, _how
+
+_MAX_REV = 2 ** 31 - 1
+_SOURCES = (IntegEd.__table__, Integtx.__table__)
+
+
+class IntegrationGraph(object):
+    def __init__(self, engine=None, compact_ratio=0.1):
+        self.engine = engine
+        self.compact_ratio = compact_ratio
+        self.ids = {}
+        self.paths = []
+        self.src = array('i')
+        self.dst = array('i')
+        self.change = array('i')
+        self.start_from = array('i')
+        self.end_from = array('i')
+        self.start_to = array('i')
+        self.end_to = array('i')
+        self.how = array('b')
+        self.removed = set()
+        self._out = self._in = None
+        self._indexed = 0
+        self._delta_out = defaultdict(list)
+        self._delta_in = defaultdict(list)
+
+    def __len__(self):
+        return len(self.src) - len(self.removed)
+
+    def intern(self, path):
+        node = self.ids.get(path)
+        if node is None:
+            node = self.ids[path] = len(self.paths)
+            self.paths.append(path)
+        return node
+
+    # Full load from the database, then one compaction
+    def load(self, chunk=100000):
+        with self.engine.connect() as conn:
+            for table in _SOURCES:
+                result = conn.execution_options(stream_results=True).execute(select([
+                    table.c.fromFile, table.c.toFile, table.c.change, table.c.startFromRev,
+                    table.c.endFromRev, table.c.startToRev, table.c.endToRev, table.c.how]))
+                while True:
+                    rows = result.fetchmany(chunk)
+                    if not rows:
+                        break
+                    for row in rows:
+                        self._add(*row)
+        self.compact()
+        return self
+
+    # rows are integed/integtx dicts
+    def add_records(self, rows):
+        for r in rows:
+            self._add(r['fromFile'], r['toFile'], r.get('change'), r['startFromRev'],
+                      r['endFromRev'], r['startToRev'], r['endToRev'], r.get('how'))
+        if len(self.src) - self._indexed > self.compact_ratio * max(self._indexed, 1000):
+            self.compact()
+
+    def remove_records(self, rows):
+        for r in rows:
+            source, target = self.ids.get(r['fromFile']), self.ids.get(r['toFile'])
+            if source is None or target is None:
+                continue
+            key = (r['startFromRev'], r['endFromRev'], r['startToRev'], r['endToRev'])
+            for e in self._edges(source, True):
+                if self.dst[e] == target and self._revs(e) == key:
+                    self.removed.add(e)
+
+    # Listener for JournalTailer
+    def journal_listener(self, op, table, rows):
+        if table in _SOURCES:
+            if op == 'dv':
+                self.remove_records(rows)
+            else:
+                self.add_records(rows)
+
+    def _add(self, from_file, to_file, change, start_from, end_from, start_to, end_to, how):
+        code = _HOW_CODES.get(how)
+        if code is None:
+            return
+        e = len(self.src)
+        source, target = self.intern(from_file), self.intern(to_file)
+        self.src.append(source)
+        self.dst.append(target)
+        self.change.append(change or 0)
+        self.start_from.append(start_from or 0)
+        self.end_from.append(end_from or 0)
+        self.start_to.append(start_to or 0)
+        self.end_to.append(end_to or 0)
+        self.how.append(code)
+        if self._out is not None:
+            self._delta_out[source].append(e)
+            self._delta_in[target].append(e)
+
+    def _revs(self, e):
+        return self.start_from[e], self.end_from[e], self.start_to[e], self.end_to[e]
+
+    # Rebuild both CSR indexes over every live edge
+    def compact(self):
+        if self.removed:
+            self._drop_removed()
+        n = len(self.paths)
+        self._out = self._csr(self.src, n)
+        self._in = self._csr(self.dst, n)
+        self._indexed = len(self.src)
+        self._delta_out.clear()
+        self._delta_in.clear()
+
+    @staticmethod
+    def _csr(keys, n):
+        offsets = array('l', [0]) * (n + 1)
+        for k in keys:
+            offsets[k + 1] += 1
+        for i in range(n):
+            offsets[i + 1] += offsets[i]
+        fill = array('l', offsets)
+        edges = array('l', [0]) * len(keys)
+        for e, k in enumerate(keys):
+            edges[fill[k]] = e
+            fill[k] += 1
+        return offsets, edges
+
+    def _drop_removed(self):
+        keep = [e for e in range(len(self.src)) if e not in self.removed]
+        for name in ('src', 'dst', 'change', 'start_from', 'end_from', 'start_to',
+                     'end_to', 'how'):
+            old = getattr(self, name)
+            setattr(self, name, array(old.typecode, (old[e] for e in keep)))
+        self.removed.clear()
+
+    def _edges(self, node, forward):
+        if self._out is None:
+            self.compact()
+        offsets, edges = self._out if forward else self._in
+        if node + 1 < len(offsets):
+            for i in range(offsets[node], offsets[node + 1]):
+                e = edges[i]
+                if e not in self.removed:
+                    yield e
+        for e in (self._delta_out if forward else self._delta_in).get(node, ()):
+            if e not in self.removed:
+                yield e
+
+    # {node: (rev, depth)} reachable from (node, rev), nearest first
+    def _walk(self, node, rev, forward):
+        seen = OrderedDict([(node, (rev, 0))])
+        queue = deque([(node, rev, 0)])
+        while queue:
+            n, r, depth = queue.popleft()
+            for e in self._edges(n, forward):
+                if forward:
+                    if self.end_from[e] < r:
+                        continue
+                    nxt, nrev = self.dst[e], self.end_to[e]
+                    better = nxt not in seen or nrev < seen[nxt][0]
+                else:
+                    if self.end_to[e] > r:
+                        continue
+                    nxt, nrev = self.src[e], self.end_from[e]
+                    better = nxt not in seen or nrev > seen[nxt][0]
+                if better:
+                    seen[nxt] = (nrev, seen[nxt][1] if nxt in seen else depth + 1)
+                    queue.append((nxt, nrev, depth + 1))
+        return seen
+
+    # {path: rev} the content of path#rev (head if None) came from
+    def ancestors(self, path, rev=None):
+        node = self.ids.get(path)
+        if node is None:
+            return OrderedDict()
+        walk = self._walk(node, _MAX_REV if rev is None else rev, False)
+        return OrderedDict((self.paths[n], r) for n, (r, _) in walk.items() if n != node)
+
+    # {path: rev} that path#rev (any rev if None) was integrated into
+    def descendants(self, path, rev=None):
+        node = self.ids.get(path)
+        if node is None:
+            return OrderedDict()
+        walk = self._walk(node, 0 if rev is None else rev, True)
+        return OrderedDict((self.paths[n], r) for n, (r, _) in walk.items() if n != node)
+
+    # Nearest common ancestor (path, rev) of two files, or None
+    def merge_base(self, path_a, path_b, rev_a=None, rev_b=None):
+        a, b = self.ids.get(path_a), self.ids.get(path_b)
+        if a is None or b is None:
+            return None
+        walk_a = self._walk(a, _MAX_REV if rev_a is None else rev_a, False)
+        walk_b = self._walk(b, _MAX_REV if rev_b is None else rev_b, False)
+        common = [(walk_a[n][1] + walk_b[n][1], self.paths[n], min(walk_a[n][0], walk_b[n][0]))
+                  for n in walk_a if n in walk_b]
+        if not common:
+            return None
+        _, path, rev = min(common)
+        return path, rev
+
+    # [(path, rev)] under prefix reached by the revisions submitted in change
+    def propagated(self, change, prefix):
+        with self.engine.connect() as conn:
+            revs = conn.execute(select([Revcx.depotFile, Revcx.depotRev]).where(
+                Revcx.change == change)).fetchall()
+        reached = {}
+        for depot_file, depot_rev in revs:
+            if depot_file.startswith(prefix):
+                reached[depot_file] = depot_rev
+            for path, rev in self.descendants(depot_file, depot_rev).items():
+                if path.startswith(prefix) and rev < reached.get(path, _MAX_REV):
+                    reached[path] = rev
+        return sorted(reached.items())
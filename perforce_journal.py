@@ -0,0 +1,151 @@
+# Streaming reader for P4D checkpoint and journal files.
+#
+# Every record is a line of space separated fields:
+#     @pv@ 9 @db.rev@ @//depot/main.c@ 5 0 @edit@ 12345 ...
+# Strings are wrapped in '@' (a literal '@' is doubled) and may span lines;
+# numbers are bare. The record columns follow the declaration order of the
+# matching perforce_model class, so conversion is driven by each __table__.
+from collections import namedtuple
+
+from sqlalchemy import BigInteger, Binary, Integer, SmallInteger
+
+from perforce_model import table
+
+# op: pv (put), dv (delete), rv (replace), ex/mx/nx/vv (markers)
+JournalRecord = namedtuple('JournalRecord', 'op version table values offset')
+
+DATA_OPS = ('pv', 'dv', 'rv')
+
+_INTEGER_TYPES = (Integer, BigInteger, SmallInteger)
+
+
+# Split one record into its fields; None while a quoted field is still open.
+def split_record(text):
+    fields = []
+    append = fields.append
+    find = text.find
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c == '@':
+            j = find('@', i + 1)
+            while j != -1 and text.startswith('@', j + 1):
+                j = find('@', j + 2)
+            if j == -1:
+                return None
+            append(text[i + 1:j].replace('@@', '@'))
+            i = j + 1
+        elif c in ' \r\n':
+            i += 1
+        else:
+            j = find(' ', i)
+            if j == -1:
+                j = n
+            append(text[i:j].rstrip('\r\n'))
+            i = j
+    return fields
+
+
+# Incremental record assembly from complete lines, for readers that get the
+# input in pieces (e.g. tailing a live journal). offset is the byte position
+# just past the last complete record, which is what replicas persist as
+# their applied position.
+class RecordParser(object):
+    def __init__(self, offset=0, encoding='utf-8'):
+        self.offset = offset
+        self.encoding = encoding
+        self._consumed = offset
+        self._pending = None
+
+    def feed(self, raw):
+        self._consumed += len(raw)
+        line = raw.decode(self.encoding, 'replace')
+        if self._pending is not None:
+            line = self._pending + line
+        fields = split_record(line)
+        if fields is None:
+            self._pending = line
+            return None
+        self._pending = None
+        self.offset = self._consumed
+        if len(fields) < 3:
+            return None
+        return JournalRecord(fields[0], fields[1], fields[2], fields[3:], self.offset)
+
+
+# Yield JournalRecords from a binary stream
+def iter_records(stream, offset=0, encoding='utf-8'):
+    feed = RecordParser(offset, encoding).feed
+    for raw in stream:
+        record = feed(raw)
+        if record is not None:
+            yield record
+
+
+# db.rev -> perforce.rev, db.have.pt -> perforce.have_pt, tiny.db -> perforce.tiny_db
+def table_name(dbname):
+    if dbname.startswith('db.'):
+        dbname = dbname[3:]
+    return dbname.replace('.', '_')
+
+
+def table_for(dbname):
+    return table('perforce.' + table_name(dbname))
+
+
+def _octets(value):
+    try:
+        return bytes.fromhex(value)
+    except ValueError:
+        return value.encode('utf-8', 'surrogateescape')
+
+
+def _converter(column):
+    if isinstance(column.type, _INTEGER_TYPES):
+        return int
+    if isinstance(column.type, Binary):
+        return _octets
+    return None
+
+
+# Columns that are filled from journal fields, in record order. Columns
+# flagged info['derived'] are computed by the loaders instead.
+def journal_columns(table):
+    return [c for c in table.columns if not c.info.get('derived')]
+
+
+# Builds typed row tuples for one table from raw journal field lists.
+class RowConverter(object):
+    def __init__(self, table):
+        self.table = table
+        self.columns = journal_columns(table)
+        self.width = len(self.columns)
+        self.converters = [_converter(c) for c in self.columns]
+
+    def __call__(self, values):
+        row = []
+        append = row.append
+        for convert, value in zip(self.converters, values):
+            if value == '' and convert is not None:
+                append(None)
+            elif convert is None:
+                append(value)
+            else:
+                append(convert(value))
+        if len(row) < self.width:
+            row.extend([None] * (self.width - len(row)))
+        return tuple(row)
+
+    def as_dict(self, row):
+        return dict(zip((c.key for c in self.columns), row))
+
+
+_converters = {}
+
+
+def converter_for(table):
+    conv = _converters.get(table.key)
+    if conv is None:
+        conv = _converters[table.key] = RowConverter(table)
+    return conv
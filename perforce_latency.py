@@ -0,0 +1,310 @@
+# Latency percentiles of CommandEnd f_lapse from mergeable sketches.
+#
+#   rollup = LatencyRollup(engine, bucket_seconds=3600)
+#   ingester.add_sink(rollup.sink)              # perforce_log_ingest
+#   rollup.quantiles(since, until, func='user-sync', group_by='host')
+#
+# Every completed command adds its lapse_ms to a DDSketch for its time bucket
+# (command end, floored to bucket_seconds) and func/user/host/serverid. A
+# DDSketch keeps counts in logarithmic bins of ratio gamma = (1+a)/(1-a), so
+# any quantile is returned within relative error a (1% by default), and two
+# sketches merge by adding bin counts. The sketches are stored encoded in
+# perforce.latency_sketch and merged into on each flush; p50/p95/p99 over a
+# window and any filter come from merging the matching rows, without
+# reading command_events or raw_events. backfill() rebuilds a window from
+# command_events, e.g. for data ingested before the rollup existed.
+import math
+import struct
+from collections import OrderedDict
+
+from sqlalchemy import and_, select, tuple_
+
+from perforce_log_model import CommandEvents, LatencySketch
+from perforce_sql import upsert
+
+DIMENSIONS = ('func', 'user_name', 'host', 'serverid')
+QUANTILES = (0.5, 0.95, 0.99)
+
+_VERSION = 1
+_HEADER = struct.Struct('<Bd')
+
+
+def _put_varint(out, n):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7f) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+class DDSketch(object):
+    __slots__ = ('alpha', 'gamma', '_log_gamma', 'bins', 'zeros', 'count', 'max_bins')
+
+    def __init__(self, alpha=0.01, max_bins=2048):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {}
+        self.zeros = 0
+        self.count = 0
+        self.max_bins = max_bins
+
+    def add(self, value, count=1):
+        if value <= 0:
+            self.zeros += count
+        else:
+            i = int(math.ceil(math.log(value) / self._log_gamma))
+            self.bins[i] = self.bins.get(i, 0) + count
+            if len(self.bins) > self.max_bins:
+                self._collapse()
+        self.count += count
+
+    # Fold the lowest bins together; the tail quantiles stay exact to alpha
+    def _collapse(self):
+        keys = sorted(self.bins)
+        extra = len(keys) - self.max_bins
+        target = keys[extra]
+        for k in keys[:extra]:
+            self.bins[target] += self.bins.pop(k)
+
+    def merge(self, other):
+        if other.alpha != self.alpha:
+            raise ValueError('cannot merge sketches of accuracy %s and %s' % (
+                self.alpha, other.alpha))
+        for i, n in other.bins.items():
+            self.bins[i] = self.bins.get(i, 0) + n
+        self.zeros += other.zeros
+        self.count += other.count
+        if len(self.bins) > self.max_bins:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if seen > rank:
+            return 0.0
+        for i in sorted(self.bins):
+            seen += self.bins[i]
+            if seen > rank:
+                return 2 * self.gamma ** i / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    # version, alpha, zero count, bin count, then (index delta, count) pairs
+    # as zigzag/plain varints: a few hundred bytes for a typical bucket
+    def encode(self):
+        out = bytearray(_HEADER.pack(_VERSION, self.alpha))
+        _put_varint(out, self.zeros)
+        _put_varint(out, len(self.bins))
+        last = 0
+        for i in sorted(self.bins):
+            delta = i - last
+            _put_varint(out, (delta << 1) ^ (delta >> 63))
+            _put_varint(out, self.bins[i])
+            last = i
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        data = bytes(data)
+        version, alpha = _HEADER.unpack_from(data)
+        if version != _VERSION:
+            raise ValueError('unknown sketch version %d' % version)
+        sketch = cls(alpha)
+        pos = _HEADER.size
+        sketch.zeros, pos = _get_varint(data, pos)
+        n, pos = _get_varint(data, pos)
+        last = 0
+        count = sketch.zeros
+        for _ in range(n):
+            z, pos = _get_varint(data, pos)
+            last += (z >> 1) ^ -(z & 1)
+            c, pos = _get_varint(data, pos)
+            sketch.bins[last] = c
+            count += c
+        sketch.count = count
+        return sketch
+
+
+class _Cell(object):
+    __slots__ = ('sketch', 'total', 'low', 'high')
+
+    def __init__(self, alpha):
+        self.sketch = DDSketch(alpha)
+        self.total = 0
+        self.low = self.high = None
+
+    def add(self, ms):
+        self.sketch.add(ms)
+        self.total += ms
+        self.low = ms if self.low is None or ms < self.low else self.low
+        self.high = ms if self.high is None or ms > self.high else self.high
+
+    def merge_row(self, row):
+        self.sketch.merge(DDSketch.decode(row.sketch))
+        self.total += row.sum_ms or 0
+        if row.min_ms is not None:
+            self.low = row.min_ms if self.low is None else min(self.low, row.min_ms)
+        if row.max_ms is not None:
+            self.high = row.max_ms if self.high is None else max(self.high, row.max_ms)
+
+
+class LatencyRollup(object):
+    def __init__(self, engine, bucket_seconds=3600, alpha=0.01, chunk_size=500):
+        self.engine = engine
+        self.bucket_seconds = bucket_seconds
+        self.alpha = alpha
+        self.chunk_size = chunk_size
+        self.pending = {}
+
+    def _key(self, end, func, user, host, serverid):
+        return (end - end % self.bucket_seconds, func or '', user or '', host or '',
+                serverid or '')
+
+    def add(self, end, lapse, func=None, user=None, host=None, serverid=None):
+        if end is None or lapse is None:
+            return
+        key = self._key(end, func, user, host, serverid)
+        cell = self.pending.get(key)
+        if cell is None:
+            cell = self.pending[key] = _Cell(self.alpha)
+        cell.add(lapse)
+
+    # command_events rows, as written by CommandIngester
+    def add_rows(self, rows):
+        for r in rows:
+            self.add(r['command_end_timestamp'], r['lapse_ms'], r['func'], r['user_name'],
+                     r['host'], r['serverid'])
+
+    # Sink for CommandIngester: every written batch is folded in right away
+    def sink(self, rows):
+        self.add_rows(rows)
+        self.flush()
+
+    # Merge pending cells into their stored rows, one transaction per chunk
+    def flush(self):
+        table = LatencySketch.__table__
+        key_columns = [table.c.bucket] + [table.c[d] for d in DIMENSIONS]
+        pending, self.pending = self.pending, {}
+        keys = list(pending)
+        for i in range(0, len(keys), self.chunk_size):
+            chunk = keys[i:i + self.chunk_size]
+            with self.engine.begin() as conn:
+                stmt = select([table]).where(tuple_(*key_columns).in_(chunk))
+                if conn.dialect.name == 'postgresql':
+                    stmt = stmt.with_for_update()
+                for row in conn.execute(stmt):
+                    pending[tuple(row[c] for c in key_columns)].merge_row(row)
+                upsert(conn, table, [self._row(key, pending[key]) for key in chunk])
+        return len(keys)
+
+    @staticmethod
+    def _row(key, cell):
+        row = dict(zip(('bucket',) + DIMENSIONS, key))
+        row.update(count=cell.sketch.count, sum_ms=cell.total, min_ms=cell.low,
+                   max_ms=cell.high, sketch=cell.sketch.encode())
+        return row
+
+    # Rebuild [since, until) from command_events, replacing what is stored
+    def backfill(self, since, until, fetch_size=50000):
+        since -= since % self.bucket_seconds
+        if until % self.bucket_seconds:
+            until += self.bucket_seconds - until % self.bucket_seconds
+        events = CommandEvents.__table__
+        self.pending = {}
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(select([
+                events.c.command_end_timestamp, events.c.lapse_ms, events.c.func,
+                events.c.user_name, events.c.host, events.c.serverid]).where(and_(
+                    events.c.command_end_timestamp >= since,
+                    events.c.command_end_timestamp < until)))
+            while True:
+                rows = result.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    self.add(*row)
+        with self.engine.begin() as conn:
+            conn.execute(LatencySketch.__table__.delete().where(and_(
+                LatencySketch.bucket >= since, LatencySketch.bucket < until)))
+        return self.flush()
+
+    # {group: {count, mean, min, max, p50, ...}} over buckets in [since, until);
+    # group_by is one of DIMENSIONS, 'bucket', or None for a single total
+    def quantiles(self, since=None, until=None, quantiles=QUANTILES, group_by=None, **filters):
+        table = LatencySketch.__table__
+        where = []
+        if since is not None:
+            where.append(table.c.bucket >= since - since % self.bucket_seconds)
+        if until is not None:
+            where.append(table.c.bucket < until)
+        for name, value in filters.items():
+            if name not in DIMENSIONS:
+                raise ValueError('unknown dimension %r' % name)
+            where.append(table.c[name] == (value or ''))
+        if group_by is not None and group_by != 'bucket' and group_by not in DIMENSIONS:
+            raise ValueError('unknown dimension %r' % group_by)
+        cells = OrderedDict()
+        with self.engine.connect() as conn:
+            stmt = select([table]).where(and_(*where)).order_by(
+                table.c[group_by] if group_by else table.c.bucket)
+            for row in conn.execute(stmt):
+                group = row[group_by] if group_by else None
+                cell = cells.get(group)
+                if cell is None:
+                    cell = cells[group] = _Cell(self.alpha)
+                cell.merge_row(row)
+        summary = OrderedDict()
+        for group, cell in cells.items():
+            count = cell.sketch.count
+            stats = OrderedDict([('count', count),
+                                 ('mean_ms', round(cell.total / float(count), 1) if count else None),
+                                 ('min_ms', cell.low), ('max_ms', cell.high)])
+            for q in quantiles:
+                value = cell.sketch.quantile(q)
+                if value is not None:
+                    # the bin midpoint can fall just outside the observed range
+                    value = round(min(max(value, cell.low), cell.high), 1)
+                stats['p%g' % (q * 100)] = value
+            summary[group] = stats
+        return summary if group_by else summary.get(None, OrderedDict([('count', 0)]))
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from perforce_model import create_engine
+
+    parser = argparse.ArgumentParser(description='Command latency percentiles from the rollup')
+    parser.add_argument('url')
+    parser.add_argument('--since', type=int, help='epoch seconds')
+    parser.add_argument('--until', type=int, help='epoch seconds')
+    parser.add_argument('--group-by', choices=('bucket',) + DIMENSIONS)
+    parser.add_argument('--bucket-seconds', type=int, default=3600)
+    parser.add_argument('--backfill', action='store_true',
+                        help='rebuild the window from command_events first')
+    for name in DIMENSIONS:
+        parser.add_argument('--' + name.replace('_', '-'), dest=name)
+    args = parser.parse_args()
+
+    rollup = LatencyRollup(create_engine(args.url), bucket_seconds=args.bucket_seconds)
+    if args.backfill:
+        if args.since is None or args.until is None:
+            parser.error('--backfill needs --since and --until')
+        rollup.backfill(args.since, args.until)
+    filters = dict((d, getattr(args, d)) for d in DIMENSIONS if getattr(args, d) is not None)
+    print(json.dumps(rollup.quantiles(args.since, args.until, group_by=args.group_by,
+                                      **filters), indent=2))
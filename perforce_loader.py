@@ -0,0 +1,276 @@
+# Bulk loader for P4D checkpoints and journals into the perforce schema.
+#
+# Records are parsed in a single streaming pass and batched per table. Each
+# table gets its own writer thread fed through a bounded queue, so memory is
+# capped at roughly tables * queue_depth * batch_size rows. PostgreSQL
+# batches go through COPY FROM STDIN; other dialects (SQLite for local runs)
+# use a DBAPI executemany.
+import io
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from perforce_journal import converter_for, iter_records, journal_columns, table_for
+
+log = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+# Per-table counters for the throughput report
+class TableStats(object):
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.batches = 0
+        self.busy = 0.0
+        self.first = None
+        self.last = None
+
+    @property
+    def elapsed(self):
+        if self.first is None:
+            return 0.0
+        return self.last - self.first
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return OrderedDict([
+            ('table', self.name),
+            ('rows', self.rows),
+            ('batches', self.batches),
+            ('seconds', round(self.elapsed, 3)),
+            ('write_seconds', round(self.busy, 3)),
+            ('rows_per_sec', round(self.rows_per_sec, 1)),
+        ])
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bytes):
+        return '\\\\x' + value.hex()
+    if isinstance(value, str):
+        return (value.replace('\\', '\\\\').replace('\t', '\\t')
+                .replace('\n', '\\n').replace('\r', '\\r'))
+    return str(value)
+
+
+# Writes batches of row tuples to one table
+class BatchWriter(object):
+    def __init__(self, engine, table, columns):
+        self.engine = engine
+        self.table = table
+        self.columns = columns
+        preparer = engine.dialect.identifier_preparer
+        self.column_list = ', '.join(preparer.quote(c.name) for c in columns)
+        self.table_name = preparer.format_table(table)
+        if engine.dialect.name == 'postgresql':
+            self.write = self._copy
+            self.sql = 'COPY %s (%s) FROM STDIN' % (self.table_name, self.column_list)
+        else:
+            self.write = self._executemany
+            compiled = table.insert().compile(
+                dialect=engine.dialect, column_keys=[c.key for c in columns])
+            self.sql = str(compiled)
+            keys = [c.key for c in columns]
+            order = compiled.positiontup if engine.dialect.positional else None
+            if order is None:
+                self.shape = lambda row: dict(zip(keys, row))
+            elif list(order) == keys:
+                self.shape = None
+            else:
+                index = [keys.index(k) for k in order]
+                self.shape = lambda row: tuple(row[i] for i in index)
+
+    def _copy(self, rows):
+        buf = io.StringIO()
+        write = buf.write
+        for row in rows:
+            write('\t'.join(map(_copy_value, row)))
+            write('\n')
+        buf.seek(0)
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.copy_expert(self.sql, buf)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _executemany(self, rows):
+        if self.shape is not None:
+            rows = [self.shape(row) for row in rows]
+        conn = self.engine.raw_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(self.sql, rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+
+class CheckpointLoader(object):
+    def __init__(self, engine, batch_size=10000, queue_depth=4, workers=4,
+                 tables=None, encoding='utf-8'):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.queue_depth = queue_depth
+        self.tables = set(tables) if tables else None
+        self.encoding = encoding
+        self.stats = OrderedDict()
+        self.skipped = 0
+        self.unknown = set()
+        self.transforms = []
+        self._slots = threading.BoundedSemaphore(workers)
+        self._queues = {}
+        self._threads = []
+        self._errors = []
+
+    # Register fn(table, columns, rows) -> (columns, rows), applied per batch
+    def add_transform(self, fn):
+        self.transforms.append(fn)
+
+    def load(self, source):
+        if isinstance(source, str):
+            with open(source, 'rb') as stream:
+                return self._load(stream)
+        return self._load(source)
+
+    def _load(self, stream):
+        started = time.time()
+        batches = {}
+        for record in iter_records(stream, encoding=self.encoding):
+            if record.op != 'pv':
+                self.skipped += 1
+                continue
+            table = table_for(record.table)
+            if table is None:
+                self.unknown.add(record.table)
+                continue
+            if self.tables is not None and table.name not in self.tables:
+                continue
+            batch = batches.get(table.key)
+            if batch is None:
+                batch = batches[table.key] = (table, converter_for(table), [])
+            batch[2].append(batch[1](record.values))
+            if len(batch[2]) >= self.batch_size:
+                self._submit(table, batch[2])
+                batches[table.key] = (table, batch[1], [])
+            if self._errors:
+                break
+        for table, _, rows in batches.values():
+            if rows:
+                self._submit(table, rows)
+        for q in self._queues.values():
+            q.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        self.seconds = time.time() - started
+        return self.report()
+
+    def _submit(self, table, rows):
+        q = self._queues.get(table.key)
+        if q is None:
+            q = self._queues[table.key] = queue.Queue(self.queue_depth)
+            self.stats[table.name] = TableStats(table.name)
+            thread = threading.Thread(target=self._worker, args=(table, q),
+                                      name='load-%s' % table.name)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+        q.put(rows)
+
+    def _worker(self, table, q):
+        stats = self.stats[table.name]
+        writer = None
+        columns = journal_columns(table)
+        while True:
+            rows = q.get()
+            if rows is _STOP:
+                return
+            if self._errors:
+                continue
+            try:
+                batch_columns = columns
+                for transform in self.transforms:
+                    batch_columns, rows = transform(table, batch_columns, rows)
+                if writer is None or writer.columns != batch_columns:
+                    writer = BatchWriter(self.engine, table, batch_columns)
+                with self._slots:
+                    t0 = time.time()
+                    if stats.first is None:
+                        stats.first = t0
+                    writer.write(rows)
+                    stats.last = time.time()
+                stats.busy += stats.last - t0
+                stats.rows += len(rows)
+                stats.batches += 1
+            except Exception as e:
+                log.exception('loading %s failed', table.name)
+                self._errors.append(e)
+
+    def report(self):
+        return [s.as_dict() for s in sorted(self.stats.values(), key=lambda s: -s.rows)]
+
+    def format_report(self):
+        lines = ['%-20s %12s %10s %12s' % ('table', 'rows', 'seconds', 'rows/s')]
+        for entry in self.report():
+            lines.append('%-20s %12d %10.2f %12.1f' % (
+                entry['table'], entry['rows'], entry['seconds'], entry['rows_per_sec']))
+        return '\n'.join(lines)
+
+
+def load_checkpoint(engine, path, **kwargs):
+    loader = CheckpointLoader(engine, **kwargs)
+    loader.load(path)
+    return loader
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from perforce_indexes import create_indexes, create_tables
+    from perforce_model import create_engine, use_path_ids
+
+    parser = argparse.ArgumentParser(description='Load a P4D checkpoint or journal')
+    parser.add_argument('url')
+    parser.add_argument('checkpoint')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--table', action='append', dest='tables')
+    parser.add_argument('--create', action='store_true',
+                        help='create missing tables without secondary indexes')
+    parser.add_argument('--index', action='store_true',
+                        help='build secondary indexes (concurrently) after the load')
+    parser.add_argument('--paths', action='store_true',
+                        help='path-dictionary mode: intern depot/client paths in perforce.paths')
+    parser.add_argument('--headrev', action='store_true',
+                        help='maintain perforce.headrev from the loaded rev records')
+    args = parser.parse_args()
+    if args.paths:
+        use_path_ids()
+
+    engine = create_engine(args.url)
+    if args.create:
+        create_tables(engine, with_indexes=False)
+    loader = CheckpointLoader(engine, batch_size=args.batch_size, workers=args.workers,
+                              tables=args.tables)
+    if args.paths:
+        from perforce_paths import PathDictionary
+        loader.add_transform(PathDictionary(engine).transform)
+    if args.headrev:
+        from perforce_headrev import HeadRevIndex
+        loader.add_transform(HeadRevIndex(engine).transform)
+    loader.load(args.checkpoint)
+    print(loader.format_report())
+    if args.index:
+        for name, seconds in create_indexes(engine, concurrently=True, tables=args.tables):
+            print('%-40s %8.2fs' % (name, seconds))
@@ -0,0 +1,421 @@
+# Single-box ingestion of structured server logs (all.csv / commands.csv).
+#
+# Rows are parsed with the C csv reader and folded into an in-memory table
+# of open commands keyed on f_cmdident. Event time (f_timestamp) drives a
+# watermark: a command is flushed once its CommandEnd is older than the
+# allowed lateness, and a command that never ends is flushed as incomplete
+# after session_timeout seconds without events. Flushed commands are written
+# in batches to perforce.command_events, where late events for an already
+# written command are merged into the existing row (an upsert on PostgreSQL,
+# a read and rewrite of the stored rows elsewhere).
+import csv
+import gc
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from itertools import chain, islice
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from perforce_log_model import CommandEvents
+from perforce_tail import FileFollower
+
+COMMON_FIELDS = (
+    'f_eventtype', 'f_timestamp', 'f_timestamp2', 'f_date', 'f_pid',
+    'f_cmdident', 'f_serverid', 'f_cmdno', 'f_user', 'f_client', 'f_func',
+    'f_host', 'f_prog', 'f_version', 'f_args', 'f_cmdgroup',
+)
+
+# Event-specific suffix fields, by major event type
+EVENT_FIELDS = {
+    '0': (),
+    '1': ('f_lapse', 'f_memory'),
+    '2': ('f_lapse', 'f_reason', 'f_memory'),
+    '3': ('f_severity', 'f_msg'),
+    '4': ('f_severity', 'f_msg'),
+    '5': ('f_severity', 'f_msg'),
+    '6': ('f_action', 'f_file', 'f_rev', 'f_filesize'),
+    '7': ('f_cpu', 'f_io', 'f_memory'),
+}
+
+COMMAND_END, AUDIT = '2', '6'
+ERRORS = ('3', '4', '5')
+
+_TS = COMMON_FIELDS.index('f_timestamp')
+_IDENT = COMMON_FIELDS.index('f_cmdident')
+_SERVER = COMMON_FIELDS.index('f_serverid')
+_USER = COMMON_FIELDS.index('f_user')
+_CLIENT = COMMON_FIELDS.index('f_client')
+_FUNC = COMMON_FIELDS.index('f_func')
+_HOST = COMMON_FIELDS.index('f_host')
+_ARGS = COMMON_FIELDS.index('f_args')
+_SUFFIX = len(COMMON_FIELDS)
+
+# Slots of an open command; audit and error events are kept as raw
+# (timestamp, suffix fields) pairs and only turned into JSON on flush.
+# C_FIRST and C_LAST are the file offsets of the chunks holding its first and
+# latest events, for follow().
+(C_IDENT, C_START, C_END, C_USER, C_CLIENT, C_FUNC, C_HOST, C_SERVER, C_ARGS,
+ C_LAPSE, C_EVENTS, C_AUDITS, C_ERRORS, C_SEEN, C_FIRST, C_LAST) = range(16)
+
+# Stored rows read back per query when merging on databases without upsert
+_MERGE_BATCH = 500
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# f_lapse is in milliseconds; fractions are rounded
+def lapse_ms(value):
+    if not value:
+        return None
+    try:
+        return int(round(float(value)))
+    except ValueError:
+        return None
+
+
+def _field(fields, i):
+    return fields[i] if len(fields) > i else None
+
+
+def audit_event(ts, fields):
+    return {
+        'action': _field(fields, 0),
+        'file': _field(fields, 1),
+        'rev': _int(_field(fields, 2)),
+        'filesize': _int(_field(fields, 3)),
+        'timestamp': ts,
+    }
+
+
+def error_event(ts, fields):
+    return {'severity': _field(fields, 0), 'msg': _field(fields, 1), 'timestamp': ts}
+
+
+# A stored command_events row updated with a later row for the same command,
+# by the same rules as the PostgreSQL upsert
+def merge_command(old, new):
+    row = dict(old)
+    starts = [t for t in (old['command_start_timestamp'], new['command_start_timestamp'])
+              if t is not None]
+    row.update(
+        command_start_timestamp=min(starts) if starts else None,
+        command_end_timestamp=(new['command_end_timestamp']
+                               if new['command_end_timestamp'] is not None
+                               else old['command_end_timestamp']),
+        lapse_ms=new['lapse_ms'] if new['lapse_ms'] is not None else old['lapse_ms'],
+        event_count=(old['event_count'] or 0) + (new['event_count'] or 0),
+        audit_events=(old['audit_events'] or []) + (new['audit_events'] or []),
+        error_events=(old['error_events'] or []) + (new['error_events'] or []),
+        is_complete=bool(old['is_complete'] or new['is_complete']),
+        last_updated=new['last_updated'])
+    return row
+
+
+class CommandIngester(object):
+    def __init__(self, engine, allowed_lateness=60, session_timeout=600,
+                 batch_size=5000):
+        self.engine = engine
+        self.allowed_lateness = allowed_lateness
+        self.session_timeout = session_timeout
+        self.batch_size = batch_size
+        self.open = {}
+        self.watermark = 0
+        self.events = 0
+        self.bad_rows = 0
+        self.written = 0
+        self.sinks = []
+        self._ended = deque()
+        self._ready = []
+        self._next_sweep = 0
+        # follow() state: offset of the chunk being ingested, commands written
+        # since the saved offset (ident: offset of their last chunk) and the
+        # written commands whose events a resumed follow() drops
+        self._chunk_offset = 0
+        self._recent = None
+        self._skip = set()
+
+    # sink(rows) receives every batch of command rows after it is written
+    def add_sink(self, fn):
+        self.sinks.append(fn)
+
+    # The open-command table creates no reference cycles, and with millions of
+    # small lists alive the cyclic collector alone costs ~40% of the loop.
+    def ingest_rows(self, rows, chunk_size=8192):
+        rows = iter(rows)
+        total = 0
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            while True:
+                count = self._ingest_chunk(islice(rows, chunk_size))
+                total += count
+                self._evict()
+                if count < chunk_size:
+                    return total
+        finally:
+            if collecting:
+                gc.enable()
+
+    def _ingest_chunk(self, rows):
+        open_ = self.open
+        ended = self._ended
+        watermark = self.watermark
+        offset = self._chunk_offset
+        count = bad = 0
+        for row in rows:
+            count += 1
+            if len(row) < _SUFFIX:
+                bad += 1
+                continue
+            try:
+                ts = int(row[_TS])
+            except ValueError:
+                bad += 1
+                continue
+            if ts > watermark:
+                watermark = ts
+            ident = row[_IDENT]
+            cmd = open_.get(ident)
+            if cmd is None:
+                cmd = open_[ident] = [ident, ts, None, row[_USER], row[_CLIENT], row[_FUNC],
+                                      row[_HOST], row[_SERVER], row[_ARGS], None, 0, [], [], ts,
+                                      offset, offset]
+            else:
+                cmd[C_LAST] = offset
+                if ts > cmd[C_SEEN]:
+                    cmd[C_SEEN] = ts
+                if ts < cmd[C_START]:
+                    cmd[C_START] = ts
+            cmd[C_EVENTS] += 1
+            etype = row[0].partition('.')[0]
+            if etype == AUDIT:
+                cmd[C_AUDITS].append((ts, row[_SUFFIX:_SUFFIX + 4]))
+            elif etype == COMMAND_END:
+                cmd[C_END] = ts
+                cmd[C_LAPSE] = row[_SUFFIX] if len(row) > _SUFFIX else None
+                ended.append((ts, ident))
+            elif etype in ERRORS:
+                cmd[C_ERRORS].append((ts, row[_SUFFIX:_SUFFIX + 2]))
+        self.events += count
+        self.bad_rows += bad
+        self.watermark = watermark
+        return count
+
+    def ingest_lines(self, lines):
+        rows = csv.reader(lines)
+        if self._skip:
+            skip = self._skip
+            rows = (row for row in rows if len(row) <= _IDENT or row[_IDENT] not in skip)
+        return self.ingest_rows(rows)
+
+    def ingest_file(self, path):
+        with open(path, newline='', encoding='utf-8', errors='replace') as fh:
+            count = self.ingest_lines(fh)
+        self.close()
+        return count
+
+    # Tail a structured log across serverlog.max.chunksize rotations, a read
+    # (chunk_size bytes of lines) at a time. With state_path the offset of
+    # the oldest command not yet written is saved there after each chunk and
+    # resumed from on the next start, unless the log has been rotated since.
+    # The commands written since that offset are saved with it and their
+    # events skipped on resume, so no command is written twice. Commands
+    # still open when the log rotates keep only the events after it.
+    def follow(self, path, stop=None, poll_interval=0.5, offset=0, state_path=None,
+               chunk_size=1 << 20):
+        if state_path is not None:
+            offset, self._recent = self._load_state(path, state_path, offset)
+            self._skip = set(self._recent)
+        follower = FileFollower(path, offset, chunk_size)
+        while stop is None or not stop():
+            idle = True
+            for lines in follower.chunks(self._rotated):
+                idle = False
+                self._chunk_offset = follower.offset - sum(len(l) for l in lines)
+                self.ingest_lines([l.decode('utf-8', 'replace') for l in lines])
+                if state_path is not None:
+                    self._save_state(follower, state_path)
+                if stop is not None and stop():
+                    break
+            if idle:
+                self.flush(force=False)
+                time.sleep(poll_interval)
+        follower.close()
+        self.close()
+        if state_path is not None:
+            self._save_state(follower, state_path)
+        self._recent = None
+        self._skip = set()
+
+    def _rotated(self):
+        for cmd in chain(self.open.values(), self._ready):
+            cmd[C_FIRST] = cmd[C_LAST] = 0
+        self._chunk_offset = 0
+        self._skip = set()
+        if self._recent is not None:
+            self._recent.clear()
+
+    @staticmethod
+    def _load_state(path, state_path, offset):
+        try:
+            with open(state_path) as fh:
+                state = json.load(fh)
+        except (IOError, ValueError):
+            return offset, {}
+        try:
+            st = os.stat(path)
+        except OSError:
+            return offset, {}
+        if state.get('inode') != st.st_ino or state.get('offset', 0) > st.st_size:
+            return 0, {}
+        return state.get('offset', 0), state.get('written', {})
+
+    def _save_state(self, follower, state_path):
+        offset = follower.offset
+        for cmd in chain(self.open.values(), self._ready):
+            if cmd[C_FIRST] < offset:
+                offset = cmd[C_FIRST]
+        recent = self._recent
+        for ident in [i for i, last in recent.items() if last < offset]:
+            del recent[ident]
+        with open(state_path + '.tmp', 'w') as fh:
+            json.dump({'path': follower.path, 'inode': follower.inode,
+                       'offset': offset, 'written': recent}, fh)
+        os.replace(state_path + '.tmp', state_path)
+
+    def _evict(self):
+        horizon = self.watermark - self.allowed_lateness
+        ended = self._ended
+        open_ = self.open
+        ready = self._ready
+        while ended and ended[0][0] <= horizon:
+            _, ident = ended.popleft()
+            cmd = open_.pop(ident, None)
+            if cmd is not None:
+                ready.append(cmd)
+        if self.watermark >= self._next_sweep:
+            idle = self.watermark - self.session_timeout
+            for ident in [i for i, c in open_.items() if c[C_END] is None and c[C_SEEN] <= idle]:
+                ready.append(open_.pop(ident))
+            self._next_sweep = self.watermark + max(1, self.allowed_lateness // 2)
+        if len(ready) >= self.batch_size:
+            self.flush(force=False)
+
+    def flush(self, force=False):
+        if force:
+            self._ready.extend(self.open.values())
+            self.open.clear()
+            self._ended.clear()
+        ready, self._ready = self._ready, []
+        for i in range(0, len(ready), self.batch_size):
+            self._write([self._row(cmd) for cmd in ready[i:i + self.batch_size]])
+        if self._recent is not None:
+            for cmd in ready:
+                self._recent[cmd[C_IDENT]] = cmd[C_LAST]
+
+    def close(self):
+        self.flush(force=True)
+
+    def _row(self, cmd):
+        return {
+            'cmdident': cmd[C_IDENT],
+            'command_start_timestamp': cmd[C_START],
+            'command_end_timestamp': cmd[C_END],
+            'user_name': cmd[C_USER],
+            'client': cmd[C_CLIENT],
+            'func': cmd[C_FUNC],
+            'host': cmd[C_HOST],
+            'serverid': cmd[C_SERVER],
+            'args': cmd[C_ARGS],
+            'lapse_ms': lapse_ms(cmd[C_LAPSE]),
+            'event_count': cmd[C_EVENTS],
+            'audit_events': [audit_event(ts, fields) for ts, fields in cmd[C_AUDITS]],
+            'error_events': [error_event(ts, fields) for ts, fields in cmd[C_ERRORS]],
+            'is_complete': cmd[C_END] is not None,
+            'last_updated': int(time.time()),
+        }
+
+    def _write(self, rows):
+        if not rows:
+            return
+        with self.engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                conn.execute(self._statement(conn.dialect), rows)
+            else:
+                conn.execute(self._statement(conn.dialect), self._merged(conn, rows))
+        self.written += len(rows)
+        for sink in self.sinks:
+            sink(rows)
+
+    # The rows merged with any stored rows for the same commands
+    @staticmethod
+    def _merged(conn, rows):
+        table = CommandEvents.__table__
+        idents = list(OrderedDict.fromkeys(row['cmdident'] for row in rows))
+        stored = {}
+        for i in range(0, len(idents), _MERGE_BATCH):
+            for old in conn.execute(table.select().where(
+                    table.c.cmdident.in_(idents[i:i + _MERGE_BATCH]))):
+                stored[old.cmdident] = dict(old)
+        for row in rows:
+            old = stored.get(row['cmdident'])
+            stored[row['cmdident']] = row if old is None else merge_command(old, row)
+        return [stored[ident] for ident in idents]
+
+    def _statement(self, dialect):
+        table = CommandEvents.__table__
+        if dialect.name != 'postgresql':
+            return table.insert().prefix_with('OR REPLACE')
+        stmt = pg_insert(table)
+        new, old = stmt.excluded, table.c
+        return stmt.on_conflict_do_update(index_elements=[old.cmdident], set_={
+            'command_start_timestamp': func.least(old.command_start_timestamp,
+                                                  new.command_start_timestamp),
+            'command_end_timestamp': func.coalesce(new.command_end_timestamp,
+                                                   old.command_end_timestamp),
+            'lapse_ms': func.coalesce(new.lapse_ms, old.lapse_ms),
+            'event_count': old.event_count + new.event_count,
+            'audit_events': old.audit_events.op('||')(new.audit_events),
+            'error_events': old.error_events.op('||')(new.error_events),
+            'is_complete': old.is_complete | new.is_complete,
+            'last_updated': new.last_updated,
+        })
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from perforce_model import create_engine
+
+    parser = argparse.ArgumentParser(description='Aggregate structured log events per command')
+    parser.add_argument('url')
+    parser.add_argument('log')
+    parser.add_argument('--follow', action='store_true')
+    parser.add_argument('--state', help='file to keep the --follow offset in, for restarts')
+    parser.add_argument('--allowed-lateness', type=int, default=60)
+    parser.add_argument('--session-timeout', type=int, default=600)
+    parser.add_argument('--latency', action='store_true',
+                        help='maintain the perforce.latency_sketch rollup')
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    ingester = CommandIngester(engine, args.allowed_lateness, args.session_timeout)
+    if args.latency:
+        from perforce_latency import LatencyRollup
+        ingester.add_sink(LatencyRollup(engine).sink)
+    started = time.time()
+    if args.follow:
+        ingester.follow(args.log, state_path=args.state)
+    else:
+        ingester.ingest_file(args.log)
+    elapsed = time.time() - started
+    print('%d events, %d commands in %.2fs (%.0f events/s)' % (
+        ingester.events, ingester.written, elapsed, ingester.events / elapsed if elapsed else 0))
@@ -0,0 +1,130 @@
+# Log-side tables: structured server log data kept next to the metadata
+from sqlalchemy import (BigInteger, Boolean, Column, Index, Integer, JSON, LargeBinary, String,
+                        Text)
+from sqlalchemy.dialects.postgresql import JSONB
+
+from perforce_model import Base
+
+JSONType = JSON().with_variant(JSONB(), 'postgresql')
+
+
+# perforce.command_events - One row per command (f_cmdident), built from its log events
+class CommandEvents(Base):
+    __tablename__ = 'command_events'
+    __table_args__ = (
+        Index('idx_command_events_command_start_timestamp', 'command_start_timestamp'),
+        {'schema': 'perforce'},
+    )
+    cmdident = Column(String, primary_key=True)
+    command_start_timestamp = Column(BigInteger)
+    command_end_timestamp = Column(BigInteger)
+    user_name = Column(String)
+    client = Column(String)
+    func = Column(String)
+    host = Column(String)
+    serverid = Column(String)
+    args = Column(Text)
+    lapse_ms = Column(Integer)
+    event_count = Column(Integer)
+    audit_events = Column(JSONType)
+    error_events = Column(JSONType)
+    is_complete = Column(Boolean)
+    last_updated = Column(BigInteger)
+
+
+# perforce.raw_events - Unified structured log table: one row per event, common
+# prefix fields as columns and the event-specific suffix in f_extra_data.
+# RANGE partitioned on f_timestamp (epoch seconds); see perforce_partitions.
+class RawEvents(Base):
+    __tablename__ = 'raw_events'
+    __table_args__ = (
+        Index('idx_raw_events_f_cmdident', 'f_cmdident'),
+        Index('idx_raw_events_f_user_f_func', 'f_user', 'f_func'),
+        Index('idx_raw_events_f_eventtype', 'f_eventtype'),
+        {'schema': 'perforce', 'postgresql_partition_by': 'RANGE (f_timestamp)'},
+    )
+    f_timestamp = Column(BigInteger, primary_key=True)
+    f_cmdident = Column(String, primary_key=True)
+    f_seq = Column(Integer, primary_key=True)
+    f_eventtype = Column(String, nullable=False)
+    f_timestamp2 = Column(BigInteger)
+    f_date = Column(String)
+    f_pid = Column(BigInteger)
+    f_serverid = Column(String)
+    f_cmdno = Column(Integer)
+    f_user = Column(String)
+    f_client = Column(String)
+    f_func = Column(String)
+    f_host = Column(String)
+    f_prog = Column(String)
+    f_version = Column(String)
+    f_args = Column(Text)
+    f_cmdgroup = Column(String)
+    f_extra_data = Column(JSONType)
+    ingested_at = Column(BigInteger)
+
+
+# perforce.command_change - Resolved changelist of a command (f_cmdident),
+# maintained by perforce_correlation. source: args, rev or time.
+class CommandChange(Base):
+    __tablename__ = 'command_change'
+    __table_args__ = (
+        Index('idx_command_change_change', 'change'),
+        {'schema': 'perforce'},
+    )
+    cmdident = Column(String, primary_key=True)
+    change = Column(Integer)
+    file_count = Column(Integer)
+    total_bytes = Column(BigInteger)
+    source = Column(String)
+    updated = Column(BigInteger)
+
+
+# perforce.latency_sketch - CommandEnd f_lapse rollup: one mergeable DDSketch
+# (perforce_latency) per time bucket and func/user/host/serverid, missing
+# values stored as ''. Maintained on ingest by perforce_latency.
+class LatencySketch(Base):
+    __tablename__ = 'latency_sketch'
+    __table_args__ = (
+        Index('idx_latency_sketch_func_bucket', 'func', 'bucket'),
+        Index('idx_latency_sketch_user_name_bucket', 'user_name', 'bucket'),
+        {'schema': 'perforce'},
+    )
+    bucket = Column(BigInteger, primary_key=True)
+    func = Column(String, primary_key=True)
+    user_name = Column(String, primary_key=True)
+    host = Column(String, primary_key=True)
+    serverid = Column(String, primary_key=True)
+    count = Column(BigInteger)
+    sum_ms = Column(BigInteger)
+    min_ms = Column(Integer)
+    max_ms = Column(Integer)
+    sketch = Column(LargeBinary)
+
+
+# perforce.command_rollup - Command counts, lapse and error sums and correlated
+# file counts per grain (60, 3600 or 86400 seconds), bucket start and
+# func/user/host/serverid/client, missing values stored as ''. Minutes are
+# built from command_events, hours from minutes, days from hours; see
+# perforce_rollup.
+class CommandRollup(Base):
+    __tablename__ = 'command_rollup'
+    __table_args__ = (
+        Index('idx_command_rollup_grain_user_name_bucket', 'grain', 'user_name', 'bucket'),
+        Index('idx_command_rollup_grain_func_bucket', 'grain', 'func', 'bucket'),
+        {'schema': 'perforce'},
+    )
+    grain = Column(Integer, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)
+    func = Column(String, primary_key=True)
+    user_name = Column(String, primary_key=True)
+    host = Column(String, primary_key=True)
+    serverid = Column(String, primary_key=True)
+    client = Column(String, primary_key=True)
+    commands = Column(BigInteger)
+    completed = Column(BigInteger)
+    lapse_count = Column(BigInteger)
+    lapse_sum_ms = Column(BigInteger)
+    errors = Column(BigInteger)
+    files = Column(BigInteger)
+    bytes = Column(BigInteger)
@@ -0,0 +1,258 @@
+# Compiled view mappings (client, stream, server and remote views).
+#
+# A MapTable is built once from the mapping lines of a view and translates
+# paths in either direction. Each side of a line is compiled to a regex with
+# one group per wildcard ('...' any characters, '*' and '%%n' within one
+# path component); the opposite side becomes a template filled from those
+# groups ('...' and '*' pair up by position, '%%n' by number). Candidate
+# lines come from a prefix index keyed on the literal text before the first
+# wildcard, probed once per distinct prefix length, so a translation looks at
+# a handful of lines instead of the whole view.
+#
+# Precedence follows p4: the last matching line wins; '-' lines unmap, and
+# a later line that maps a different path onto the same target hides the
+# earlier mapping unless it is a '+' overlay (or '&' ditto) line.
+import re
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from perforce_model import Haveview, Rmtview, Streamview, Streamviewx, Svrview, View, ViewRp
+
+MAP, UNMAP, OVERLAY, DITTO = 'map', 'unmap', 'overlay', 'ditto'
+
+# db.view style numeric mapFlag values, the prefixes of view spec text, and
+# the already parsed names
+_FLAGS = {'0': MAP, '1': UNMAP, '2': OVERLAY, '3': MAP, '4': MAP, '5': DITTO,
+          '': MAP, '-': UNMAP, '+': OVERLAY, '&': DITTO,
+          MAP: MAP, UNMAP: UNMAP, OVERLAY: OVERLAY, DITTO: DITTO}
+
+_WILDCARD = re.compile(r'\.\.\.|\*|%%[0-9]')
+
+
+def parse_flag(flag, path=None):
+    if flag is None and path and path[0] in '-+&':
+        return _FLAGS[path[0]], path[1:]
+    return _FLAGS.get(str(flag).strip() if flag is not None else '', MAP), path
+
+
+class _Side(object):
+    def __init__(self, pattern):
+        self.pattern = pattern
+        parts = []
+        self.keys = []
+        counts = {}
+        pos = 0
+        for m in _WILDCARD.finditer(pattern):
+            parts.append(re.escape(pattern[pos:m.start()]))
+            token = m.group(0)
+            if token.startswith('%%'):
+                key = ('%%', token[2])
+            else:
+                counts[token] = counts.get(token, 0) + 1
+                key = (token, counts[token])
+            self.keys.append(key)
+            parts.append('(.*)' if token == '...' else '([^/]*)')
+            pos = m.end()
+        parts.append(re.escape(pattern[pos:]))
+        self.regex = re.compile(''.join(parts) + r'\Z', re.DOTALL)
+        first = _WILDCARD.search(pattern)
+        self.prefix = pattern[:first.start()] if first else pattern
+        self.literal = first is None
+        # template pieces: strings and wildcard keys, in order
+        self.template = []
+        pos = 0
+        for m, key in zip(_WILDCARD.finditer(pattern), self.keys):
+            self.template.append(pattern[pos:m.start()])
+            self.template.append(key)
+            pos = m.end()
+        self.template.append(pattern[pos:])
+
+    def match(self, path):
+        if self.literal:
+            return {} if path == self.pattern else None
+        m = self.regex.match(path)
+        if m is None:
+            return None
+        return dict(zip(self.keys, m.groups()))
+
+    def fill(self, values):
+        out = []
+        for piece in self.template:
+            out.append(piece if isinstance(piece, str) else values.get(piece, ''))
+        return ''.join(out)
+
+
+class MapLine(object):
+    __slots__ = ('seq', 'flag', 'left', 'right')
+
+    def __init__(self, seq, flag, left, right):
+        self.seq = seq
+        self.flag = flag
+        self.left = _Side(left)
+        self.right = _Side(right if right is not None else left)
+
+
+class _PrefixIndex(object):
+    def __init__(self, lines, side):
+        self.buckets = {}
+        for line in lines:
+            prefix = getattr(line, side).prefix
+            self.buckets.setdefault(prefix, []).append(line)
+        self.lengths = sorted(set(len(p) for p in self.buckets))
+        for bucket in self.buckets.values():
+            bucket.reverse()
+
+    # Lines whose literal prefix starts path, highest precedence first
+    def candidates(self, path):
+        found = []
+        for n in self.lengths:
+            if n > len(path):
+                break
+            bucket = self.buckets.get(path[:n])
+            if bucket:
+                found.extend(bucket)
+        found.sort(key=lambda line: -line.seq)
+        return found
+
+
+class MapTable(object):
+    # lines: (mapFlag, left, right) in view order; right None for one-sided views
+    def __init__(self, lines):
+        self.lines = []
+        for seq, (flag, left, right) in enumerate(lines):
+            flag, left = parse_flag(flag, left)
+            self.lines.append(MapLine(seq, flag, left, right))
+        self._left = _PrefixIndex(self.lines, 'left')
+        self._right = _PrefixIndex(self.lines, 'right')
+
+    def __len__(self):
+        return len(self.lines)
+
+    def _translate(self, path, forward):
+        source, target = ('left', 'right') if forward else ('right', 'left')
+        index = self._left if forward else self._right
+        for line in index.candidates(path):
+            values = getattr(line, source).match(path)
+            if values is None:
+                continue
+            if line.flag == UNMAP:
+                return None
+            result = getattr(line, target).fill(values)
+            if self._hidden(line, path, result, forward):
+                return None
+            return result
+        return None
+
+    # A later unmap, or plain map of another path, claiming the same target
+    def _hidden(self, line, path, result, forward):
+        source, target = ('left', 'right') if forward else ('right', 'left')
+        index = self._right if forward else self._left
+        for later in index.candidates(result):
+            if later.seq <= line.seq:
+                break
+            values = getattr(later, target).match(result)
+            if values is None:
+                continue
+            if later.flag == UNMAP:
+                return True
+            if later.flag == MAP and getattr(later, source).fill(values) != path:
+                return True
+        return False
+
+    def translate(self, path):
+        return self._translate(path, True)
+
+    def translate_back(self, path):
+        return self._translate(path, False)
+
+    # Batch translation; unmapped paths come back as None
+    def translate_many(self, paths, reverse=False):
+        forward = not reverse
+        return [self._translate(p, forward) if p is not None else None for p in paths]
+
+    # Lines whose left side matches path, in view order
+    def matching(self, path):
+        lines = [line for line in self._left.candidates(path) if line.left.match(path) is not None]
+        lines.reverse()
+        return lines
+
+    # Whether the left side of the table includes path
+    def includes(self, path):
+        for line in self._left.candidates(path):
+            if line.left.match(path) is not None:
+                return line.flag != UNMAP
+        return False
+
+
+# Views keyed by name, read from their model table in line order; left =
+# depot side. streamviewx (the expanded stream view, with imported component
+# paths) has no line numbers: p4 resolves stream paths by specificity, and in
+# depot path order a path comes after every broader path that contains it.
+_VIEWS = OrderedDict([
+    ('client', (View, View.name, View.depotFile, View.viewFile, (View.seq,))),
+    ('client_rp', (ViewRp, ViewRp.name, ViewRp.depotFile, ViewRp.viewFile, (ViewRp.seq,))),
+    ('stream', (Streamview, Streamview.name, Streamview.depotFile, Streamview.viewFile,
+                (Streamview.seq,))),
+    ('stream_expanded', (Streamviewx, Streamviewx.stream, Streamviewx.depotPath,
+                         Streamviewx.viewPath, (Streamviewx.depotPath, Streamviewx.mapFlag))),
+    ('have', (Haveview, Haveview.name, Haveview.depotFile, Haveview.viewFile, (Haveview.seq,))),
+    ('remote', (Rmtview, Rmtview.id, Rmtview.localFile, Rmtview.remoteFile, (Rmtview.seq,))),
+    ('server', (Svrview, Svrview.id, Svrview.viewFile, None, (Svrview.seq, Svrview.type))),
+])
+
+
+# LRU of compiled maps per (kind, name), dropped on any change to their rows
+class ViewCache(object):
+    def __init__(self, engine, maxsize=1000):
+        self.engine = engine
+        self.maxsize = maxsize
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+        self._tables = dict((spec[0].__table__.name, kind) for kind, spec in _VIEWS.items())
+
+    def get(self, kind, name):
+        key = (kind, name)
+        with self._lock:
+            table = self._maps.get(key)
+            if table is not None:
+                self._maps.move_to_end(key)
+                return table
+        table = self._compile(kind, name)
+        with self._lock:
+            self._maps[key] = table
+            while len(self._maps) > self.maxsize:
+                self._maps.popitem(last=False)
+        return table
+
+    def client(self, name):
+        return self.get('client', name)
+
+    def stream(self, name):
+        return self.get('stream', name)
+
+    def _compile(self, kind, name):
+        model, key, left, right, order = _VIEWS[kind]
+        columns = [model.mapFlag, left] + ([right] if right is not None else [])
+        stmt = select(columns).where(key == name).order_by(*order)
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).fetchall()
+        return MapTable([(r[0], r[1], r[2] if right is not None else None) for r in rows])
+
+    def invalidate(self, kind, name):
+        with self._lock:
+            self._maps.pop((kind, name), None)
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+
+    # Listener for JournalTailer
+    def journal_listener(self, op, table, rows):
+        kind = self._tables.get(table.name)
+        if kind is None:
+            return
+        key = _VIEWS[kind][1].key
+        for row in rows:
+            self.invalidate(kind, row.get(key))
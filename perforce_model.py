@@ -1,1489 +1,2293 @@
 
+import os
+import threading
+from collections import OrderedDict
+
 from sqlalchemy import Column, Integer, String, BigInteger, Text, Boolean, DateTime, ForeignKey, Binary, SmallInteger
+from sqlalchemy import Index, MetaData, func, select, text
+from sqlalchemy import create_engine as _create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import object_session, relationship
+from sqlalchemy.pool import StaticPool
+
+
+# Lazy model registry. Each model below is written inside a factory that
+# runs the class statement on first use: `perforce_model.Rev` or
+# `from perforce_model import Rev` go through the module __getattr__, so a
+# short-lived tool only pays for the tables it touches. Base.metadata holds
+# the tables defined so far; load_all() defines the rest and table('rev')
+# defines just one. Base.metadata.create_all()/drop_all(), sorted_tables and
+# `from perforce_model import *` define every model first, as before.
+class _Metadata(MetaData):
+    def create_all(self, bind=None, tables=None, checkfirst=True):
+        if tables is None:
+            load_all()
+        super(_Metadata, self).create_all(bind, tables, checkfirst)
+
+    def drop_all(self, bind=None, tables=None, checkfirst=True):
+        if tables is None:
+            load_all()
+        super(_Metadata, self).drop_all(bind, tables, checkfirst)
+
+    @property
+    def sorted_tables(self):
+        load_all()
+        return super(_Metadata, self).sorted_tables
+
+
+Base = declarative_base(metadata=_Metadata())
+
+_factories = OrderedDict()
+_table_models = {}
+_define_lock = threading.RLock()
+
+
+def lazy_model(tablename):
+    def register(factory):
+        _factories[factory.__name__] = factory
+        _table_models[tablename] = factory.__name__
+        return factory
+    return register
+
+
+def _define(name):
+    model = globals().get(name)
+    if model is None or model is _factories.get(name):
+        with _define_lock:
+            model = globals().get(name)
+            if model is None or model is _factories.get(name):
+                model = _factories[name]()
+                # defined inside its factory; pickle and the ORM look it up
+                # as perforce_model.<Name>
+                model.__qualname__ = model.__name__
+                globals()[name] = model
+    return model
+
+
+def __getattr__(name):
+    if name in _factories:
+        return _define(name)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_factories))
+
+
+# Define every model; returns the now complete Base.metadata
+def load_all():
+    for name in _factories:
+        _define(name)
+    return Base.metadata
+
+
+# Table of a perforce table name ('rev' or 'perforce.rev'), defining only
+# its model; None when there is no such table
+def table(name):
+    model = _table_models.get(name.split('.', 1)[1] if name.startswith('perforce.') else name)
+    if model is not None:
+        return _define(model).__table__
+    return Base.metadata.tables.get(name) or Base.metadata.tables.get('perforce.' + name)
+
+
+# Engine factory for the perforce schema. SQLite has no schemas, so the
+# database is attached a second time as 'perforce' on every connection.
+def create_engine(url, **kwargs):
+    if not str(url).startswith('sqlite'):
+        return _create_engine(url, **kwargs)
+    database = str(url).split('///', 1)[1] if '///' in str(url) else ''
+    if database in ('', ':memory:'):
+        kwargs.setdefault('poolclass', StaticPool)
+        kwargs.setdefault('connect_args', {'check_same_thread': False})
+        database = ':memory:'
+    engine = _create_engine(url, **kwargs)
+
+    @event.listens_for(engine, 'connect')
+    def _attach_perforce(dbapi_connection, connection_record):
+        dbapi_connection.execute("ATTACH DATABASE ? AS perforce", (database,))
+
+    return engine
+
+# Path-dictionary mode (perforce_paths), chosen before any model is
+# defined: PERFORCE_PATH_IDS=1 in the environment, or use_path_ids(). Tables
+# with depot/client path columns then carry the perforce.paths id of each
+# (<column>Id) and key on the ids instead of the strings, so the loaders can
+# leave every path string NULL. Otherwise the tables are as p4d has them.
+_path_ids = os.environ.get('PERFORCE_PATH_IDS', '') not in ('', '0')
+
+
+def use_path_ids(enabled=True):
+    global _path_ids
+    if bool(enabled) != _path_ids:
+        defined = [name for name in _table_models.values() if name in globals() and any(
+            c.info.get('path') for c in globals()[name].__table__.columns)]
+        if defined:
+            raise RuntimeError('path-dictionary mode must be chosen before the models are '
+                               'defined (%s already are)' % ', '.join(sorted(defined)[:5]))
+        _path_ids = bool(enabled)
+
+
+def path_ids():
+    return _path_ids
+
+
+# Depot and client paths sort byte-wise, as in p4. On PostgreSQL that takes
+# the C collation, without which prefix ranges (perforce_paths.prefix_range)
+# are neither correct nor index range scans.
+PathString = String().with_variant(String(collation='C'), 'postgresql')
+
+
+# A path column; key=True when it is part of the primary key, which holds
+# its <column>Id instead in path-dictionary mode
+def path_column(key=False):
+    return Column(PathString, primary_key=key and not _path_ids, info={'path': True})
+
+
+def path_id(column, key=False):
+    return Column(Integer, primary_key=key, autoincrement=False,
+                  info={'derived': True, 'path_of': column})
+
+
+# Index on an id column, declared in path-dictionary mode only
+def path_index(name, column):
+    return (Index(name, column),) if _path_ids else ()
+
+
+# String view of a path column that may be stored only as a perforce.paths
+# id (<column>Id) in path-dictionary mode.
+def path_property(column):
+    id_column = column + 'Id'
+
+    def fget(self):
+        value = getattr(self, column)
+        path_id = getattr(self, id_column, None)
+        if value is not None or path_id is None:
+            return value
+        session = object_session(self)
+        if session is None:
+            return None
+        paths = _define('Paths')
+        return session.query(paths.path).filter(paths.id == path_id).scalar()
+
+    def expr(cls):
+        if not hasattr(cls, id_column):
+            return getattr(cls, column)
+        paths = _define('Paths')
+        return func.coalesce(getattr(cls, column), select([paths.path]).where(
+            paths.id == getattr(cls, id_column)).as_scalar())
 
-Base = declarative_base()
+    return hybrid_property(fget, expr=expr)
 
 # perforce.bodresolve - Resolve data for stream specifications
-class Bodresolve(Base):
-    __tablename__ = 'bodresolve'
-    __table_args__ = {'schema': 'perforce'}
-    type = Column(String, primary_key=True)
-    client = Column(String, primary_key=True)
-    toKey = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    fromKey = Column(String, primary_key=True)
-    fromChange = Column(Integer, primary_key=True)
-    baseKey = Column(String)
-    baseChange = Column(Integer)
-    how = Column(String)
-    state = Column(String)
+@lazy_model('bodresolve')
+def Bodresolve():
+    class Bodresolve(Base):
+        __tablename__ = 'bodresolve'
+        __table_args__ = {'schema': 'perforce'}
+        type = Column(String, primary_key=True)
+        client = Column(String, primary_key=True)
+        toKey = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        fromKey = Column(String, primary_key=True)
+        fromChange = Column(Integer, primary_key=True)
+        baseKey = Column(String)
+        baseChange = Column(Integer)
+        how = Column(String)
+        state = Column(String)
+    return Bodresolve
 
 # perforce.bodresolvex - Pending integration records for shelved stream specifications
-class Bodresolvex(Base):
-    __tablename__ = 'bodresolvex'
-    __table_args__ = {'schema': 'perforce'}
-    type = Column(String, primary_key=True)
-    shelf = Column(Integer, primary_key=True)
-    toKey = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    fromKey = Column(String, primary_key=True)
-    fromChange = Column(Integer, primary_key=True)
-    baseKey = Column(String)
-    baseChange = Column(Integer)
-    how = Column(String)
-    state = Column(String)
-    client = Column(String)
+@lazy_model('bodresolvex')
+def Bodresolvex():
+    class Bodresolvex(Base):
+        __tablename__ = 'bodresolvex'
+        __table_args__ = {'schema': 'perforce'}
+        type = Column(String, primary_key=True)
+        shelf = Column(Integer, primary_key=True)
+        toKey = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        fromKey = Column(String, primary_key=True)
+        fromChange = Column(Integer, primary_key=True)
+        baseKey = Column(String)
+        baseChange = Column(Integer)
+        how = Column(String)
+        state = Column(String)
+        client = Column(String)
+    return Bodresolvex
 
 # perforce.bodtext - Job data for job attributes
-class Bodtext(Base):
-    __tablename__ = 'bodtext'
-    __table_args__ = {'schema': 'perforce'}
-    key = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    isBulk = Column(Integer)
-    text = Column(Text)
+@lazy_model('bodtext')
+def Bodtext():
+    class Bodtext(Base):
+        __tablename__ = 'bodtext'
+        __table_args__ = {'schema': 'perforce'}
+        key = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        isBulk = Column(Integer)
+        text = Column(Text)
+    return Bodtext
 
 # perforce.bodtextcx - Versioned openable spec fields
-class Bodtextcx(Base):
-    __tablename__ = 'bodtextcx'
-    __table_args__ = {'schema': 'perforce'}
-    type = Column(Integer, primary_key=True)
-    key = Column(String, primary_key=True)
-    change = Column(Integer, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    text = Column(Text)
+@lazy_model('bodtextcx')
+def Bodtextcx():
+    class Bodtextcx(Base):
+        __tablename__ = 'bodtextcx'
+        __table_args__ = {'schema': 'perforce'}
+        type = Column(Integer, primary_key=True)
+        key = Column(String, primary_key=True)
+        change = Column(Integer, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        text = Column(Text)
+    return Bodtextcx
 
 # perforce.bodtexthx - Head revision of spec fields
-class Bodtexthx(Base):
-    __tablename__ = 'bodtexthx'
-    __table_args__ = {'schema': 'perforce'}
-    type = Column(Integer, primary_key=True)
-    key = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    bulk = Column(Integer)
-    text = Column(Text)
+@lazy_model('bodtexthx')
+def Bodtexthx():
+    class Bodtexthx(Base):
+        __tablename__ = 'bodtexthx'
+        __table_args__ = {'schema': 'perforce'}
+        type = Column(Integer, primary_key=True)
+        key = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        bulk = Column(Integer)
+        text = Column(Text)
+    return Bodtexthx
 
 # perforce.bodtextsx - Shelved openable spec fields
-class Bodtextsx(Base):
-    __tablename__ = 'bodtextsx'
-    __table_args__ = {'schema': 'perforce'}
-    type = Column(Integer, primary_key=True)
-    shelf = Column(Integer, primary_key=True)
-    key = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    text = Column(Text)
-    workChange = Column(Integer)
-    user = Column(String)
-    action = Column(String)
+@lazy_model('bodtextsx')
+def Bodtextsx():
+    class Bodtextsx(Base):
+        __tablename__ = 'bodtextsx'
+        __table_args__ = {'schema': 'perforce'}
+        type = Column(Integer, primary_key=True)
+        shelf = Column(Integer, primary_key=True)
+        key = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        text = Column(Text)
+        workChange = Column(Integer)
+        user = Column(String)
+        action = Column(String)
+    return Bodtextsx
 
 # perforce.bodtextwx - Open openable spec fields
-class Bodtextwx(Base):
-    __tablename__ = 'bodtextwx'
-    __table_args__ = {'schema': 'perforce'}
-    type = Column(Integer, primary_key=True)
-    client = Column(String, primary_key=True)
-    key = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    text = Column(Text)
-    workChange = Column(Integer)
-    user = Column(String)
-    action = Column(String)
+@lazy_model('bodtextwx')
+def Bodtextwx():
+    class Bodtextwx(Base):
+        __tablename__ = 'bodtextwx'
+        __table_args__ = {'schema': 'perforce'}
+        type = Column(Integer, primary_key=True)
+        client = Column(String, primary_key=True)
+        key = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        text = Column(Text)
+        workChange = Column(Integer)
+        user = Column(String)
+        action = Column(String)
+    return Bodtextwx
 
 # perforce.change - Changelists
-class Change(Base):
-    __tablename__ = 'change'
-    __table_args__ = {'schema': 'perforce'}
-    change = Column(Integer, primary_key=True)
-    descKey = Column(Integer)
-    client = Column(String)
-    user = Column(String)
-    date = Column(BigInteger)
-    status = Column(String)
-    description = Column(Text)
-    root = Column(String)
-    importer = Column(String)
-    identity = Column(String)
-    access = Column(BigInteger)
-    update = Column(BigInteger)
-    stream = Column(String)
+@lazy_model('change')
+def Change():
+    class Change(Base):
+        __tablename__ = 'change'
+        __table_args__ = (
+            Index('idx_change_user_date', 'user', 'date'),
+            Index('idx_change_client', 'client'),
+            Index('idx_change_status', 'status'),
+            Index('idx_change_stream', 'stream'),
+            Index('idx_change_date', 'date'),
+            Index('idx_change_pending', 'user', 'client',
+                  postgresql_where=text("status = 'pending'"),
+                  sqlite_where=text("status = 'pending'")),
+            {'schema': 'perforce'},
+        )
+        change = Column(Integer, primary_key=True)
+        descKey = Column(Integer)
+        client = Column(String)
+        user = Column(String)
+        date = Column(BigInteger)
+        status = Column(String)
+        description = Column(Text)
+        root = Column(String)
+        importer = Column(String)
+        identity = Column(String)
+        access = Column(BigInteger)
+        update = Column(BigInteger)
+        stream = Column(String)
+    return Change
 
 # perforce.changeidx - Secondary index of perforce.change/perforce.changex
-class Changeidx(Base):
-    __tablename__ = 'changeidx'
-    __table_args__ = {'schema': 'perforce'}
-    identity = Column(String, primary_key=True)
-    change = Column(Integer)
+@lazy_model('changeidx')
+def Changeidx():
+    class Changeidx(Base):
+        __tablename__ = 'changeidx'
+        __table_args__ = {'schema': 'perforce'}
+        identity = Column(String, primary_key=True)
+        change = Column(Integer)
+    return Changeidx
 
 # perforce.changex - Subset of perforce.change: records for pending changelists only
-class Changex(Base):
-    __tablename__ = 'changex'
-    __table_args__ = {'schema': 'perforce'}
-    change = Column(Integer, primary_key=True)
-    descKey = Column(Integer)
-    client = Column(String)
-    user = Column(String)
-    date = Column(BigInteger)
-    status = Column(String)
-    description = Column(Text)
-    root = Column(String)
-    importer = Column(String)
-    identity = Column(String)
-    access = Column(BigInteger)
-    update = Column(BigInteger)
-    stream = Column(String)
+@lazy_model('changex')
+def Changex():
+    class Changex(Base):
+        __tablename__ = 'changex'
+        __table_args__ = (
+            Index('idx_changex_user', 'user'),
+            Index('idx_changex_client', 'client'),
+            Index('idx_changex_status', 'status'),
+            Index('idx_changex_stream', 'stream'),
+            Index('idx_changex_date', 'date'),
+            {'schema': 'perforce'},
+        )
+        change = Column(Integer, primary_key=True)
+        descKey = Column(Integer)
+        client = Column(String)
+        user = Column(String)
+        date = Column(BigInteger)
+        status = Column(String)
+        description = Column(Text)
+        root = Column(String)
+        importer = Column(String)
+        identity = Column(String)
+        access = Column(BigInteger)
+        update = Column(BigInteger)
+        stream = Column(String)
+    return Changex
 
 # perforce.ckphist - Stores history of checkpoint events
-class Ckphist(Base):
-    __tablename__ = 'ckphist'
-    __table_args__ = {'schema': 'perforce'}
-    start = Column(BigInteger, primary_key=True)
-    jnum = Column(Integer, primary_key=True)
-    who = Column(Integer, primary_key=True)
-    type = Column(String, primary_key=True)
-    end = Column(BigInteger)
-    flags = Column(String)
-    jfile = Column(String)
-    jdate = Column(BigInteger)
-    jdigest = Column(String)
-    jsize = Column(BigInteger)
-    jtype = Column(String)
-    failed = Column(Integer)
-    errmsg = Column(Binary)
+@lazy_model('ckphist')
+def Ckphist():
+    class Ckphist(Base):
+        __tablename__ = 'ckphist'
+        __table_args__ = {'schema': 'perforce'}
+        start = Column(BigInteger, primary_key=True)
+        jnum = Column(Integer, primary_key=True)
+        who = Column(Integer, primary_key=True)
+        type = Column(String, primary_key=True)
+        end = Column(BigInteger)
+        flags = Column(String)
+        jfile = Column(String)
+        jdate = Column(BigInteger)
+        jdigest = Column(String)
+        jsize = Column(BigInteger)
+        jtype = Column(String)
+        failed = Column(Integer)
+        errmsg = Column(Binary)
+    return Ckphist
 
 # perforce.config - Server configurations table
-class Config(Base):
-    __tablename__ = 'config'
-    __table_args__ = {'schema': 'perforce'}
-    serverName = Column(String, primary_key=True)
-    name = Column(String, primary_key=True)
-    value = Column(String)
+@lazy_model('config')
+def Config():
+    class Config(Base):
+        __tablename__ = 'config'
+        __table_args__ = (
+            Index('idx_config_value', 'value'),
+            {'schema': 'perforce'},
+        )
+        serverName = Column(String, primary_key=True)
+        name = Column(String, primary_key=True)
+        value = Column(String)
+    return Config
 
 # perforce.configh - Server configuration history
-class Configh(Base):
-    __tablename__ = 'configh'
-    __table_args__ = {'schema': 'perforce'}
-    sName = Column(String, primary_key=True)
-    name = Column(String, primary_key=True)
-    version = Column(Integer, primary_key=True)
-    date = Column(BigInteger, primary_key=True)
-    server = Column(String, primary_key=True)
-    user = Column(String)
-    ovalue = Column(String)
-    nvalue = Column(String)
-    comment = Column(String)
+@lazy_model('configh')
+def Configh():
+    class Configh(Base):
+        __tablename__ = 'configh'
+        __table_args__ = {'schema': 'perforce'}
+        sName = Column(String, primary_key=True)
+        name = Column(String, primary_key=True)
+        version = Column(Integer, primary_key=True)
+        date = Column(BigInteger, primary_key=True)
+        server = Column(String, primary_key=True)
+        user = Column(String)
+        ovalue = Column(String)
+        nvalue = Column(String)
+        comment = Column(String)
+    return Configh
 
 # perforce.counters - Counters table
-class Counters(Base):
-    __tablename__ = 'counters'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    value = Column(String)
+@lazy_model('counters')
+def Counters():
+    class Counters(Base):
+        __tablename__ = 'counters'
+        __table_args__ = (
+            Index('idx_counters_value', 'value'),
+            {'schema': 'perforce'},
+        )
+        name = Column(String, primary_key=True)
+        value = Column(String)
+    return Counters
 
 # perforce.depot - Depot specifications
-class Depot(Base):
-    __tablename__ = 'depot'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    type = Column(String)
-    extra = Column(String)
-    map = Column(String)
-    objAddr = Column(String)
+@lazy_model('depot')
+def Depot():
+    class Depot(Base):
+        __tablename__ = 'depot'
+        __table_args__ = (
+            Index('idx_depot_type', 'type'),
+            {'schema': 'perforce'},
+        )
+        name = Column(String, primary_key=True)
+        type = Column(String)
+        extra = Column(String)
+        map = Column(String)
+        objAddr = Column(String)
+    return Depot
 
 # perforce.desc - Change descriptions
-class Desc(Base):
-    __tablename__ = 'desc'
-    __table_args__ = {'schema': 'perforce'}
-    descKey = Column(Integer, primary_key=True)
-    description = Column(Text)
+@lazy_model('desc')
+def Desc():
+    class Desc(Base):
+        __tablename__ = 'desc'
+        __table_args__ = {'schema': 'perforce'}
+        descKey = Column(Integer, primary_key=True)
+        description = Column(Text)
+    return Desc
 
 # perforce.domain - Domains: depots, clients, labels, branches, streams, and typemap
-class Domain(Base):
-    __tablename__ = 'domain'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    type = Column(String)
-    extra = Column(String)
-    mount = Column(String)
-    mount2 = Column(String)
-    mount3 = Column(String)
-    owner = Column(String)
-    updateDate = Column(BigInteger)
-    accessDate = Column(BigInteger)
-    options = Column(String)
-    description = Column(String)
-    stream = Column(String)
-    serverId = Column(String)
-    contents = Column(Integer)
+@lazy_model('domain')
+def Domain():
+    class Domain(Base):
+        __tablename__ = 'domain'
+        __table_args__ = (
+            Index('idx_domain_type', 'type'),
+            Index('idx_domain_owner', 'owner'),
+            Index('idx_domain_update_date', 'updateDate'),
+            {'schema': 'perforce'},
+        )
+        name = Column(String, primary_key=True)
+        type = Column(String)
+        extra = Column(String)
+        mount = Column(String)
+        mount2 = Column(String)
+        mount3 = Column(String)
+        owner = Column(String)
+        updateDate = Column(BigInteger)
+        accessDate = Column(BigInteger)
+        options = Column(String)
+        description = Column(String)
+        stream = Column(String)
+        serverId = Column(String)
+        contents = Column(Integer)
+    return Domain
 
 # perforce.excl - Exclusively locked (+l) files: enables coordinated file locking in commit/edge server environments
-class Excl(Base):
-    __tablename__ = 'excl'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    client = Column(String)
-    user = Column(String)
+@lazy_model('excl')
+def Excl():
+    class Excl(Base):
+        __tablename__ = 'excl'
+        __table_args__ = {'schema': 'perforce'}
+        depotFile = Column(String, primary_key=True)
+        client = Column(String)
+        user = Column(String)
+    return Excl
 
 # perforce.exclg - Graph depot LFS locks
-class Exclg(Base):
-    __tablename__ = 'exclg'
-    __table_args__ = {'schema': 'perforce'}
-    repo = Column(String, primary_key=True)
-    ref = Column(String, primary_key=True)
-    file = Column(String, primary_key=True)
-    lockId = Column(String)
-    user = Column(String)
-    created = Column(String)
+@lazy_model('exclg')
+def Exclg():
+    class Exclg(Base):
+        __tablename__ = 'exclg'
+        __table_args__ = {'schema': 'perforce'}
+        repo = Column(String, primary_key=True)
+        ref = Column(String, primary_key=True)
+        file = Column(String, primary_key=True)
+        lockId = Column(String)
+        user = Column(String)
+        created = Column(String)
+    return Exclg
 
 # perforce.exclgx - Graph depot LFS locks indexed by lockId
-class Exclgx(Base):
-    __tablename__ = 'exclgx'
-    __table_args__ = {'schema': 'perforce'}
-    lockId = Column(String, primary_key=True)
-    repo = Column(String)
-    ref = Column(String)
-    file = Column(String)
-    user = Column(String)
-    created = Column(String)
+@lazy_model('exclgx')
+def Exclgx():
+    class Exclgx(Base):
+        __tablename__ = 'exclgx'
+        __table_args__ = {'schema': 'perforce'}
+        lockId = Column(String, primary_key=True)
+        repo = Column(String)
+        ref = Column(String)
+        file = Column(String)
+        user = Column(String)
+        created = Column(String)
+    return Exclgx
 
 # perforce.fix - Fix records: indexed by job
-class Fix(Base):
-    __tablename__ = 'fix'
-    __table_args__ = {'schema': 'perforce'}
-    job = Column(String, primary_key=True)
-    change = Column(Integer, primary_key=True)
-    date = Column(BigInteger)
-    status = Column(String)
-    client = Column(String)
-    user = Column(String)
+@lazy_model('fix')
+def Fix():
+    class Fix(Base):
+        __tablename__ = 'fix'
+        __table_args__ = (
+            Index('idx_fix_status', 'status'),
+            Index('idx_fix_user', 'user'),
+            Index('idx_fix_date', 'date'),
+            {'schema': 'perforce'},
+        )
+        job = Column(String, primary_key=True)
+        change = Column(Integer, primary_key=True)
+        date = Column(BigInteger)
+        status = Column(String)
+        client = Column(String)
+        user = Column(String)
+    return Fix
 
 # perforce.fixrev - Fix records: indexed by change
-class Fixrev(Base):
-    __tablename__ = 'fixrev'
-    __table_args__ = {'schema': 'perforce'}
-    change = Column(Integer, primary_key=True)
-    job = Column(String, primary_key=True)
-    date = Column(BigInteger)
-    status = Column(String)
-    client = Column(String)
-    user = Column(String)
+@lazy_model('fixrev')
+def Fixrev():
+    class Fixrev(Base):
+        __tablename__ = 'fixrev'
+        __table_args__ = {'schema': 'perforce'}
+        change = Column(Integer, primary_key=True)
+        job = Column(String, primary_key=True)
+        date = Column(BigInteger)
+        status = Column(String)
+        client = Column(String)
+        user = Column(String)
+    return Fixrev
 
 # perforce.graphindex - Graph depot repository index data
-class Graphindex(Base):
-    __tablename__ = 'graphindex'
-    __table_args__ = {'schema': 'perforce'}
-    id = Column(Integer, primary_key=True)
-    name = Column(String, primary_key=True)
-    date = Column(BigInteger, primary_key=True)
-    blobSha = Column(String, primary_key=True)
-    commitSha = Column(String, primary_key=True)
-    flags = Column(Integer)
-    size = Column(BigInteger)
-    type = Column(String)
-    lfsoid = Column(String)
+@lazy_model('graphindex')
+def Graphindex():
+    class Graphindex(Base):
+        __tablename__ = 'graphindex'
+        __table_args__ = {'schema': 'perforce'}
+        id = Column(Integer, primary_key=True)
+        name = Column(String, primary_key=True)
+        date = Column(BigInteger, primary_key=True)
+        blobSha = Column(String, primary_key=True)
+        commitSha = Column(String, primary_key=True)
+        flags = Column(Integer)
+        size = Column(BigInteger)
+        type = Column(String)
+        lfsoid = Column(String)
+    return Graphindex
 
 # perforce.graphperm - Graph depot permissions
-class Graphperm(Base):
-    __tablename__ = 'graphperm'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    repo = Column(String, primary_key=True)
-    ref = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    user = Column(String, primary_key=True)
-    perm = Column(String, primary_key=True)
+@lazy_model('graphperm')
+def Graphperm():
+    class Graphperm(Base):
+        __tablename__ = 'graphperm'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        repo = Column(String, primary_key=True)
+        ref = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        user = Column(String, primary_key=True)
+        perm = Column(String, primary_key=True)
+    return Graphperm
 
 # perforce.group - Group specifications
-class Group(Base):
-    __tablename__ = 'group'
-    __table_args__ = {'schema': 'perforce'}
-    user = Column(String, primary_key=True)
-    group = Column(String, primary_key=True)
-    type = Column(String)
-    maxResults = Column(String)
-    maxScanRows = Column(String)
-    maxLockTime = Column(String)
-    maxOpenFiles = Column(String)
-    timeout = Column(Integer)
-    passwordTimeout = Column(Integer)
-    maxMemory = Column(String)
-    idleTimeout = Column(Integer)
+@lazy_model('group')
+def Group():
+    class Group(Base):
+        __tablename__ = 'group'
+        __table_args__ = (
+            Index('idx_group_type', 'type'),
+            {'schema': 'perforce'},
+        )
+        user = Column(String, primary_key=True)
+        group = Column(String, primary_key=True)
+        type = Column(String)
+        maxResults = Column(String)
+        maxScanRows = Column(String)
+        maxLockTime = Column(String)
+        maxOpenFiles = Column(String)
+        timeout = Column(Integer)
+        passwordTimeout = Column(Integer)
+        maxMemory = Column(String)
+        idleTimeout = Column(Integer)
+    return Group
 
 # perforce.groupx - Per-group data to support group membership controlled by AD/LDAP group membership
-class Groupx(Base):
-    __tablename__ = 'groupx'
-    __table_args__ = {'schema': 'perforce'}
-    group = Column(String, primary_key=True)
-    ldapConf = Column(String)
-    ldapSearchQuery = Column(String)
-    ldapUserAttribute = Column(String)
-    ldapDNAttribute = Column(String)
-    description = Column(String)
+@lazy_model('groupx')
+def Groupx():
+    class Groupx(Base):
+        __tablename__ = 'groupx'
+        __table_args__ = {'schema': 'perforce'}
+        group = Column(String, primary_key=True)
+        ldapConf = Column(String)
+        ldapSearchQuery = Column(String)
+        ldapUserAttribute = Column(String)
+        ldapDNAttribute = Column(String)
+        description = Column(String)
+    return Groupx
 
 # perforce.have - Contains the 'have-list' for all clients
-class Have(Base):
-    __tablename__ = 'have'
-    __table_args__ = {'schema': 'perforce'}
-    clientFile = Column(String, primary_key=True)
-    depotFile = Column(String)
-    haveRev = Column(Integer)
-    type = Column(String)
-    time = Column(BigInteger)
+@lazy_model('have')
+def Have():
+    class Have(Base):
+        __tablename__ = 'have'
+        __table_args__ = (
+            Index('idx_have_depot_file', 'depotFile'),
+            Index('idx_have_type', 'type'),
+            Index('idx_have_time', 'time'),
+            *path_index('idx_have_depot_file_id', 'depotFileId'),
+            {'schema': 'perforce'},
+        )
+        clientFile = path_column(key=True)
+        if _path_ids:
+            clientFileId = path_id('clientFile', key=True)
+        depotFile = path_column()
+        if _path_ids:
+            depotFileId = path_id('depotFile')
+        haveRev = Column(Integer)
+        type = Column(String)
+        time = Column(BigInteger)
+        depotPath = path_property('depotFile')
+    return Have
 
 # perforce.have_pt - Placeholder for clients of types readonly, partitioned, and partitioned-jnl
-class HavePt(Base):
-    __tablename__ = 'have_pt'
-    __table_args__ = {'schema': 'perforce'}
-    clientFile = Column(String, primary_key=True)
-    depotFile = Column(String)
-    haveRev = Column(Integer)
-    type = Column(String)
-    time = Column(BigInteger)
+@lazy_model('have_pt')
+def HavePt():
+    class HavePt(Base):
+        __tablename__ = 'have_pt'
+        __table_args__ = (
+            Index('idx_have_pt_depot_file', 'depotFile'),
+            {'schema': 'perforce'},
+        )
+        clientFile = Column(String, primary_key=True)
+        depotFile = Column(String)
+        haveRev = Column(Integer)
+        type = Column(String)
+        time = Column(BigInteger)
+    return HavePt
 
 # perforce.have_rp - Contains the 'have-list' for clients of build-server replicas
-class HaveRp(Base):
-    __tablename__ = 'have_rp'
-    __table_args__ = {'schema': 'perforce'}
-    clientFile = Column(String, primary_key=True)
-    depotFile = Column(String)
-    haveRev = Column(Integer)
-    type = Column(String)
-    time = Column(BigInteger)
+@lazy_model('have_rp')
+def HaveRp():
+    class HaveRp(Base):
+        __tablename__ = 'have_rp'
+        __table_args__ = (
+            Index('idx_have_rp_depot_file', 'depotFile'),
+            {'schema': 'perforce'},
+        )
+        clientFile = Column(String, primary_key=True)
+        depotFile = Column(String)
+        haveRev = Column(Integer)
+        type = Column(String)
+        time = Column(BigInteger)
+    return HaveRp
 
 # perforce.haveg - Contains the 'have-list' for graph depot files that are not at the same revision as defined by the client's have reference
-class Haveg(Base):
-    __tablename__ = 'haveg'
-    __table_args__ = {'schema': 'perforce'}
-    repo = Column(String, primary_key=True)
-    clientFile = Column(String, primary_key=True)
-    depotFile = Column(String)
-    client = Column(String)
-    type = Column(String)
-    action = Column(String)
-    blobSha = Column(String)
-    commitSha = Column(String)
-    flags = Column(Integer)
+@lazy_model('haveg')
+def Haveg():
+    class Haveg(Base):
+        __tablename__ = 'haveg'
+        __table_args__ = (
+            Index('idx_haveg_depot_file', 'depotFile'),
+            {'schema': 'perforce'},
+        )
+        repo = Column(String, primary_key=True)
+        clientFile = Column(String, primary_key=True)
+        depotFile = Column(String)
+        client = Column(String)
+        type = Column(String)
+        action = Column(String)
+        blobSha = Column(String)
+        commitSha = Column(String)
+        flags = Column(Integer)
+    return Haveg
 
 # perforce.haveview - Stores mapping changes for clients mapping graph depot content
-class Haveview(Base):
-    __tablename__ = 'haveview'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    mapFlag = Column(String)
-    viewFile = Column(String)
-    depotFile = Column(String)
-    comment = Column(String)
+@lazy_model('haveview')
+def Haveview():
+    class Haveview(Base):
+        __tablename__ = 'haveview'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        mapFlag = Column(String)
+        viewFile = Column(String)
+        depotFile = Column(String)
+        comment = Column(String)
+    return Haveview
+
+# perforce.headrev - Head revision of every depotFile, maintained from rev by
+# perforce_headrev. isDeleted is 1 when the head action deletes the file.
+@lazy_model('headrev')
+def HeadRev():
+    class HeadRev(Base):
+        __tablename__ = 'headrev'
+        __table_args__ = (
+            Index('idx_headrev_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = Column(PathString, primary_key=True)
+        depotRev = Column(Integer)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        isDeleted = Column(Integer)
+    return HeadRev
 
 # perforce.integed - Permanent integration records
-class IntegEd(Base):
-    __tablename__ = 'integed'
-    __table_args__ = {'schema': 'perforce'}
-    toFile = Column(String, primary_key=True)
-    fromFile = Column(String, primary_key=True)
-    startFromRev = Column(Integer, primary_key=True)
-    endFromRev = Column(Integer, primary_key=True)
-    startToRev = Column(Integer, primary_key=True)
-    endToRev = Column(Integer, primary_key=True)
-    how = Column(String)
-    change = Column(Integer)
+@lazy_model('integed')
+def IntegEd():
+    class IntegEd(Base):
+        __tablename__ = 'integed'
+        __table_args__ = (
+            *path_index('idx_integed_from_file_id', 'fromFileId'),
+            {'schema': 'perforce'},
+        )
+        toFile = path_column(key=True)
+        if _path_ids:
+            toFileId = path_id('toFile', key=True)
+        fromFile = path_column(key=True)
+        if _path_ids:
+            fromFileId = path_id('fromFile', key=True)
+        startFromRev = Column(Integer, primary_key=True)
+        endFromRev = Column(Integer, primary_key=True)
+        startToRev = Column(Integer, primary_key=True)
+        endToRev = Column(Integer, primary_key=True)
+        how = Column(String)
+        change = Column(Integer)
+        toPath = path_property('toFile')
+        fromPath = path_property('fromFile')
+    return IntegEd
 
 # perforce.integedss - Stream specification integration history
-class IntegEdss(Base):
-    __tablename__ = 'integedss'
-    __table_args__ = {'schema': 'perforce'}
-    toKey = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    fromKey = Column(String, primary_key=True)
-    endfromChange = Column(Integer, primary_key=True)
-    endtoChange = Column(Integer, primary_key=True)
-    startfromChange = Column(Integer)
-    starttoChange = Column(Integer)
-    baseKey = Column(String)
-    baseChange = Column(Integer)
-    how = Column(String)
-    change = Column(Integer)
+@lazy_model('integedss')
+def IntegEdss():
+    class IntegEdss(Base):
+        __tablename__ = 'integedss'
+        __table_args__ = {'schema': 'perforce'}
+        toKey = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        fromKey = Column(String, primary_key=True)
+        endfromChange = Column(Integer, primary_key=True)
+        endtoChange = Column(Integer, primary_key=True)
+        startfromChange = Column(Integer)
+        starttoChange = Column(Integer)
+        baseKey = Column(String)
+        baseChange = Column(Integer)
+        how = Column(String)
+        change = Column(Integer)
+    return IntegEdss
 
 # perforce.integtx - Temporary integration records used by task streams
-class Integtx(Base):
-    __tablename__ = 'integtx'
-    __table_args__ = {'schema': 'perforce'}
-    toFile = Column(String, primary_key=True)
-    fromFile = Column(String, primary_key=True)
-    startFromRev = Column(Integer, primary_key=True)
-    endFromRev = Column(Integer, primary_key=True)
-    startToRev = Column(Integer, primary_key=True)
-    endToRev = Column(Integer, primary_key=True)
-    how = Column(String)
-    change = Column(Integer)
+@lazy_model('integtx')
+def Integtx():
+    class Integtx(Base):
+        __tablename__ = 'integtx'
+        __table_args__ = {'schema': 'perforce'}
+        toFile = Column(String, primary_key=True)
+        fromFile = Column(String, primary_key=True)
+        startFromRev = Column(Integer, primary_key=True)
+        endFromRev = Column(Integer, primary_key=True)
+        startToRev = Column(Integer, primary_key=True)
+        endToRev = Column(Integer, primary_key=True)
+        how = Column(String)
+        change = Column(Integer)
+    return Integtx
 
 # perforce.ixtext - Indexing data for generic and job attributes
-class Ixtext(Base):
-    __tablename__ = 'ixtext'
-    __table_args__ = {'schema': 'perforce'}
-    word = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    value = Column(String, primary_key=True)
+@lazy_model('ixtext')
+def Ixtext():
+    class Ixtext(Base):
+        __tablename__ = 'ixtext'
+        __table_args__ = {'schema': 'perforce'}
+        word = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        value = Column(String, primary_key=True)
+    return Ixtext
 
 # perforce.ixtexthx - Indexing data for head revision of all spec fields
-class Ixtexthx(Base):
-    __tablename__ = 'ixtexthx'
-    __table_args__ = {'schema': 'perforce'}
-    type = Column(String, primary_key=True)
-    word = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    value = Column(String, primary_key=True)
+@lazy_model('ixtexthx')
+def Ixtexthx():
+    class Ixtexthx(Base):
+        __tablename__ = 'ixtexthx'
+        __table_args__ = {'schema': 'perforce'}
+        type = Column(String, primary_key=True)
+        word = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        value = Column(String, primary_key=True)
+    return Ixtexthx
 
 # perforce.jnlack - Tracks journal positions of all replicas
-class Jnlack(Base):
-    __tablename__ = 'jnlack'
-    __table_args__ = {'schema': 'perforce'}
-    serverId = Column(String, primary_key=True)
-    lastUpdate = Column(BigInteger)
-    serverType = Column(String)
-    persistedJnl = Column(Integer)
-    appliedJnl = Column(Integer)
-    persistedPos = Column(BigInteger)
-    appliedPos = Column(BigInteger)
-    jcflags = Column(String)
-    isAlive = Column(Integer)
-    serverOptions = Column(String)
-    failoverSeen = Column(String)
+@lazy_model('jnlack')
+def Jnlack():
+    class Jnlack(Base):
+        __tablename__ = 'jnlack'
+        __table_args__ = {'schema': 'perforce'}
+        serverId = Column(String, primary_key=True)
+        lastUpdate = Column(BigInteger)
+        serverType = Column(String)
+        persistedJnl = Column(Integer)
+        appliedJnl = Column(Integer)
+        persistedPos = Column(BigInteger)
+        appliedPos = Column(BigInteger)
+        jcflags = Column(String)
+        isAlive = Column(Integer)
+        serverOptions = Column(String)
+        failoverSeen = Column(String)
+    return Jnlack
 
 # perforce.job - Job records
-class Job(Base):
-    __tablename__ = 'job'
-    __table_args__ = {'schema': 'perforce'}
-    job = Column(String, primary_key=True)
-    xuser = Column(String)
-    xdate = Column(BigInteger)
-    xstatus = Column(String)
-    description = Column(Text)
+@lazy_model('job')
+def Job():
+    class Job(Base):
+        __tablename__ = 'job'
+        __table_args__ = (
+            Index('idx_job_xstatus', 'xstatus'),
+            Index('idx_job_xdate', 'xdate'),
+            {'schema': 'perforce'},
+        )
+        job = Column(String, primary_key=True)
+        xuser = Column(String)
+        xdate = Column(BigInteger)
+        xstatus = Column(String)
+        description = Column(Text)
+    return Job
 
 # perforce.label - Revisions of files in labels
-class Label(Base):
-    __tablename__ = 'label'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    depotFile = Column(String, primary_key=True)
-    haveRev = Column(Integer)
+@lazy_model('label')
+def Label():
+    class Label(Base):
+        __tablename__ = 'label'
+        __table_args__ = (
+            Index('idx_label_have_rev', 'haveRev'),
+            *path_index('idx_label_depot_file_id', 'depotFileId'),
+            {'schema': 'perforce'},
+        )
+        name = Column(String, primary_key=True)
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        haveRev = Column(Integer)
+        depotPath = path_property('depotFile')
+    return Label
 
 # perforce.ldap - LDAP specifications
-class Ldap(Base):
-    __tablename__ = 'ldap'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    host = Column(String)
-    port = Column(Integer)
-    ssl = Column(Integer)
-    type = Column(Integer)
-    pattern = Column(String)
-    baseDN = Column(String)
-    filter = Column(String)
-    scope = Column(Integer)
-    bindDN = Column(String)
-    bindpass = Column(String)
-    realm = Column(String)
-    groupBaseDN = Column(String)
-    groupFilter = Column(String)
-    groupScope = Column(Integer)
-    options = Column(Integer)
-    attrUid = Column(String)
-    attrEmail = Column(String)
-    attrName = Column(String)
+@lazy_model('ldap')
+def Ldap():
+    class Ldap(Base):
+        __tablename__ = 'ldap'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        host = Column(String)
+        port = Column(Integer)
+        ssl = Column(Integer)
+        type = Column(Integer)
+        pattern = Column(String)
+        baseDN = Column(String)
+        filter = Column(String)
+        scope = Column(Integer)
+        bindDN = Column(String)
+        bindpass = Column(String)
+        realm = Column(String)
+        groupBaseDN = Column(String)
+        groupFilter = Column(String)
+        groupScope = Column(Integer)
+        options = Column(Integer)
+        attrUid = Column(String)
+        attrEmail = Column(String)
+        attrName = Column(String)
+    return Ldap
 
 # perforce.locks - Locked/Unlocked files
-class Locks(Base):
-    __tablename__ = 'locks'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    client = Column(String, primary_key=True)
-    user = Column(String)
-    action = Column(String)
-    isLocked = Column(String)
-    change = Column(Integer)
+@lazy_model('locks')
+def Locks():
+    class Locks(Base):
+        __tablename__ = 'locks'
+        __table_args__ = (
+            Index('idx_locks_user', 'user'),
+            Index('idx_locks_action', 'action'),
+            Index('idx_locks_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        client = Column(String, primary_key=True)
+        user = Column(String)
+        action = Column(String)
+        isLocked = Column(String)
+        change = Column(Integer)
+        depotPath = path_property('depotFile')
+    return Locks
 
 # perforce.locksg - Lock records for clients of type graph
-class Locksg(Base):
-    __tablename__ = 'locksg'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    client = Column(String, primary_key=True)
-    user = Column(String)
-    action = Column(String)
-    isLocked = Column(String)
-    change = Column(Integer)
+@lazy_model('locksg')
+def Locksg():
+    class Locksg(Base):
+        __tablename__ = 'locksg'
+        __table_args__ = (
+            Index('idx_locksg_user', 'user'),
+            {'schema': 'perforce'},
+        )
+        depotFile = Column(String, primary_key=True)
+        client = Column(String, primary_key=True)
+        user = Column(String)
+        action = Column(String)
+        isLocked = Column(String)
+        change = Column(Integer)
+    return Locksg
 
 # perforce.logger - Support for 'p4 logger' command. Logs any changes to changelists and jobs.
-class Logger(Base):
-    __tablename__ = 'logger'
-    __table_args__ = {'schema': 'perforce'}
-    seq = Column(Integer, primary_key=True)
-    key = Column(String)
-    attr = Column(String)
+@lazy_model('logger')
+def Logger():
+    class Logger(Base):
+        __tablename__ = 'logger'
+        __table_args__ = {'schema': 'perforce'}
+        seq = Column(Integer, primary_key=True)
+        key = Column(String)
+        attr = Column(String)
+    return Logger
 
 # perforce.message - System messages
-class Message(Base):
-    __tablename__ = 'message'
-    __table_args__ = {'schema': 'perforce'}
-    language = Column(String, primary_key=True)
-    id = Column(Integer, primary_key=True)
-    message = Column(Text)
+@lazy_model('message')
+def Message():
+    class Message(Base):
+        __tablename__ = 'message'
+        __table_args__ = {'schema': 'perforce'}
+        language = Column(String, primary_key=True)
+        id = Column(Integer, primary_key=True)
+        message = Column(Text)
+    return Message
 
 # perforce.monitor - P4 Server process information
-class Monitor(Base):
-    __tablename__ = 'monitor'
-    __table_args__ = {'schema': 'perforce'}
-    id = Column(Integer, primary_key=True)
-    user = Column(String)
-    function = Column(String)
-    args = Column(String)
-    startDate = Column(BigInteger)
-    runstate = Column(Integer)
-    client = Column(String)
-    host = Column(String)
-    prog = Column(String)
-    lockInfo = Column(String)
-    cmt = Column(String)
-    ident = Column(String)
+@lazy_model('monitor')
+def Monitor():
+    class Monitor(Base):
+        __tablename__ = 'monitor'
+        __table_args__ = (
+            Index('idx_monitor_user', 'user'),
+            Index('idx_monitor_start_date', 'startDate'),
+            Index('idx_monitor_runstate', 'runstate'),
+            {'schema': 'perforce'},
+        )
+        id = Column(Integer, primary_key=True)
+        user = Column(String)
+        function = Column(String)
+        args = Column(String)
+        startDate = Column(BigInteger)
+        runstate = Column(Integer)
+        client = Column(String)
+        host = Column(String)
+        prog = Column(String)
+        lockInfo = Column(String)
+        cmt = Column(String)
+        ident = Column(String)
+    return Monitor
 
 # perforce.nameval - A table to store key/value pairs
-class Nameval(Base):
-    __tablename__ = 'nameval'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    value = Column(String)
+@lazy_model('nameval')
+def Nameval():
+    class Nameval(Base):
+        __tablename__ = 'nameval'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        value = Column(String)
+    return Nameval
 
 # perforce.object - Object storage for graph depots
-class Object(Base):
-    __tablename__ = 'object'
-    __table_args__ = {'schema': 'perforce'}
-    sha = Column(String, primary_key=True)
-    type = Column(String)
-    data = Column(Binary)
-    refCount = Column(Integer)
+@lazy_model('object')
+def Object():
+    class Object(Base):
+        __tablename__ = 'object'
+        __table_args__ = {'schema': 'perforce'}
+        sha = Column(String, primary_key=True)
+        type = Column(String)
+        data = Column(Binary)
+        refCount = Column(Integer)
+    return Object
+
+# perforce.paths - Depot/client path dictionary: every path and its parent
+# directories ('//depot/dir/') interned once. path sorts bytewise, so
+# '//depot/dir/...' is the range ['//depot/dir/', '//depot/dir0').
+@lazy_model('paths')
+def Paths():
+    class Paths(Base):
+        __tablename__ = 'paths'
+        __table_args__ = (
+            Index('idx_paths_path', 'path', unique=True),
+            Index('idx_paths_parent_id', 'parent_id'),
+            {'schema': 'perforce'},
+        )
+        id = Column(Integer, primary_key=True, autoincrement=False)
+        path = Column(PathString, nullable=False)
+        parent_id = Column(Integer)
+    return Paths
 
 # perforce.property - Properties
-class Property(Base):
-    __tablename__ = 'property'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    type = Column(String, primary_key=True)
-    scope = Column(String, primary_key=True)
-    value = Column(String)
-    date = Column(BigInteger)
-    user = Column(String)
+@lazy_model('property')
+def Property():
+    class Property(Base):
+        __tablename__ = 'property'
+        __table_args__ = (
+            Index('idx_property_type', 'type'),
+            Index('idx_property_scope', 'scope'),
+            Index('idx_property_user', 'user'),
+            Index('idx_property_date', 'date'),
+            {'schema': 'perforce'},
+        )
+        name = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        type = Column(String, primary_key=True)
+        scope = Column(String, primary_key=True)
+        value = Column(String)
+        date = Column(BigInteger)
+        user = Column(String)
+    return Property
 
 # perforce.protect - The protections table
-class Protect(Base):
-    __tablename__ = 'protect'
-    __table_args__ = {'schema': 'perforce'}
-    seq = Column(Integer, primary_key=True)
-    isGroup = Column(Integer)
-    user = Column(String)
-    host = Column(String)
-    perm = Column(String)
-    mapFlag = Column(String)
-    depotFile = Column(String)
-    subPath = Column(String)
-    update = Column(BigInteger)
+@lazy_model('protect')
+def Protect():
+    class Protect(Base):
+        __tablename__ = 'protect'
+        __table_args__ = (
+            Index('idx_protect_user', 'user'),
+            Index('idx_protect_host', 'host'),
+            Index('idx_protect_perm', 'perm'),
+            Index('idx_protect_depot_file', 'depotFile'),
+            {'schema': 'perforce'},
+        )
+        seq = Column(Integer, primary_key=True)
+        isGroup = Column(Integer)
+        user = Column(String)
+        host = Column(String)
+        perm = Column(String)
+        mapFlag = Column(String)
+        depotFile = Column(String)
+        subPath = Column(String)
+        update = Column(BigInteger)
+    return Protect
 
 # perforce.pubkey - SSH Public keys
-class Pubkey(Base):
-    __tablename__ = 'pubkey'
-    __table_args__ = {'schema': 'perforce'}
-    user = Column(String, primary_key=True)
-    scope = Column(String, primary_key=True)
-    key = Column(String)
-    digest = Column(String)
-    update = Column(BigInteger)
+@lazy_model('pubkey')
+def Pubkey():
+    class Pubkey(Base):
+        __tablename__ = 'pubkey'
+        __table_args__ = {'schema': 'perforce'}
+        user = Column(String, primary_key=True)
+        scope = Column(String, primary_key=True)
+        key = Column(String)
+        digest = Column(String)
+        update = Column(BigInteger)
+    return Pubkey
 
 # perforce.ref - Reference content for graph depots
-class Ref(Base):
-    __tablename__ = 'ref'
-    __table_args__ = {'schema': 'perforce'}
-    repo = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    name = Column(String, primary_key=True)
-    ref = Column(String)
-    symref = Column(String)
+@lazy_model('ref')
+def Ref():
+    class Ref(Base):
+        __tablename__ = 'ref'
+        __table_args__ = {'schema': 'perforce'}
+        repo = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        name = Column(String, primary_key=True)
+        ref = Column(String)
+        symref = Column(String)
+    return Ref
 
 # perforce.refcntadjust - Graph depot reference count adjustments
-class Refcntadjust(Base):
-    __tablename__ = 'refcntadjust'
-    __table_args__ = {'schema': 'perforce'}
-    walked = Column(Integer, primary_key=True)
-    sha = Column(String, primary_key=True)
-    adjustment = Column(Integer)
-    adjustObject = Column(Integer)
+@lazy_model('refcntadjust')
+def Refcntadjust():
+    class Refcntadjust(Base):
+        __tablename__ = 'refcntadjust'
+        __table_args__ = {'schema': 'perforce'}
+        walked = Column(Integer, primary_key=True)
+        sha = Column(String, primary_key=True)
+        adjustment = Column(Integer)
+        adjustObject = Column(Integer)
+    return Refcntadjust
 
 # perforce.refhist - Reference history for graph depots
-class Refhist(Base):
-    __tablename__ = 'refhist'
-    __table_args__ = {'schema': 'perforce'}
-    repo = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    name = Column(String, primary_key=True)
-    date = Column(BigInteger, primary_key=True)
-    action = Column(String, primary_key=True)
-    user = Column(String, primary_key=True)
-    ref = Column(String, primary_key=True)
-    symref = Column(String)
+@lazy_model('refhist')
+def Refhist():
+    class Refhist(Base):
+        __tablename__ = 'refhist'
+        __table_args__ = {'schema': 'perforce'}
+        repo = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        name = Column(String, primary_key=True)
+        date = Column(BigInteger, primary_key=True)
+        action = Column(String, primary_key=True)
+        user = Column(String, primary_key=True)
+        ref = Column(String, primary_key=True)
+        symref = Column(String)
+    return Refhist
 
 # perforce.remote - Remote specifications
-class Remote(Base):
-    __tablename__ = 'remote'
-    __table_args__ = {'schema': 'perforce'}
-    id = Column(String, primary_key=True)
-    owner = Column(String)
-    options = Column(Integer)
-    address = Column(String)
-    desc = Column(String)
-    update = Column(BigInteger)
-    access = Column(BigInteger)
-    fetch = Column(Integer)
-    push = Column(Integer)
-    rmtuser = Column(String)
+@lazy_model('remote')
+def Remote():
+    class Remote(Base):
+        __tablename__ = 'remote'
+        __table_args__ = (
+            Index('idx_remote_owner', 'owner'),
+            Index('idx_remote_update', 'update'),
+            Index('idx_remote_access', 'access'),
+            {'schema': 'perforce'},
+        )
+        id = Column(String, primary_key=True)
+        owner = Column(String)
+        options = Column(Integer)
+        address = Column(String)
+        desc = Column(String)
+        update = Column(BigInteger)
+        access = Column(BigInteger)
+        fetch = Column(Integer)
+        push = Column(Integer)
+        rmtuser = Column(String)
+    return Remote
 
 # perforce.repo - Repository specifications
-class Repo(Base):
-    __tablename__ = 'repo'
-    __table_args__ = {'schema': 'perforce'}
-    repo = Column(String, primary_key=True)
-    owner = Column(String)
-    created = Column(BigInteger)
-    pushed = Column(BigInteger)
-    forked = Column(String)
-    desc = Column(String)
-    branch = Column(String)
-    mirror = Column(String)
-    options = Column(Integer)
-    id = Column(Integer)
-    gcmrrserver = Column(String)
-    gcmrrsecrettoken = Column(String)
-    gcmrrstatus = Column(Integer)
-    gcmrrexcludedbranches = Column(String)
-    gcmrrhidefetchurl = Column(Integer)
+@lazy_model('repo')
+def Repo():
+    class Repo(Base):
+        __tablename__ = 'repo'
+        __table_args__ = (
+            Index('idx_repo_owner', 'owner'),
+            Index('idx_repo_created', 'created'),
+            {'schema': 'perforce'},
+        )
+        repo = Column(String, primary_key=True)
+        owner = Column(String)
+        created = Column(BigInteger)
+        pushed = Column(BigInteger)
+        forked = Column(String)
+        desc = Column(String)
+        branch = Column(String)
+        mirror = Column(String)
+        options = Column(Integer)
+        id = Column(Integer)
+        gcmrrserver = Column(String)
+        gcmrrsecrettoken = Column(String)
+        gcmrrstatus = Column(Integer)
+        gcmrrexcludedbranches = Column(String)
+        gcmrrhidefetchurl = Column(Integer)
+    return Repo
 
 # perforce.resolve - Pending integration records
-class Resolve(Base):
-    __tablename__ = 'resolve'
-    __table_args__ = {'schema': 'perforce'}
-    toFile = Column(String, primary_key=True)
-    fromFile = Column(String, primary_key=True)
-    startFromRev = Column(Integer, primary_key=True)
-    endFromRev = Column(Integer)
-    startToRev = Column(Integer)
-    endToRev = Column(Integer)
-    how = Column(String)
-    state = Column(String)
-    baseFile = Column(String)
-    baseRev = Column(Integer)
+@lazy_model('resolve')
+def Resolve():
+    class Resolve(Base):
+        __tablename__ = 'resolve'
+        __table_args__ = (
+            Index('idx_resolve_how', 'how'),
+            Index('idx_resolve_state', 'state'),
+            {'schema': 'perforce'},
+        )
+        toFile = Column(String, primary_key=True)
+        fromFile = Column(String, primary_key=True)
+        startFromRev = Column(Integer, primary_key=True)
+        endFromRev = Column(Integer)
+        startToRev = Column(Integer)
+        endToRev = Column(Integer)
+        how = Column(String)
+        state = Column(String)
+        baseFile = Column(String)
+        baseRev = Column(Integer)
+    return Resolve
 
 # perforce.resolveg - Resolve records for clients of type graph
-class Resolveg(Base):
-    __tablename__ = 'resolveg'
-    __table_args__ = {'schema': 'perforce'}
-    toFile = Column(String, primary_key=True)
-    fromFile = Column(String, primary_key=True)
-    baseSHA = Column(String, primary_key=True)
-    wantsSHA = Column(String)
-    how = Column(String)
-    state = Column(String)
+@lazy_model('resolveg')
+def Resolveg():
+    class Resolveg(Base):
+        __tablename__ = 'resolveg'
+        __table_args__ = (
+            Index('idx_resolveg_how', 'how'),
+            Index('idx_resolveg_state', 'state'),
+            {'schema': 'perforce'},
+        )
+        toFile = Column(String, primary_key=True)
+        fromFile = Column(String, primary_key=True)
+        baseSHA = Column(String, primary_key=True)
+        wantsSHA = Column(String)
+        how = Column(String)
+        state = Column(String)
+    return Resolveg
 
 # perforce.resolvex - Pending integration records for shelved files
-class Resolvex(Base):
-    __tablename__ = 'resolvex'
-    __table_args__ = {'schema': 'perforce'}
-    toFile = Column(String, primary_key=True)
-    fromFile = Column(String, primary_key=True)
-    startFromRev = Column(Integer, primary_key=True)
-    endFromRev = Column(Integer)
-    startToRev = Column(Integer)
-    endToRev = Column(Integer)
-    how = Column(String)
-    state = Column(String)
-    baseFile = Column(String)
-    baseRev = Column(Integer)
+@lazy_model('resolvex')
+def Resolvex():
+    class Resolvex(Base):
+        __tablename__ = 'resolvex'
+        __table_args__ = (
+            Index('idx_resolvex_how', 'how'),
+            Index('idx_resolvex_state', 'state'),
+            {'schema': 'perforce'},
+        )
+        toFile = Column(String, primary_key=True)
+        fromFile = Column(String, primary_key=True)
+        startFromRev = Column(Integer, primary_key=True)
+        endFromRev = Column(Integer)
+        startToRev = Column(Integer)
+        endToRev = Column(Integer)
+        how = Column(String)
+        state = Column(String)
+        baseFile = Column(String)
+        baseRev = Column(Integer)
+    return Resolvex
 
 # perforce.rev - Revision records
-class Rev(Base):
-    __tablename__ = 'rev'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('rev')
+def Rev():
+    class Rev(Base):
+        __tablename__ = 'rev'
+        __table_args__ = (
+            Index('idx_rev_change', 'change'),
+            Index('idx_rev_action', 'action'),
+            Index('idx_rev_type', 'type'),
+            Index('idx_rev_date', 'date'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+        depotPath = path_property('depotFile')
+    return Rev
 
 # perforce.revbx - Revision records for archived files
-class Revbx(Base):
-    __tablename__ = 'revbx'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revbx')
+def Revbx():
+    class Revbx(Base):
+        __tablename__ = 'revbx'
+        __table_args__ = (
+            Index('idx_revbx_change', 'change'),
+            Index('idx_revbx_action', 'action'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revbx
 
 # perforce.revcx - Secondary index of perforce.rev
-class Revcx(Base):
-    __tablename__ = 'revcx'
-    __table_args__ = {'schema': 'perforce'}
-    change = Column(Integer, primary_key=True)
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer)
-    action = Column(String)
+@lazy_model('revcx')
+def Revcx():
+    class Revcx(Base):
+        __tablename__ = 'revcx'
+        __table_args__ = (
+            *path_index('idx_revcx_depot_file_id', 'depotFileId'),
+            {'schema': 'perforce'},
+        )
+        change = Column(Integer, primary_key=True)
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer)
+        action = Column(String)
+        depotPath = path_property('depotFile')
+    return Revcx
 
 # perforce.revdx - Revision records for revisions deleted at the head revision
-class Revdx(Base):
-    __tablename__ = 'revdx'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revdx')
+def Revdx():
+    class Revdx(Base):
+        __tablename__ = 'revdx'
+        __table_args__ = (
+            Index('idx_revdx_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revdx
 
 # perforce.revfs - Client filesystem file sizes
-class Revfs(Base):
-    __tablename__ = 'revfs'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    rev = Column(Integer, primary_key=True)
-    clientType = Column(String, primary_key=True)
-    clientSize = Column(BigInteger)
+@lazy_model('revfs')
+def Revfs():
+    class Revfs(Base):
+        __tablename__ = 'revfs'
+        __table_args__ = {'schema': 'perforce'}
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        rev = Column(Integer, primary_key=True)
+        clientType = Column(String, primary_key=True)
+        clientSize = Column(BigInteger)
+    return Revfs
 
 # perforce.revhx - Revision records for revisions NOT deleted at the head revision
-class Revhx(Base):
-    __tablename__ = 'revhx'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revhx')
+def Revhx():
+    class Revhx(Base):
+        __tablename__ = 'revhx'
+        __table_args__ = (
+            Index('idx_revhx_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revhx
 
 # perforce.review - User's review mappings
-class Review(Base):
-    __tablename__ = 'review'
-    __table_args__ = {'schema': 'perforce'}
-    user = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    mapFlag = Column(String)
-    depotFile = Column(String)
-    type = Column(String)
+@lazy_model('review')
+def Review():
+    class Review(Base):
+        __tablename__ = 'review'
+        __table_args__ = (
+            Index('idx_review_depot_file', 'depotFile'),
+            Index('idx_review_type', 'type'),
+            {'schema': 'perforce'},
+        )
+        user = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        mapFlag = Column(String)
+        depotFile = Column(String)
+        type = Column(String)
+    return Review
 
 # perforce.revpx - Pending revision records
-class Revpx(Base):
-    __tablename__ = 'revpx'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revpx')
+def Revpx():
+    class Revpx(Base):
+        __tablename__ = 'revpx'
+        __table_args__ = (
+            Index('idx_revpx_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revpx
 
 # perforce.revsh - Revision records for shelved files
-class Revsh(Base):
-    __tablename__ = 'revsh'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String, primary_key=True)
-    action = Column(String, primary_key=True)
-    change = Column(Integer, primary_key=True)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revsh')
+def Revsh():
+    class Revsh(Base):
+        __tablename__ = 'revsh'
+        __table_args__ = (
+            Index('idx_revsh_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String, primary_key=True)
+        action = Column(String, primary_key=True)
+        change = Column(Integer, primary_key=True)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revsh
 
 # perforce.revstg - Temporary revision records for storage upgrade process
-class Revstg(Base):
-    __tablename__ = 'revstg'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revstg')
+def Revstg():
+    class Revstg(Base):
+        __tablename__ = 'revstg'
+        __table_args__ = (
+            Index('idx_revstg_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revstg
 
 # perforce.revsx - Revision records for spec depot files
-class Revsx(Base):
-    __tablename__ = 'revsx'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revsx')
+def Revsx():
+    class Revsx(Base):
+        __tablename__ = 'revsx'
+        __table_args__ = (
+            Index('idx_revsx_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revsx
 
 # perforce.revtr - Rev table for huge traits
-class Revtr(Base):
-    __tablename__ = 'revtr'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revtr')
+def Revtr():
+    class Revtr(Base):
+        __tablename__ = 'revtr'
+        __table_args__ = (
+            Index('idx_revtr_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revtr
 
 # perforce.revtx - Task stream revision records
-class Revtx(Base):
-    __tablename__ = 'revtx'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revtx')
+def Revtx():
+    class Revtx(Base):
+        __tablename__ = 'revtx'
+        __table_args__ = (
+            Index('idx_revtx_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revtx
 
 # perforce.revux - Revision records for unload depot files
-class Revux(Base):
-    __tablename__ = 'revux'
-    __table_args__ = {'schema': 'perforce'}
-    depotFile = Column(String, primary_key=True)
-    depotRev = Column(Integer, primary_key=True)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    modTime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    lbrIsLazy = Column(String)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
+@lazy_model('revux')
+def Revux():
+    class Revux(Base):
+        __tablename__ = 'revux'
+        __table_args__ = (
+            Index('idx_revux_change', 'change'),
+            {'schema': 'perforce'},
+        )
+        depotFile = path_column(key=True)
+        if _path_ids:
+            depotFileId = path_id('depotFile', key=True)
+        depotRev = Column(Integer, primary_key=True)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        modTime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        lbrIsLazy = Column(String)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+    return Revux
 
 # perforce.rmtview - View data for remote specifications
-class Rmtview(Base):
-    __tablename__ = 'rmtview'
-    __table_args__ = {'schema': 'perforce'}
-    id = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    mapFlag = Column(String)
-    localFile = Column(String)
-    remoteFile = Column(String)
-    retain = Column(Integer)
+@lazy_model('rmtview')
+def Rmtview():
+    class Rmtview(Base):
+        __tablename__ = 'rmtview'
+        __table_args__ = {'schema': 'perforce'}
+        id = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        mapFlag = Column(String)
+        localFile = Column(String)
+        remoteFile = Column(String)
+        retain = Column(Integer)
+    return Rmtview
 
 # perforce.scanctl - ScanCtl
-class Scanctl(Base):
-    __tablename__ = 'scanctl'
-    __table_args__ = {'schema': 'perforce'}
-    depotPath = Column(String, primary_key=True)
-    state = Column(String)
-    seq = Column(Integer)
-    dirs = Column(Integer)
-    files = Column(Integer)
-    zeros = Column(Integer)
-    dirserr = Column(Integer)
-    pri = Column(Integer)
-    reqpause = Column(Integer)
-    err = Column(String)
-    filesnonlbr = Column(Integer)
-    filesage = Column(Integer)
-    report = Column(String)
-    target = Column(String)
-    flags = Column(String)
-    reqage = Column(Integer)
+@lazy_model('scanctl')
+def Scanctl():
+    class Scanctl(Base):
+        __tablename__ = 'scanctl'
+        __table_args__ = {'schema': 'perforce'}
+        depotPath = Column(String, primary_key=True)
+        state = Column(String)
+        seq = Column(Integer)
+        dirs = Column(Integer)
+        files = Column(Integer)
+        zeros = Column(Integer)
+        dirserr = Column(Integer)
+        pri = Column(Integer)
+        reqpause = Column(Integer)
+        err = Column(String)
+        filesnonlbr = Column(Integer)
+        filesage = Column(Integer)
+        report = Column(String)
+        target = Column(String)
+        flags = Column(String)
+        reqage = Column(Integer)
+    return Scanctl
 
 # perforce.scandir - Scandir
-class Scandir(Base):
-    __tablename__ = 'scandir'
-    __table_args__ = {'schema': 'perforce'}
-    lskey = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    file = Column(String)
+@lazy_model('scandir')
+def Scandir():
+    class Scandir(Base):
+        __tablename__ = 'scandir'
+        __table_args__ = {'schema': 'perforce'}
+        lskey = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        file = Column(String)
+    return Scandir
 
 # perforce.sendq - Parallel file transmission work queue
-class Sendq(Base):
-    __tablename__ = 'sendq'
-    __table_args__ = {'schema': 'perforce'}
-    taskid = Column(Integer, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    handle = Column(String)
-    depotFile = Column(String)
-    clientFile = Column(String)
-    haveRev = Column(Integer)
-    type = Column(String)
-    modtime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
-    flags = Column(Integer)
-    clientType = Column(String)
-    depotRev = Column(Integer)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    blobSha = Column(String)
-    repoSlot = Column(Integer)
-    shelveDigest = Column(String)
-    olbrFile = Column(String)
-    olbrRev = Column(String)
-    olbrType = Column(String)
+@lazy_model('sendq')
+def Sendq():
+    class Sendq(Base):
+        __tablename__ = 'sendq'
+        __table_args__ = (
+            *path_index('idx_sendq_depot_file_id', 'depotFileId'),
+            *path_index('idx_sendq_client_file_id', 'clientFileId'),
+            {'schema': 'perforce'},
+        )
+        taskid = Column(Integer, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        handle = Column(String)
+        depotFile = path_column()
+        if _path_ids:
+            depotFileId = path_id('depotFile')
+        clientFile = path_column()
+        if _path_ids:
+            clientFileId = path_id('clientFile')
+        haveRev = Column(Integer)
+        type = Column(String)
+        modtime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+        flags = Column(Integer)
+        clientType = Column(String)
+        depotRev = Column(Integer)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        blobSha = Column(String)
+        repoSlot = Column(Integer)
+        shelveDigest = Column(String)
+        olbrFile = Column(String)
+        olbrRev = Column(String)
+        olbrType = Column(String)
+        depotPath = path_property('depotFile')
+        clientPath = path_property('clientFile')
+    return Sendq
 
 # perforce.sendq_pt - Per Client transmission work queue
-class SendqPt(Base):
-    __tablename__ = 'sendq_pt'
-    __table_args__ = {'schema': 'perforce'}
-    taskid = Column(Integer, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    handle = Column(String)
-    depotFile = Column(String)
-    clientFile = Column(String)
-    haveRev = Column(Integer)
-    type = Column(String)
-    modtime = Column(BigInteger)
-    digest = Column(String)
-    size = Column(BigInteger)
-    lbrFile = Column(String)
-    lbrRev = Column(String)
-    lbrType = Column(String)
-    flags = Column(Integer)
-    clientType = Column(String)
-    depotRev = Column(Integer)
-    change = Column(Integer)
-    date = Column(BigInteger)
-    blobSha = Column(String)
-    repoSlot = Column(Integer)
-    shelveDigest = Column(String)
-    olbrFile = Column(String)
-    olbrRev = Column(String)
-    olbrType = Column(String)
+@lazy_model('sendq_pt')
+def SendqPt():
+    class SendqPt(Base):
+        __tablename__ = 'sendq_pt'
+        __table_args__ = {'schema': 'perforce'}
+        taskid = Column(Integer, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        handle = Column(String)
+        depotFile = Column(String)
+        clientFile = Column(String)
+        haveRev = Column(Integer)
+        type = Column(String)
+        modtime = Column(BigInteger)
+        digest = Column(String)
+        size = Column(BigInteger)
+        lbrFile = Column(String)
+        lbrRev = Column(String)
+        lbrType = Column(String)
+        flags = Column(Integer)
+        clientType = Column(String)
+        depotRev = Column(Integer)
+        change = Column(Integer)
+        date = Column(BigInteger)
+        blobSha = Column(String)
+        repoSlot = Column(Integer)
+        shelveDigest = Column(String)
+        olbrFile = Column(String)
+        olbrRev = Column(String)
+        olbrType = Column(String)
+    return SendqPt
 
 # perforce.server - Server specifications
-class Server(Base):
-    __tablename__ = 'server'
-    __table_args__ = {'schema': 'perforce'}
-    id = Column(String, primary_key=True)
-    type = Column(String)
-    name = Column(String)
-    address = Column(String)
-    externalAddress = Column(String)
-    services = Column(String)
-    desc = Column(String)
-    user = Column(String)
-    options = Column(String)
-    rplFrom = Column(String)
-    failoverSeen = Column(String)
+@lazy_model('server')
+def Server():
+    class Server(Base):
+        __tablename__ = 'server'
+        __table_args__ = {'schema': 'perforce'}
+        id = Column(String, primary_key=True)
+        type = Column(String)
+        name = Column(String)
+        address = Column(String)
+        externalAddress = Column(String)
+        services = Column(String)
+        desc = Column(String)
+        user = Column(String)
+        options = Column(String)
+        rplFrom = Column(String)
+        failoverSeen = Column(String)
+    return Server
 
 # perforce.stash - Stash data
-class Stash(Base):
-    __tablename__ = 'stash'
-    __table_args__ = {'schema': 'perforce'}
-    client = Column(String, primary_key=True)
-    stream = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    change = Column(Integer)
+@lazy_model('stash')
+def Stash():
+    class Stash(Base):
+        __tablename__ = 'stash'
+        __table_args__ = {'schema': 'perforce'}
+        client = Column(String, primary_key=True)
+        stream = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        change = Column(Integer)
+    return Stash
 
 # perforce.storage - Track references to archive files
-class Storage(Base):
-    __tablename__ = 'storage'
-    __table_args__ = {'schema': 'perforce'}
-    file = Column(String, primary_key=True)
-    rev = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    refCount = Column(Integer)
-    digest = Column(String)
-    size = Column(BigInteger)
-    serverSize = Column(BigInteger)
-    compCksum = Column(String)
-    date = Column(BigInteger)
+@lazy_model('storage')
+def Storage():
+    class Storage(Base):
+        __tablename__ = 'storage'
+        __table_args__ = (
+            Index('idx_storage_digest_size', 'digest', 'size'),
+            {'schema': 'perforce'},
+        )
+        file = Column(String, primary_key=True)
+        rev = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        refCount = Column(Integer)
+        digest = Column(String)
+        size = Column(BigInteger)
+        serverSize = Column(BigInteger)
+        compCksum = Column(String)
+        date = Column(BigInteger)
+    return Storage
 
 # perforce.storageg - Track references to Graph Depot archive files (for future use)
-class Storageg(Base):
-    __tablename__ = 'storageg'
-    __table_args__ = {'schema': 'perforce'}
-    repo = Column(String, primary_key=True)
-    sha = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    refCount = Column(Integer)
-    date = Column(BigInteger)
+@lazy_model('storageg')
+def Storageg():
+    class Storageg(Base):
+        __tablename__ = 'storageg'
+        __table_args__ = (
+            Index('idx_storageg_sha', 'sha'),
+            {'schema': 'perforce'},
+        )
+        repo = Column(String, primary_key=True)
+        sha = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        refCount = Column(Integer)
+        date = Column(BigInteger)
+    return Storageg
 
 # perforce.storagesh - Track references to shelved archive files
-class Storagesh(Base):
-    __tablename__ = 'storagesh'
-    __table_args__ = {'schema': 'perforce'}
-    file = Column(String, primary_key=True)
-    rev = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    refCount = Column(Integer)
-    digest = Column(String)
-    size = Column(BigInteger)
-    serverSize = Column(BigInteger)
-    compCksum = Column(String)
-    date = Column(BigInteger)
+@lazy_model('storagesh')
+def Storagesh():
+    class Storagesh(Base):
+        __tablename__ = 'storagesh'
+        __table_args__ = (
+            Index('idx_storagesh_digest_size', 'digest', 'size'),
+            {'schema': 'perforce'},
+        )
+        file = Column(String, primary_key=True)
+        rev = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        refCount = Column(Integer)
+        digest = Column(String)
+        size = Column(BigInteger)
+        serverSize = Column(BigInteger)
+        compCksum = Column(String)
+        date = Column(BigInteger)
+    return Storagesh
 
 # perforce.storagesx - Digest and filesize based index for perforce.storagesh, for finding shelved files with identical content
-class Storagesx(Base):
-    __tablename__ = 'storagesx'
-    __table_args__ = {'schema': 'perforce'}
-    digest = Column(String, primary_key=True)
-    size = Column(BigInteger, primary_key=True)
-    file = Column(String, primary_key=True)
-    rev = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
+@lazy_model('storagesx')
+def Storagesx():
+    class Storagesx(Base):
+        __tablename__ = 'storagesx'
+        __table_args__ = {'schema': 'perforce'}
+        digest = Column(String, primary_key=True)
+        size = Column(BigInteger, primary_key=True)
+        file = Column(String, primary_key=True)
+        rev = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+    return Storagesx
 
 # perforce.stream - Stream specifications
-class Stream(Base):
-    __tablename__ = 'stream'
-    __table_args__ = {'schema': 'perforce'}
-    stream = Column(String, primary_key=True)
-    parent = Column(String)
-    title = Column(String)
-    type = Column(String)
-    preview = Column(BigInteger)
-    change = Column(Integer)
-    copyChange = Column(Integer)
-    mergeChange = Column(Integer)
-    highChange = Column(Integer)
-    hash = Column(Integer)
-    status = Column(String)
-    parentview = Column(String)
+@lazy_model('stream')
+def Stream():
+    class Stream(Base):
+        __tablename__ = 'stream'
+        __table_args__ = (
+            Index('idx_stream_parent', 'parent'),
+            Index('idx_stream_type', 'type'),
+            Index('idx_stream_status', 'status'),
+            {'schema': 'perforce'},
+        )
+        stream = Column(String, primary_key=True)
+        parent = Column(String)
+        title = Column(String)
+        type = Column(String)
+        preview = Column(BigInteger)
+        change = Column(Integer)
+        copyChange = Column(Integer)
+        mergeChange = Column(Integer)
+        highChange = Column(Integer)
+        hash = Column(Integer)
+        status = Column(String)
+        parentview = Column(String)
+    return Stream
 
 # perforce.streamq - Track streams for which the stream views should be regenerated
-class Streamq(Base):
-    __tablename__ = 'streamq'
-    __table_args__ = {'schema': 'perforce'}
-    stream = Column(String, primary_key=True)
+@lazy_model('streamq')
+def Streamq():
+    class Streamq(Base):
+        __tablename__ = 'streamq'
+        __table_args__ = {'schema': 'perforce'}
+        stream = Column(String, primary_key=True)
+    return Streamq
 
 # perforce.streamrelation - Relationships between streams
-class Streamrelation(Base):
-    __tablename__ = 'streamrelation'
-    __table_args__ = {'schema': 'perforce'}
-    independentStream = Column(String, primary_key=True)
-    dependentStream = Column(String, primary_key=True)
-    type = Column(String)
-    parentView = Column(String)
+@lazy_model('streamrelation')
+def Streamrelation():
+    class Streamrelation(Base):
+        __tablename__ = 'streamrelation'
+        __table_args__ = {'schema': 'perforce'}
+        independentStream = Column(String, primary_key=True)
+        dependentStream = Column(String, primary_key=True)
+        type = Column(String)
+        parentView = Column(String)
+    return Streamrelation
 
 # perforce.streamview - Precomputed stream views
-class Streamview(Base):
-    __tablename__ = 'streamview'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    mapFlag = Column(String)
-    viewFile = Column(String)
-    depotFile = Column(String)
-    comment = Column(String)
+@lazy_model('streamview')
+def Streamview():
+    class Streamview(Base):
+        __tablename__ = 'streamview'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        mapFlag = Column(String)
+        viewFile = Column(String)
+        depotFile = Column(String)
+        comment = Column(String)
+    return Streamview
 
 # perforce.streamviewx - Indexing for precomputed stream views
-class Streamviewx(Base):
-    __tablename__ = 'streamviewx'
-    __table_args__ = {'schema': 'perforce'}
-    depotPath = Column(String, primary_key=True)
-    viewPath = Column(String, primary_key=True)
-    mapFlag = Column(String, primary_key=True)
-    stream = Column(String, primary_key=True)
-    change = Column(String)
-    pathSource = Column(String)
-    pathType = Column(String)
-    componentPrefixes = Column(String)
-    effectiveComponentType = Column(String)
+@lazy_model('streamviewx')
+def Streamviewx():
+    class Streamviewx(Base):
+        __tablename__ = 'streamviewx'
+        __table_args__ = {'schema': 'perforce'}
+        depotPath = Column(String, primary_key=True)
+        viewPath = Column(String, primary_key=True)
+        mapFlag = Column(String, primary_key=True)
+        stream = Column(String, primary_key=True)
+        change = Column(String)
+        pathSource = Column(String)
+        pathType = Column(String)
+        componentPrefixes = Column(String)
+        effectiveComponentType = Column(String)
+    return Streamviewx
 
 # perforce.submodule - Submodule configuration data
-class Submodule(Base):
-    __tablename__ = 'submodule'
-    __table_args__ = {'schema': 'perforce'}
-    repo = Column(String, primary_key=True)
-    path = Column(String, primary_key=True)
-    subrepo = Column(String)
+@lazy_model('submodule')
+def Submodule():
+    class Submodule(Base):
+        __tablename__ = 'submodule'
+        __table_args__ = {'schema': 'perforce'}
+        repo = Column(String, primary_key=True)
+        path = Column(String, primary_key=True)
+        subrepo = Column(String)
+    return Submodule
 
 # perforce.svrview - View data for servers specifications
-class Svrview(Base):
-    __tablename__ = 'svrview'
-    __table_args__ = {'schema': 'perforce'}
-    id = Column(String, primary_key=True)
-    type = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    mapFlag = Column(String)
-    viewFile = Column(String)
+@lazy_model('svrview')
+def Svrview():
+    class Svrview(Base):
+        __tablename__ = 'svrview'
+        __table_args__ = {'schema': 'perforce'}
+        id = Column(String, primary_key=True)
+        type = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        mapFlag = Column(String)
+        viewFile = Column(String)
+    return Svrview
 
 # perforce.template - Streams templates
-class Template(Base):
-    __tablename__ = 'template'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    change = Column(Integer, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    parent = Column(String)
-    type = Column(String)
-    path = Column(String)
-    viewFile = Column(String)
-    depotFile = Column(String)
-    changeMap = Column(String)
+@lazy_model('template')
+def Template():
+    class Template(Base):
+        __tablename__ = 'template'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        change = Column(Integer, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        parent = Column(String)
+        type = Column(String)
+        path = Column(String)
+        viewFile = Column(String)
+        depotFile = Column(String)
+        changeMap = Column(String)
+    return Template
 
 # perforce.templatesx - Shelved stream templates
-class Templatesx(Base):
-    __tablename__ = 'templatesx'
-    __table_args__ = {'schema': 'perforce'}
-    shelf = Column(Integer, primary_key=True)
-    name = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    change = Column(Integer)
-    parent = Column(String)
-    type = Column(String)
-    path = Column(String)
-    viewFile = Column(String)
-    depotFile = Column(String)
-    changeMap = Column(String)
-    changeAtOpen = Column(Integer)
-    user = Column(String)
-    action = Column(String)
+@lazy_model('templatesx')
+def Templatesx():
+    class Templatesx(Base):
+        __tablename__ = 'templatesx'
+        __table_args__ = {'schema': 'perforce'}
+        shelf = Column(Integer, primary_key=True)
+        name = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        change = Column(Integer)
+        parent = Column(String)
+        type = Column(String)
+        path = Column(String)
+        viewFile = Column(String)
+        depotFile = Column(String)
+        changeMap = Column(String)
+        changeAtOpen = Column(Integer)
+        user = Column(String)
+        action = Column(String)
+    return Templatesx
 
 # perforce.templatewx - Pending stream templates
-class Templatewx(Base):
-    __tablename__ = 'templatewx'
-    __table_args__ = {'schema': 'perforce'}
-    client = Column(String, primary_key=True)
-    name = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    change = Column(Integer)
-    parent = Column(String)
-    type = Column(String)
-    path = Column(String)
-    viewFile = Column(String)
-    depotFile = Column(String)
-    changeMap = Column(String)
-    changeAtOpen = Column(Integer)
-    user = Column(String)
-    action = Column(String)
+@lazy_model('templatewx')
+def Templatewx():
+    class Templatewx(Base):
+        __tablename__ = 'templatewx'
+        __table_args__ = {'schema': 'perforce'}
+        client = Column(String, primary_key=True)
+        name = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        change = Column(Integer)
+        parent = Column(String)
+        type = Column(String)
+        path = Column(String)
+        viewFile = Column(String)
+        depotFile = Column(String)
+        changeMap = Column(String)
+        changeAtOpen = Column(Integer)
+        user = Column(String)
+        action = Column(String)
+    return Templatewx
 
 # perforce.ticket - Second factor authentication state on a per user/host basis
-class Ticket(Base):
-    __tablename__ = 'ticket'
-    __table_args__ = {'schema': 'perforce'}
-    user = Column(String, primary_key=True)
-    host = Column(String, primary_key=True)
-    ticket = Column(String)
-    state = Column(String)
-    token = Column(String)
-    updateDate = Column(BigInteger)
+@lazy_model('ticket')
+def Ticket():
+    class Ticket(Base):
+        __tablename__ = 'ticket'
+        __table_args__ = {'schema': 'perforce'}
+        user = Column(String, primary_key=True)
+        host = Column(String, primary_key=True)
+        ticket = Column(String)
+        state = Column(String)
+        token = Column(String)
+        updateDate = Column(BigInteger)
+    return Ticket
 
 # perforce.ticket_rp - Second factor authentication state on a per user/host basis (replica)
-class TicketRp(Base):
-    __tablename__ = 'ticket_rp'
-    __table_args__ = {'schema': 'perforce'}
-    user = Column(String, primary_key=True)
-    host = Column(String, primary_key=True)
-    ticket = Column(String)
-    state = Column(String)
-    token = Column(String)
-    updateDate = Column(BigInteger)
+@lazy_model('ticket_rp')
+def TicketRp():
+    class TicketRp(Base):
+        __tablename__ = 'ticket_rp'
+        __table_args__ = {'schema': 'perforce'}
+        user = Column(String, primary_key=True)
+        host = Column(String, primary_key=True)
+        ticket = Column(String)
+        state = Column(String)
+        token = Column(String)
+        updateDate = Column(BigInteger)
+    return TicketRp
 
 # perforce.topology - Topology information
-class Topology(Base):
-    __tablename__ = 'topology'
-    __table_args__ = {'schema': 'perforce'}
-    address = Column(String, primary_key=True)
-    destAddress = Column(String, primary_key=True)
-    serverID = Column(String, primary_key=True)
-    date = Column(BigInteger, primary_key=True)
-    type = Column(String)
-    encryption = Column(String)
-    svcUser = Column(String)
-    lastSeenDate = Column(BigInteger)
-    svrRecType = Column(String)
-    taddr = Column(String)
-    tdaddr = Column(String)
-    tid = Column(String)
-    version = Column(String)
+@lazy_model('topology')
+def Topology():
+    class Topology(Base):
+        __tablename__ = 'topology'
+        __table_args__ = {'schema': 'perforce'}
+        address = Column(String, primary_key=True)
+        destAddress = Column(String, primary_key=True)
+        serverID = Column(String, primary_key=True)
+        date = Column(BigInteger, primary_key=True)
+        type = Column(String)
+        encryption = Column(String)
+        svcUser = Column(String)
+        lastSeenDate = Column(BigInteger)
+        svrRecType = Column(String)
+        taddr = Column(String)
+        tdaddr = Column(String)
+        tid = Column(String)
+        version = Column(String)
+    return Topology
 
 # perforce.traits - Attributes associated with file revisions
-class Traits(Base):
-    __tablename__ = 'traits'
-    __table_args__ = {'schema': 'perforce'}
-    traitLot = Column(Integer, primary_key=True)
-    name = Column(String, primary_key=True)
-    type = Column(String)
-    value = Column(Binary)
+@lazy_model('traits')
+def Traits():
+    class Traits(Base):
+        __tablename__ = 'traits'
+        __table_args__ = {'schema': 'perforce'}
+        traitLot = Column(Integer, primary_key=True)
+        name = Column(String, primary_key=True)
+        type = Column(String)
+        value = Column(Binary)
+    return Traits
 
 # perforce.trigger - Trigger specifications
-class Trigger(Base):
-    __tablename__ = 'trigger'
-    __table_args__ = {'schema': 'perforce'}
-    seq = Column(Integer, primary_key=True)
-    name = Column(String)
-    mapFlag = Column(String)
-    depotFile = Column(String)
-    triggerDepotFile = Column(String)
-    trigger = Column(String)
-    action = Column(String)
+@lazy_model('trigger')
+def Trigger():
+    class Trigger(Base):
+        __tablename__ = 'trigger'
+        __table_args__ = {'schema': 'perforce'}
+        seq = Column(Integer, primary_key=True)
+        name = Column(String)
+        mapFlag = Column(String)
+        depotFile = Column(String)
+        triggerDepotFile = Column(String)
+        trigger = Column(String)
+        action = Column(String)
+    return Trigger
 
 # perforce.upgrades - Store server upgrade info
-class Upgrades(Base):
-    __tablename__ = 'upgrades'
-    __table_args__ = {'schema': 'perforce'}
-    seq = Column(Integer, primary_key=True)
-    name = Column(String)
-    state = Column(String)
-    startdate = Column(BigInteger)
-    enddate = Column(BigInteger)
-    info = Column(String)
+@lazy_model('upgrades')
+def Upgrades():
+    class Upgrades(Base):
+        __tablename__ = 'upgrades'
+        __table_args__ = {'schema': 'perforce'}
+        seq = Column(Integer, primary_key=True)
+        name = Column(String)
+        state = Column(String)
+        startdate = Column(BigInteger)
+        enddate = Column(BigInteger)
+        info = Column(String)
+    return Upgrades
 
 # perforce.upgrades_rp - Store replica upgrade info
-class UpgradesRp(Base):
-    __tablename__ = 'upgrades_rp'
-    __table_args__ = {'schema': 'perforce'}
-    seq = Column(Integer, primary_key=True)
-    name = Column(String)
-    state = Column(String)
-    startdate = Column(BigInteger)
-    enddate = Column(BigInteger)
-    info = Column(String)
+@lazy_model('upgrades_rp')
+def UpgradesRp():
+    class UpgradesRp(Base):
+        __tablename__ = 'upgrades_rp'
+        __table_args__ = {'schema': 'perforce'}
+        seq = Column(Integer, primary_key=True)
+        name = Column(String)
+        state = Column(String)
+        startdate = Column(BigInteger)
+        enddate = Column(BigInteger)
+        info = Column(String)
+    return UpgradesRp
 
 # perforce.user - User specifications
-class User(Base):
-    __tablename__ = 'user'
-    __table_args__ = {'schema': 'perforce'}
-    user = Column(String, primary_key=True)
-    email = Column(String)
-    jobView = Column(String)
-    updateDate = Column(BigInteger)
-    accessDate = Column(BigInteger)
-    fullName = Column(String)
-    password = Column(String)
-    strength = Column(String)
-    ticket = Column(String)
-    endDate = Column(BigInteger)
-    type = Column(String)
-    passDate = Column(BigInteger)
-    passExpire = Column(BigInteger)
-    attempts = Column(BigInteger)
-    auth = Column(String)
+@lazy_model('user')
+def User():
+    class User(Base):
+        __tablename__ = 'user'
+        __table_args__ = (
+            Index('idx_user_type', 'type'),
+            Index('idx_user_auth', 'auth'),
+            Index('idx_user_update_date', 'updateDate'),
+            {'schema': 'perforce'},
+        )
+        user = Column(String, primary_key=True)
+        email = Column(String)
+        jobView = Column(String)
+        updateDate = Column(BigInteger)
+        accessDate = Column(BigInteger)
+        fullName = Column(String)
+        password = Column(String)
+        strength = Column(String)
+        ticket = Column(String)
+        endDate = Column(BigInteger)
+        type = Column(String)
+        passDate = Column(BigInteger)
+        passExpire = Column(BigInteger)
+        attempts = Column(BigInteger)
+        auth = Column(String)
+    return User
 
 # perforce.user_rp - Used by replica server's to store login information
-class UserRp(Base):
-    __tablename__ = 'user_rp'
-    __table_args__ = {'schema': 'perforce'}
-    user = Column(String, primary_key=True)
-    email = Column(String)
-    jobView = Column(String)
-    updateDate = Column(BigInteger)
-    accessDate = Column(BigInteger)
-    fullName = Column(String)
-    password = Column(String)
-    strength = Column(String)
-    ticket = Column(String)
-    endDate = Column(BigInteger)
-    type = Column(String)
-    passDate = Column(BigInteger)
-    passExpire = Column(BigInteger)
-    attempts = Column(BigInteger)
-    auth = Column(String)
+@lazy_model('user_rp')
+def UserRp():
+    class UserRp(Base):
+        __tablename__ = 'user_rp'
+        __table_args__ = {'schema': 'perforce'}
+        user = Column(String, primary_key=True)
+        email = Column(String)
+        jobView = Column(String)
+        updateDate = Column(BigInteger)
+        accessDate = Column(BigInteger)
+        fullName = Column(String)
+        password = Column(String)
+        strength = Column(String)
+        ticket = Column(String)
+        endDate = Column(BigInteger)
+        type = Column(String)
+        passDate = Column(BigInteger)
+        passExpire = Column(BigInteger)
+        attempts = Column(BigInteger)
+        auth = Column(String)
+    return UserRp
 
 # perforce.uxtext - Indexing data for P4 Code Review
-class Uxtext(Base):
-    __tablename__ = 'uxtext'
-    __table_args__ = {'schema': 'perforce'}
-    word = Column(String, primary_key=True)
-    attr = Column(Integer, primary_key=True)
-    value = Column(String, primary_key=True)
+@lazy_model('uxtext')
+def Uxtext():
+    class Uxtext(Base):
+        __tablename__ = 'uxtext'
+        __table_args__ = {'schema': 'perforce'}
+        word = Column(String, primary_key=True)
+        attr = Column(Integer, primary_key=True)
+        value = Column(String, primary_key=True)
+    return Uxtext
 
 # perforce.view - View data for domain records
-class View(Base):
-    __tablename__ = 'view'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    mapFlag = Column(String)
-    viewFile = Column(String)
-    depotFile = Column(String)
-    comment = Column(String)
+@lazy_model('view')
+def View():
+    class View(Base):
+        __tablename__ = 'view'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        mapFlag = Column(String)
+        viewFile = Column(String)
+        depotFile = Column(String)
+        comment = Column(String)
+    return View
 
 # perforce.view_rp - View data for clients of build-server replicas
-class ViewRp(Base):
-    __tablename__ = 'view_rp'
-    __table_args__ = {'schema': 'perforce'}
-    name = Column(String, primary_key=True)
-    seq = Column(Integer, primary_key=True)
-    mapFlag = Column(String)
-    viewFile = Column(String)
-    depotFile = Column(String)
-    comment = Column(String)
+@lazy_model('view_rp')
+def ViewRp():
+    class ViewRp(Base):
+        __tablename__ = 'view_rp'
+        __table_args__ = {'schema': 'perforce'}
+        name = Column(String, primary_key=True)
+        seq = Column(Integer, primary_key=True)
+        mapFlag = Column(String)
+        viewFile = Column(String)
+        depotFile = Column(String)
+        comment = Column(String)
+    return ViewRp
 
 # perforce.working - Records for work in progress
-class Working(Base):
-    __tablename__ = 'working'
-    __table_args__ = {'schema': 'perforce'}
-    clientFile = Column(String, primary_key=True)
-    depotFile = Column(String)
-    client = Column(String)
-    user = Column(String)
-    haveRev = Column(Integer)
-    workRev = Column(Integer)
-    isVirtual = Column(Integer)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    modTime = Column(BigInteger)
-    isLocked = Column(String)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    tampered = Column(String)
-    clientType = Column(String)
-    movedFile = Column(String)
-    status = Column(String)
+@lazy_model('working')
+def Working():
+    class Working(Base):
+        __tablename__ = 'working'
+        __table_args__ = (
+            Index('idx_working_depot_file', 'depotFile'),
+            Index('idx_working_client', 'client'),
+            Index('idx_working_user', 'user'),
+            Index('idx_working_change', 'change'),
+            Index('idx_working_action', 'action'),
+            *path_index('idx_working_depot_file_id', 'depotFileId'),
+            {'schema': 'perforce'},
+        )
+        clientFile = path_column(key=True)
+        if _path_ids:
+            clientFileId = path_id('clientFile', key=True)
+        depotFile = path_column()
+        if _path_ids:
+            depotFileId = path_id('depotFile')
+        client = Column(String)
+        user = Column(String)
+        haveRev = Column(Integer)
+        workRev = Column(Integer)
+        isVirtual = Column(Integer)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        modTime = Column(BigInteger)
+        isLocked = Column(String)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        tampered = Column(String)
+        clientType = Column(String)
+        movedFile = Column(String)
+        status = Column(String)
+        depotPath = path_property('depotFile')
+    return Working
 
 # perforce.workingg - Working records for clients of type graph
-class Workingg(Base):
-    __tablename__ = 'workingg'
-    __table_args__ = {'schema': 'perforce'}
-    clientFile = Column(String, primary_key=True)
-    depotFile = Column(String)
-    client = Column(String)
-    user = Column(String)
-    haveRev = Column(Integer)
-    workRev = Column(Integer)
-    isVirtual = Column(Integer)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    modTime = Column(BigInteger)
-    isLocked = Column(String)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    tampered = Column(String)
-    clientType = Column(String)
-    movedFile = Column(String)
-    status = Column(String)
-    blobSha = Column(String)
-    repo = Column(String)
+@lazy_model('workingg')
+def Workingg():
+    class Workingg(Base):
+        __tablename__ = 'workingg'
+        __table_args__ = (
+            Index('idx_workingg_depot_file', 'depotFile'),
+            {'schema': 'perforce'},
+        )
+        clientFile = Column(String, primary_key=True)
+        depotFile = Column(String)
+        client = Column(String)
+        user = Column(String)
+        haveRev = Column(Integer)
+        workRev = Column(Integer)
+        isVirtual = Column(Integer)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        modTime = Column(BigInteger)
+        isLocked = Column(String)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        tampered = Column(String)
+        clientType = Column(String)
+        movedFile = Column(String)
+        status = Column(String)
+        blobSha = Column(String)
+        repo = Column(String)
+    return Workingg
 
 # perforce.workingx - Records for shelved open files
-class Workingx(Base):
-    __tablename__ = 'workingx'
-    __table_args__ = {'schema': 'perforce'}
-    clientFile = Column(String, primary_key=True)
-    depotFile = Column(String)
-    client = Column(String)
-    user = Column(String)
-    haveRev = Column(Integer)
-    workRev = Column(Integer)
-    isVirtual = Column(Integer)
-    type = Column(String)
-    action = Column(String)
-    change = Column(Integer)
-    modTime = Column(BigInteger)
-    isLocked = Column(String)
-    digest = Column(String)
-    size = Column(BigInteger)
-    traitLot = Column(Integer)
-    tampered = Column(String)
-    clientType = Column(String)
-    movedFile = Column(String)
-    status = Column(String)
+@lazy_model('workingx')
+def Workingx():
+    class Workingx(Base):
+        __tablename__ = 'workingx'
+        __table_args__ = (
+            Index('idx_workingx_depot_file', 'depotFile'),
+            {'schema': 'perforce'},
+        )
+        clientFile = Column(String, primary_key=True)
+        depotFile = Column(String)
+        client = Column(String)
+        user = Column(String)
+        haveRev = Column(Integer)
+        workRev = Column(Integer)
+        isVirtual = Column(Integer)
+        type = Column(String)
+        action = Column(String)
+        change = Column(Integer)
+        modTime = Column(BigInteger)
+        isLocked = Column(String)
+        digest = Column(String)
+        size = Column(BigInteger)
+        traitLot = Column(Integer)
+        tampered = Column(String)
+        clientType = Column(String)
+        movedFile = Column(String)
+        status = Column(String)
+    return Workingx
 
 # Specialized tables (proxy/replica/tiny)
-class PdbLbr(Base):
-    __tablename__ = 'pdb_lbr'
-    __table_args__ = {'schema': 'perforce'}
-    file = Column(String, primary_key=True)
-    rev = Column(String, primary_key=True)
-
-class RdbLbr(Base):
-    __tablename__ = 'rdb_lbr'
-    __table_args__ = {'schema': 'perforce'}
-    file = Column(String, primary_key=True)
-    rev = Column(String, primary_key=True)
-
-class TinyDb(Base):
-    __tablename__ = 'tiny_db'
-    __table_args__ = {'schema': 'perforce'}
-    key = Column(String, primary_key=True)
-    value = Column(Binary)
+@lazy_model('pdb_lbr')
+def PdbLbr():
+    class PdbLbr(Base):
+        __tablename__ = 'pdb_lbr'
+        __table_args__ = {'schema': 'perforce'}
+        file = Column(String, primary_key=True)
+        rev = Column(String, primary_key=True)
+    return PdbLbr
+
+@lazy_model('rdb_lbr')
+def RdbLbr():
+    class RdbLbr(Base):
+        __tablename__ = 'rdb_lbr'
+        __table_args__ = {'schema': 'perforce'}
+        file = Column(String, primary_key=True)
+        rev = Column(String, primary_key=True)
+    return RdbLbr
+
+@lazy_model('tiny_db')
+def TinyDb():
+    class TinyDb(Base):
+        __tablename__ = 'tiny_db'
+        __table_args__ = {'schema': 'perforce'}
+        key = Column(String, primary_key=True)
+        value = Column(Binary)
+    return TinyDb
+
+# The factories are only reachable through the registry; dropping their
+# module names sends lookups to __getattr__
+for _name in _factories:
+    del globals()[_name]
+del _name
+
+# Star imports look the models up through __getattr__, defining them all
+__all__ = sorted(set(name for name, value in globals().items()
+                     if not name.startswith('_') and not isinstance(value, type(threading)))
+                 | set(_factories))
@@ -0,0 +1,128 @@
+# Partition management for time-partitioned log tables (perforce.raw_events).
+#
+# Partitions are named '<table>_pYYYYMMDD' (daily) or '<table>_pYYYYMMDDHH'
+# (hourly) and cover [start, end) in epoch seconds, UTC aligned. They are
+# created ahead of ingest, detached and dropped once older than the
+# retention period, and can carry a BRIN index on f_timestamp, which is
+# tiny for append-ordered data. Partitioning is PostgreSQL only; on other
+# dialects every operation is a no-op.
+import calendar
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from perforce_log_model import RawEvents
+
+log = logging.getLogger(__name__)
+
+INTERVALS = {
+    'day': (86400, '%Y%m%d'),
+    'hour': (3600, '%Y%m%d%H'),
+}
+
+
+class PartitionManager(object):
+    def __init__(self, engine, table=None, interval='day', retention=timedelta(days=90),
+                 ahead=3, brin=False, column='f_timestamp'):
+        if interval not in INTERVALS:
+            raise ValueError('interval must be one of %s' % ', '.join(sorted(INTERVALS)))
+        self.engine = engine
+        self.table = table if table is not None else RawEvents.__table__
+        self.interval = interval
+        self.step, self.suffix = INTERVALS[interval]
+        self.retention = retention
+        self.ahead = ahead
+        self.brin = brin
+        self.column = column
+
+    @property
+    def enabled(self):
+        return self.engine.dialect.name == 'postgresql'
+
+    def bounds(self, ts):
+        start = int(ts) - int(ts) % self.step
+        return start, start + self.step
+
+    def name(self, start):
+        return '%s_p%s' % (self.table.name, datetime.utcfromtimestamp(start).strftime(self.suffix))
+
+    def start_of(self, name):
+        stamp = name.rsplit('_p', 1)[1]
+        return calendar.timegm(datetime.strptime(stamp, self.suffix).timetuple())
+
+    def _quote(self, name):
+        preparer = self.engine.dialect.identifier_preparer
+        return '%s.%s' % (preparer.quote_schema(self.table.schema), preparer.quote(name))
+
+    # {partition name: start} of the partitions attached to the table, read
+    # on conn if given
+    def existing(self, conn=None):
+        if not self.enabled:
+            return {}
+        if conn is None:
+            with self.engine.connect() as conn:
+                return self.existing(conn)
+        sql = text('''
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+            WHERE n.nspname = :schema AND p.relname = :table''')
+        names = [r[0] for r in conn.execute(sql, schema=self.table.schema,
+                                           table=self.table.name)]
+        prefix = self.table.name + '_p'
+        return dict((n, self.start_of(n)) for n in names if n.startswith(prefix))
+
+    # Create the partitions covering [start_ts, end_ts]; returns created names
+    def ensure(self, start_ts, end_ts=None):
+        if not self.enabled:
+            return []
+        end_ts = start_ts if end_ts is None else end_ts
+        created = []
+        start, _ = self.bounds(start_ts)
+        with self.engine.begin() as conn:
+            present = self.existing(conn)
+            while start <= end_ts:
+                name = self.name(start)
+                if name not in present:
+                    conn.execute('CREATE TABLE IF NOT EXISTS %s PARTITION OF %s '
+                                 'FOR VALUES FROM (%d) TO (%d)' % (
+                                     self._quote(name), self._quote(self.table.name),
+                                     start, start + self.step))
+                    if self.brin:
+                        conn.execute('CREATE INDEX IF NOT EXISTS %s ON %s USING BRIN (%s)' % (
+                            self.engine.dialect.identifier_preparer.quote(name + '_brin'),
+                            self._quote(name), self.column))
+                    created.append(name)
+                start += self.step
+        for name in created:
+            log.info('created partition %s', name)
+        return created
+
+    # Partitions for now .. now + ahead intervals
+    def premake(self, now=None):
+        now = time.time() if now is None else now
+        return self.ensure(now, now + self.ahead * self.step)
+
+    # Detach and drop partitions that ended before now - retention
+    def expire(self, now=None):
+        if not self.enabled or self.retention is None:
+            return []
+        now = time.time() if now is None else now
+        cutoff = now - self.retention.total_seconds()
+        dropped = []
+        for name, start in sorted(self.existing().items(), key=lambda i: i[1]):
+            if start + self.step > cutoff:
+                continue
+            with self.engine.begin() as conn:
+                conn.execute('ALTER TABLE %s DETACH PARTITION %s' % (
+                    self._quote(self.table.name), self._quote(name)))
+                conn.execute('DROP TABLE %s' % self._quote(name))
+            dropped.append(name)
+            log.info('dropped partition %s', name)
+        return dropped
+
+    def maintain(self, now=None):
+        return self.premake(now), self.expire(now)
@@ -0,0 +1,163 @@
+# Path-dictionary encoding for depotFile/clientFile/toFile/fromFile columns.
+#
+# Every path is interned once in perforce.paths together with its parent
+# directories, and the affected tables store the id in the derived <column>Id
+# column. The id columns exist, and replace the strings in the primary keys,
+# only in path-dictionary mode, chosen before the models are defined
+# (PERFORCE_PATH_IDS=1, or perforce_model.use_path_ids(); the loader and
+# tailer CLIs do it for --paths). Journal replay then deletes and replaces
+# rows by their ids, so @dv@ records are encoded too.
+#
+# The strings are kept by default. With drop_strings every path string is
+# left NULL, which is what shrinks rev, integed, have, ... and their key
+# indexes. Only drop them once every reader goes through the depotPath /
+# clientPath hybrids on the models: perforce_correlation, perforce_dedup,
+# perforce_headrev and idx_have_depot_file still read the string columns.
+#
+#   paths = PathDictionary(engine)
+#   loader.add_transform(paths.transform)          # CheckpointLoader
+#   tailer.add_transform(paths.tail_transform)     # JournalTailer
+#
+# Ids of recently seen paths are kept in an LRU of cache_size entries; the
+# others are looked up per batch, so memory does not grow with the number of
+# distinct paths. Ids are assigned in-process from max(id) + 1, so one writer
+# process per database should encode at a time.
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import and_, func, select
+
+from perforce_loader import BatchWriter
+from perforce_model import Paths, path_ids
+
+
+# [(string column, id column)] pairs of a table
+def path_columns(table):
+    return [(table.c[c.info['path_of']], c) for c in table.columns if c.info.get('path_of')]
+
+
+def parent_path(path):
+    cut = path.rstrip('/').rfind('/')
+    if cut <= 1:
+        return None
+    return path[:cut + 1]
+
+
+# An index range scan on a path column: byte-wise (PathString, collated
+# "C" on PostgreSQL) '0' is the character after '/'
+def prefix_range(column, prefix):
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(column >= prefix, column < upper)
+
+
+class PathDictionary(object):
+    def __init__(self, engine, drop_strings=False, cache_size=1000000, chunk_size=1000):
+        if not path_ids():
+            raise RuntimeError('path-dictionary mode is off; set PERFORCE_PATH_IDS=1 or call '
+                               'perforce_model.use_path_ids() before defining the models')
+        self.engine = engine
+        self.drop_strings = drop_strings
+        self.cache_size = cache_size
+        self.chunk_size = chunk_size
+        self._ids = OrderedDict()
+        self._next = None
+        self._pending = []
+        self._lock = threading.Lock()
+        self._writer = None
+
+    # path -> id of the paths (and their parents) that already exist; cached
+    # ids first, the rest from perforce.paths
+    def _known(self, paths):
+        known = {}
+        missing = set()
+        for path in paths:
+            while path is not None and path not in known and path not in missing:
+                path_id = self._ids.get(path)
+                if path_id is None:
+                    missing.add(path)
+                else:
+                    self._ids.move_to_end(path)
+                    known[path] = path_id
+                path = parent_path(path)
+        if missing:
+            missing = sorted(missing)
+            with self.engine.connect() as conn:
+                if self._next is None:
+                    self._next = (conn.scalar(select([func.max(Paths.id)])) or 0) + 1
+                for i in range(0, len(missing), self.chunk_size):
+                    known.update(conn.execute(select([Paths.path, Paths.id]).where(
+                        Paths.path.in_(missing[i:i + self.chunk_size]))).fetchall())
+        return known
+
+    def _intern(self, path, known):
+        path_id = known.get(path)
+        if path_id is None:
+            parent = parent_path(path)
+            parent_id = self._intern(parent, known) if parent is not None else None
+            path_id = known[path] = self._next
+            self._next += 1
+            self._pending.append((path_id, path, parent_id))
+        return path_id
+
+    def _remember(self, known):
+        ids = self._ids
+        for path, path_id in known.items():
+            ids[path] = path_id
+            ids.move_to_end(path)
+        while len(ids) > self.cache_size:
+            ids.popitem(last=False)
+
+    # Ids for paths (None stays None); new paths are written before returning
+    def encode(self, paths):
+        with self._lock:
+            known = self._known(p for p in paths if p is not None)
+            ids = [self._intern(p, known) if p is not None else None for p in paths]
+            if self._pending:
+                if self._writer is None:
+                    self._writer = BatchWriter(self.engine, Paths.__table__,
+                                               list(Paths.__table__.columns))
+                self._writer.write(self._pending)
+                self._pending = []
+            self._remember(known)
+        return ids
+
+    def lookup(self, path_ids):
+        found = {}
+        path_ids = sorted(set(i for i in path_ids if i is not None))
+        with self.engine.connect() as conn:
+            for i in range(0, len(path_ids), 1000):
+                found.update(conn.execute(select([Paths.id, Paths.path]).where(
+                    Paths.id.in_(path_ids[i:i + 1000]))).fetchall())
+        return found
+
+    # Ids of every path below a '//depot/dir/' prefix, for use in .in_()
+    def under(self, prefix):
+        return select([Paths.id]).where(prefix_range(Paths.path, prefix))
+
+    # CheckpointLoader transform: adds the id columns (and drops the strings)
+    def transform(self, table, columns, rows):
+        pairs = [(s, i) for s, i in path_columns(table) if s in columns and i not in columns]
+        if not pairs or not rows:
+            return columns, rows
+        columns = list(columns)
+        rows = [list(r) for r in rows]
+        for string_col, id_col in pairs:
+            index = columns.index(string_col)
+            ids = self.encode([r[index] for r in rows])
+            for row, path_id in zip(rows, ids):
+                row.append(path_id)
+                if self.drop_strings:
+                    row[index] = None
+            columns.append(id_col)
+        return columns, [tuple(r) for r in rows]
+
+    # JournalTailer transform: same for dict rows of replicated records,
+    # deletes included since they go by the id keys
+    def tail_transform(self, op, table, rows):
+        for string_col, id_col in path_columns(table):
+            ids = self.encode([r.get(string_col.key) for r in rows])
+            for row, path_id in zip(rows, ids):
+                row[id_col.key] = path_id
+                if self.drop_strings and op != 'dv':
+                    row[string_col.key] = None
+        return rows
@@ -0,0 +1,249 @@
+# Compiled protections (perforce.protect) for bulk permission checks.
+#
+# Protections are compiled once per user (or group) and host into a
+# MapTable of the lines that apply to them, so checking a path only looks at
+# the lines whose literal prefix it starts with. Each matching line, in
+# table order, adds the rights its level grants or, for '-' lines, removes
+# that level and everything above it ('=' levels add or remove just one
+# right), as p4 does.
+#
+#   protections = Protections(engine)
+#   protections.check('alice', paths, 'read')   # [True, False, ...]
+#   protections.levels('alice', paths)          # ['write', None, ...]
+#
+# perm may hold the level name or, as loaded from checkpoints and journals,
+# the numeric mode db.protect stores (PERM_NUMBERS). Group membership comes
+# from perforce.group, subgroups included. Lines with
+# a specific host apply only when a matching host is passed. Compiled tables
+# are cached until protect or group change (journal_listener, or the
+# fingerprint polled by refresh()).
+import fnmatch
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+
+from sqlalchemy import func, select
+
+from perforce_mapping import UNMAP, MapTable, parse_flag
+from perforce_model import Group, Protect
+
+log = logging.getLogger(__name__)
+
+LIST, READ, OPEN, WRITE, BRANCH, REVIEW, ADMIN, SUPER = (1 << i for i in range(8))
+
+# Rights granted by each level
+GRANTS = {
+    'list': LIST,
+    'read': LIST | READ,
+    'open': LIST | READ | OPEN,
+    'write': LIST | READ | OPEN | WRITE | BRANCH,
+    'review': LIST | READ | REVIEW,
+    'admin': LIST | READ | OPEN | WRITE | BRANCH | REVIEW | ADMIN,
+    'super': LIST | READ | OPEN | WRITE | BRANCH | REVIEW | ADMIN | SUPER,
+    '=read': READ,
+    '=open': OPEN,
+    '=write': WRITE,
+    '=branch': BRANCH,
+}
+
+# Rights taken away by an exclusion at each level: that level and above
+REMOVES = {
+    'list': ~0,
+    'read': READ | OPEN | WRITE | BRANCH | REVIEW | ADMIN | SUPER,
+    'open': OPEN | WRITE | BRANCH | ADMIN | SUPER,
+    'write': WRITE | BRANCH | ADMIN | SUPER,
+    'review': REVIEW | ADMIN | SUPER,
+    'admin': ADMIN | SUPER,
+    'super': SUPER,
+    '=read': READ,
+    '=open': OPEN,
+    '=write': WRITE,
+    '=branch': BRANCH,
+}
+
+# Numeric modes db.protect stores for each level: the cumulative bits 0x01
+# list, 0x02 read, 0x04 open, 0x08 write, 0x10 admin, 0x20 super and 0x40
+# review ('=' levels carry their single bit, =branch 0x80)
+PERM_NUMBERS = {1: 'list', 3: 'read', 7: 'open', 15: 'write', 31: 'admin', 63: 'super',
+                67: 'review', 2: '=read', 4: '=open', 8: '=write', 128: '=branch'}
+_PERMS = dict((level, level) for level in GRANTS)
+for _number, _level in PERM_NUMBERS.items():
+    # perm is a string column, so loaded modes may come back as '15'
+    _PERMS[_number] = _PERMS[str(_number)] = _level
+del _number, _level
+
+# Levels reported by levels(), highest first
+LEVELS = ('super', 'admin', 'write', 'open', 'review', 'read', 'list')
+
+# db.group membership types
+MEMBER, SUBGROUP, OWNER = '0', '1', '2'
+
+
+_Line = namedtuple('_Line', 'isGroup user host perm mapFlag depotFile')
+
+
+# The level name for a perm column value, None if it is not one
+def perm_level(perm):
+    try:
+        return _PERMS.get(perm)
+    except TypeError:
+        return None
+
+
+def level_of(rights):
+    for level in LEVELS:
+        if rights & GRANTS[level] == GRANTS[level]:
+            return level
+    return None
+
+
+class CompiledProtections(object):
+    def __init__(self, lines):
+        # lines: (flag, perm, depotFile) already filtered to one user/host
+        self.rights = []
+        table_lines = []
+        for flag, perm, depot_file in lines:
+            flag, depot_file = parse_flag(flag, depot_file)
+            table_lines.append((flag, depot_file, None))
+            self.rights.append(REMOVES[perm] if flag == UNMAP else GRANTS[perm])
+        self.table = MapTable(table_lines)
+
+    def rights_for(self, path):
+        rights = 0
+        for line in self.table.matching(path):
+            if line.flag == UNMAP:
+                rights &= ~self.rights[line.seq]
+            else:
+                rights |= self.rights[line.seq]
+        return rights
+
+    def check(self, paths, perm):
+        need = GRANTS[perm]
+        return [self.rights_for(p) & need == need for p in paths]
+
+    def levels(self, paths):
+        return [level_of(self.rights_for(p)) for p in paths]
+
+
+class Protections(object):
+    def __init__(self, engine, maxsize=1000):
+        self.engine = engine
+        self.maxsize = maxsize
+        self._compiled = OrderedDict()
+        self._lock = threading.Lock()
+        self._rows = None
+        self._groups = None
+        self._fingerprint = None
+        self._generation = 0
+
+    # Load protect and group; returns (rows, groups) so callers keep their
+    # own references while invalidate() may reset the shared ones
+    def _load(self):
+        with self.engine.connect() as conn:
+            rows = conn.execute(select([
+                Protect.isGroup, Protect.user, Protect.host, Protect.perm,
+                Protect.mapFlag, Protect.depotFile]).order_by(Protect.seq)).fetchall()
+            members = conn.execute(select([Group.user, Group.group, Group.type])).fetchall()
+            self._fingerprint = self.fingerprint(conn)
+        unknown = set(r.perm for r in rows if perm_level(r.perm) is None)
+        if unknown:
+            log.warning('ignoring protections with unknown levels: %s', ', '.join(sorted(
+                str(u) for u in unknown)))
+        lines = [_Line(r.isGroup, r.user, r.host, perm_level(r.perm), r.mapFlag, r.depotFile)
+                 for r in rows if perm_level(r.perm) is not None]
+        users, parents = {}, {}
+        for user, group, type_ in members:
+            type_ = str(type_) if type_ is not None else MEMBER
+            if type_ == MEMBER:
+                users.setdefault(user, set()).add(group)
+            elif type_ == SUBGROUP:
+                parents.setdefault(user, set()).add(group)
+        with self._lock:
+            self._rows, self._groups = lines, (users, parents)
+        return lines, (users, parents)
+
+    def _state(self):
+        with self._lock:
+            rows, groups = self._rows, self._groups
+        if rows is None or groups is None:
+            rows, groups = self._load()
+        return rows, groups
+
+    def groups_of(self, user=None, group=None, groups=None):
+        users, parents = groups if groups is not None else self._state()[1]
+        found = set(users.get(user, ())) if user is not None else set()
+        if group is not None:
+            found.add(group)
+        todo = list(found)
+        while todo:
+            for parent in parents.get(todo.pop(), ()):
+                if parent not in found:
+                    found.add(parent)
+                    todo.append(parent)
+        return found
+
+    def compile(self, user=None, host=None, group=None):
+        key = (user, host, group)
+        with self._lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+            generation = self._generation
+        rows, groups = self._state()
+        groups = self.groups_of(user, group, groups)
+        lines = []
+        for row in rows:
+            if row.isGroup:
+                if row.user != '*' and row.user not in groups:
+                    continue
+            elif not fnmatch.fnmatchcase(user or '', row.user):
+                continue
+            if row.host not in (None, '', '*') and (
+                    host is None or not fnmatch.fnmatchcase(host, row.host)):
+                continue
+            lines.append((row.mapFlag, row.perm, row.depotFile))
+        compiled = CompiledProtections(lines)
+        with self._lock:
+            # Don't cache tables compiled from rows an invalidate() dropped
+            if generation != self._generation:
+                return compiled
+            self._compiled[key] = compiled
+            while len(self._compiled) > self.maxsize:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def check(self, user, paths, perm='read', host=None):
+        return self.compile(user, host).check(paths, perm)
+
+    def levels(self, user, paths, host=None):
+        return self.compile(user, host).levels(paths)
+
+    def check_group(self, group, paths, perm='read', host=None):
+        return self.compile(None, host, group).check(paths, perm)
+
+    def invalidate(self):
+        with self._lock:
+            self._compiled.clear()
+            self._rows = self._groups = None
+            self._generation += 1
+
+    # Listener for JournalTailer
+    def journal_listener(self, op, table, rows):
+        if table.name in ('protect', 'group'):
+            self.invalidate()
+
+    @staticmethod
+    def fingerprint(conn):
+        return (tuple(conn.execute(select([func.count(), func.max(Protect.update)])).first()),
+                tuple(conn.execute(select([func.count(), func.sum(
+                    func.length(Group.user) + 7 * func.length(Group.group))])).first()))
+
+    # Drop the compiled tables if protect or group changed; True if they did
+    def refresh(self):
+        with self.engine.connect() as conn:
+            current = self.fingerprint(conn)
+        if self._fingerprint is not None and current != self._fingerprint:
+            self.invalidate()
+            return True
+        return False
@@ -0,0 +1,201 @@
+# Journal-tail replication into the perforce schema.
+#
+# JournalTailer follows the live P4D journal, applies @pv@/@rv@ (upsert) and
+# @dv@ (delete) records to the matching model tables in batched transactions,
+# and stores its own position in perforce.jnlack (appliedJnl/appliedPos) in
+# the same transaction, so a restart resumes exactly after the last applied
+# record. Rotated journals ('<journal>.<jnl>' by default) are finished first.
+#
+# Derived tables kept from the replicated records (perforce.headrev) hook in
+# with add_writer(): a writer runs inside the batch transaction, right after
+# each run of records, so its rows commit or roll back with the records and
+# the position. Listeners run after the commit and suit in-memory state
+# (caches, indexes) that is rebuilt on restart anyway.
+import logging
+import os
+import time
+
+from perforce_journal import RecordParser, converter_for, table_for
+from perforce_model import Jnlack
+from perforce_sql import delete, upsert
+from perforce_tail import FileFollower
+
+log = logging.getLogger(__name__)
+
+
+class JournalTailer(object):
+    def __init__(self, engine, path, server_id='mirror', journal=0,
+                 rotated='{path}.{jnl}', batch_size=1000, poll_interval=0.5,
+                 server_type='mirror', encoding='utf-8'):
+        self.engine = engine
+        self.path = path
+        self.server_id = server_id
+        self.server_type = server_type
+        self.rotated = rotated
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.encoding = encoding
+        self.listeners = []
+        self.writers = []
+        self.transforms = []
+        self.applied = 0
+        self.jnl, self.pos = self._load_position(journal)
+        self._batch = []
+        self._committed = (self.jnl, self.pos)
+        self._parser = None
+        self._follower = None
+
+    # listener(op, table, rows) is called after each commit with the rows
+    # (dicts) of every run of same-op/same-table records, in journal order.
+    # op is 'pv' for inserts and replaces, 'dv' for deletes.
+    def add_listener(self, fn):
+        self.listeners.append(fn)
+
+    # writer(conn, op, table, rows) is called in the batch transaction after
+    # each run is written; an exception rolls the whole batch back
+    def add_writer(self, fn):
+        self.writers.append(fn)
+
+    # fn(op, table, rows) -> rows, applied to each run before it is written
+    def add_transform(self, fn):
+        self.transforms.append(fn)
+
+    def _load_position(self, journal):
+        with self.engine.connect() as conn:
+            row = conn.execute(Jnlack.__table__.select().where(
+                Jnlack.serverId == self.server_id)).first()
+        if row is None or row.appliedJnl is None:
+            return journal, 0
+        return row.appliedJnl, row.appliedPos or 0
+
+    def _rotated_path(self, jnl):
+        return self.rotated.format(path=self.path, jnl=jnl)
+
+    # Apply every complete record available now; returns the number applied
+    def poll(self):
+        before = self.applied
+        while os.path.exists(self._rotated_path(self.jnl)):
+            if self._follower is None or self._follower.path != self._rotated_path(self.jnl):
+                if self._follower is not None:
+                    self._follower.close()
+                self._open(self._rotated_path(self.jnl), self.pos)
+            for raw in self._follower.lines():
+                self._feed(raw)
+            self._flush()
+            self._follower.close()
+            self._follower = None
+            self._next_journal()
+        if self._follower is None:
+            self._open(self.path, self.pos)
+        for raw in self._follower.lines(on_rotate=self._rotate):
+            self._feed(raw)
+        self._flush()
+        return self.applied - before
+
+    def run(self, stop=None):
+        while stop is None or not stop():
+            if not self.poll():
+                time.sleep(self.poll_interval)
+
+    def _open(self, path, pos):
+        self._follower = FileFollower(path, pos)
+        self._parser = RecordParser(pos, self.encoding)
+
+    def _next_journal(self):
+        self.jnl += 1
+        self.pos = 0
+        self._parser = RecordParser(0, self.encoding)
+
+    def _rotate(self):
+        self._flush()
+        self._next_journal()
+        log.info('journal rotated, now at %d', self.jnl)
+
+    def _feed(self, raw):
+        record = self._parser.feed(raw)
+        if record is None:
+            return
+        self.pos = record.offset
+        if record.op in ('pv', 'rv', 'dv'):
+            table = table_for(record.table)
+            if table is not None:
+                conv = converter_for(table)
+                self._batch.append((record.op, table, conv.as_dict(conv(record.values))))
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _runs(self):
+        run = None
+        for op, table, row in self._batch:
+            kind = 'dv' if op == 'dv' else 'pv'
+            if run is None or run[0] != kind or run[1] is not table:
+                if run is not None:
+                    yield run
+                run = (kind, table, [])
+            run[2].append(row)
+        if run is not None:
+            yield run
+
+    def _flush(self):
+        if not self._batch and self._committed == (self.jnl, self.pos):
+            return
+        runs = list(self._runs())
+        for transform in self.transforms:
+            runs = [(kind, table, transform(kind, table, rows)) for kind, table, rows in runs]
+        with self.engine.begin() as conn:
+            for kind, table, rows in runs:
+                if kind == 'dv':
+                    delete(conn, table, rows)
+                else:
+                    upsert(conn, table, rows)
+                for writer in self.writers:
+                    writer(conn, kind, table, rows)
+            upsert(conn, Jnlack.__table__, [{
+                'serverId': self.server_id,
+                'lastUpdate': int(time.time()),
+                'serverType': self.server_type,
+                'persistedJnl': self.jnl,
+                'appliedJnl': self.jnl,
+                'persistedPos': self.pos,
+                'appliedPos': self.pos,
+                'jcflags': None,
+                'isAlive': 1,
+                'serverOptions': None,
+                'failoverSeen': None,
+            }])
+        self.applied += len(self._batch)
+        self._batch = []
+        self._committed = (self.jnl, self.pos)
+        for kind, table, rows in runs:
+            for listener in self.listeners:
+                listener(kind, table, rows)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from perforce_model import create_engine, use_path_ids
+
+    parser = argparse.ArgumentParser(description='Replicate a live P4D journal')
+    parser.add_argument('url')
+    parser.add_argument('journal')
+    parser.add_argument('--server-id', default='mirror')
+    parser.add_argument('--jnl', type=int, default=0, help='journal number of a fresh start')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--paths', action='store_true', help='path-dictionary mode')
+    parser.add_argument('--headrev', action='store_true', help='maintain perforce.headrev')
+    args = parser.parse_args()
+    if args.paths:
+        use_path_ids()
+
+    logging.basicConfig(level=logging.INFO)
+    engine = create_engine(args.url)
+    tailer = JournalTailer(engine, args.journal, server_id=args.server_id,
+                           journal=args.jnl, batch_size=args.batch_size)
+    if args.paths:
+        from perforce_paths import PathDictionary
+        tailer.add_transform(PathDictionary(engine).tail_transform)
+    if args.headrev:
+        from perforce_headrev import HeadRevIndex
+        tailer.add_writer(HeadRevIndex(engine).journal_writer)
+    tailer.run()
@@ -0,0 +1,187 @@
+# Pre-aggregated command cubes (perforce.command_rollup) and a query router.
+#
+#   cubes = CommandRollup(engine)
+#   cubes.refresh()                              # after each ingest batch
+#   cubes.query(since, until, group_by=('user_name', 'func'), host='build01')
+#
+# Three levels are kept per func/user/host/serverid/client: minutes built
+# from command_events (left joined to command_change for the correlated
+# file and byte counts), hours from minutes and days from hours. refresh()
+# re-aggregates each level from its last bucket minus `lateness` seconds, so
+# commands flushed late by the ingester are picked up; older stragglers need
+# rebuild(since). Buckets are epoch-aligned, i.e. UTC days.
+#
+# query() splits [since, until) into the largest aligned pieces: whole days
+# from the day cube, the hours at either edge from the hour cube and the
+# remaining minutes from the minute cube, then sums the pieces in one
+# statement. Edges that fall inside a minute are widened to whole minutes.
+from collections import OrderedDict
+
+from sqlalchemy import and_, case, func, literal_column, or_, select
+
+from perforce_log_model import CommandChange, CommandEvents
+from perforce_log_model import CommandRollup as Rollup
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+GRAINS = (DAY, HOUR, MINUTE)
+DIMENSIONS = ('func', 'user_name', 'host', 'serverid', 'client')
+MEASURES = ('commands', 'completed', 'lapse_count', 'lapse_sum_ms', 'errors', 'files', 'bytes')
+
+
+def _floor(ts, grain):
+    return ts - ts % grain
+
+
+def _ceil(ts, grain):
+    return -(-ts // grain) * grain
+
+
+# [(grain, lo, hi)] covering [since, until) with the coarsest aligned pieces
+def plan(since, until, grains=GRAINS):
+    if since >= until:
+        return []
+    grain, finer = grains[0], grains[1:]
+    if not finer:
+        return [(grain, _floor(since, grain), _ceil(until, grain))]
+    lo, hi = _ceil(since, grain), _floor(until, grain)
+    if lo >= hi:
+        return plan(since, until, finer)
+    return plan(since, lo, finer) + [(grain, lo, hi)] + plan(hi, until, finer)
+
+
+class CommandRollup(object):
+    def __init__(self, engine, lateness=3600):
+        self.engine = engine
+        self.lateness = lateness
+
+    def _errors(self, dialect):
+        length = func.jsonb_array_length if dialect.name == 'postgresql' else func.json_array_length
+        return func.coalesce(length(CommandEvents.__table__.c.error_events), 0)
+
+    def _minutes(self, conn, since):
+        events, changes = CommandEvents.__table__, CommandChange.__table__
+        ts = events.c.command_start_timestamp
+        bucket = _floor(ts, MINUTE)
+        dims = [func.coalesce(events.c[d], '') for d in DIMENSIONS]
+        stmt = select([literal_column(str(MINUTE)), bucket] + dims + [
+            func.count(),
+            func.sum(case([(events.c.is_complete, 1)], else_=0)),
+            func.count(events.c.lapse_ms),
+            func.coalesce(func.sum(events.c.lapse_ms), 0),
+            func.sum(self._errors(conn.dialect)),
+            func.coalesce(func.sum(changes.c.file_count), 0),
+            func.coalesce(func.sum(changes.c.total_bytes), 0),
+        ]).select_from(events.outerjoin(changes, changes.c.cmdident == events.c.cmdident)).where(
+            ts.isnot(None)).group_by(bucket, *dims)
+        if since is not None:
+            stmt = stmt.where(ts >= since)
+        self._replace(conn, MINUTE, since, stmt)
+
+    def _roll(self, conn, fine, coarse, since):
+        table = Rollup.__table__
+        bucket = _floor(table.c.bucket, coarse)
+        dims = [table.c[d] for d in DIMENSIONS]
+        stmt = select([literal_column(str(coarse)), bucket] + dims +
+                      [func.sum(table.c[m]) for m in MEASURES]).where(
+            table.c.grain == fine).group_by(bucket, *dims)
+        if since is not None:
+            stmt = stmt.where(table.c.bucket >= since)
+        self._replace(conn, coarse, since, stmt)
+
+    def _replace(self, conn, grain, since, stmt):
+        table = Rollup.__table__
+        where = table.c.grain == grain
+        if since is not None:
+            where = and_(where, table.c.bucket >= since)
+        conn.execute(table.delete().where(where))
+        conn.execute(table.insert().from_select(
+            ['grain', 'bucket'] + list(DIMENSIONS) + list(MEASURES), stmt))
+
+    # Rebuild every level from since (epoch seconds; None for everything)
+    def rebuild(self, since=None):
+        with self.engine.begin() as conn:
+            self._rebuild(conn, since)
+
+    def _rebuild(self, conn, since):
+        if since is not None:
+            since = _floor(since, MINUTE)
+        self._minutes(conn, since)
+        self._roll(conn, MINUTE, HOUR, _floor(since, HOUR) if since is not None else None)
+        self._roll(conn, HOUR, DAY, _floor(since, DAY) if since is not None else None)
+
+    # Re-aggregate the tail of each level; returns the minute it started from
+    def refresh(self):
+        with self.engine.begin() as conn:
+            last = conn.scalar(select([func.max(Rollup.bucket)]).where(Rollup.grain == MINUTE))
+            since = last - self.lateness if last is not None else None
+            self._rebuild(conn, since)
+        return since
+
+    # Rows of group_by values and measures over [since, until). With 'bucket'
+    # in group_by the series comes from the `grain` cube (hourly by default).
+    def query(self, since, until, group_by=(), grain=None, **filters):
+        table = Rollup.__table__
+        group_by = tuple(group_by)
+        for name in group_by + tuple(filters):
+            if name != 'bucket' and name not in DIMENSIONS:
+                raise ValueError('unknown dimension %r' % name)
+        if 'bucket' in group_by or grain is not None:
+            grain = grain or HOUR
+            pieces = [(grain, _floor(since, grain), _ceil(until, grain))]
+        else:
+            pieces = plan(since, until)
+        if not pieces:
+            return []
+        where = [or_(*[and_(table.c.grain == g, table.c.bucket >= lo, table.c.bucket < hi)
+                       for g, lo, hi in pieces])]
+        for name, value in filters.items():
+            where.append(table.c[name] == (value or ''))
+        columns = [table.c[name] for name in group_by]
+        stmt = select(columns + [func.sum(table.c[m]).label(m) for m in MEASURES]).where(
+            and_(*where))
+        if columns:
+            stmt = stmt.group_by(*columns).order_by(*columns)
+        found = []
+        with self.engine.connect() as conn:
+            for row in conn.execute(stmt):
+                if not row['commands']:
+                    continue
+                out = OrderedDict((k, row[k]) for k in group_by)
+                for m in MEASURES:
+                    out[m] = row[m] or 0
+                out['avg_lapse_ms'] = (round(out['lapse_sum_ms'] / float(out['lapse_count']), 1)
+                                       if out['lapse_count'] else None)
+                found.append(out)
+        return found
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import time
+
+    from perforce_model import create_engine
+
+    parser = argparse.ArgumentParser(description='Maintain and query the command rollup cubes')
+    parser.add_argument('url')
+    parser.add_argument('--since', type=int, help='epoch seconds (default: a day ago)')
+    parser.add_argument('--until', type=int, help='epoch seconds (default: now)')
+    parser.add_argument('--group-by', default='', help='comma separated: bucket, ' +
+                        ', '.join(DIMENSIONS))
+    parser.add_argument('--grain', type=int, choices=GRAINS)
+    parser.add_argument('--refresh', action='store_true', help='refresh the cubes first')
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the cubes from --since')
+    for name in DIMENSIONS:
+        parser.add_argument('--' + name.replace('_', '-'), dest=name)
+    args = parser.parse_args()
+
+    cubes = CommandRollup(create_engine(args.url))
+    if args.rebuild:
+        cubes.rebuild(args.since)
+    elif args.refresh:
+        cubes.refresh()
+    until = args.until or int(time.time())
+    since = args.since if args.since is not None else until - DAY
+    filters = dict((d, getattr(args, d)) for d in DIMENSIONS if getattr(args, d) is not None)
+    group_by = [g.strip() for g in args.group_by.split(',') if g.strip()]
+    print(json.dumps(cubes.query(since, until, group_by, args.grain, **filters), indent=2))
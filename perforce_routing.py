@@ -0,0 +1,327 @@
+# Read-replica routing for ORM sessions on the mirror.
+#
+#   router = Router(primary, {'replica1': replica_engine}, max_lag_seconds=5)
+#   session = router.session()
+#   session.query(Rev).filter(Rev.change == 1234).all()     # a replica in bounds
+#   session.add(obj); session.commit()                      # the primary; pinned after
+#   router.metrics()
+#
+# JournalTailer stores the journal position it has applied in perforce.jnlack
+# (serverId 'mirror' by default), in the same transaction as the records. A
+# database replica holds that row as of its own replay, so comparing the row
+# on the primary with the row on a replica gives the replica's lag in journal
+# bytes (appliedJnl/appliedPos) and seconds (lastUpdate). A replica serves
+# reads only while it is within both bounds; one that is a journal rotation
+# behind, has no row or cannot be reached is skipped until the next check.
+# Checks run at most every check_interval seconds, on whichever thread next
+# needs a route.
+#
+# RoutingSession sends flushes, Core insert/update/delete, textual SQL other
+# than a plain SELECT, SELECT ... FOR UPDATE and explicit connection() calls
+# to the primary. After its first write a session stays on the primary until
+# close(), so it reads its own writes. Other reads go to one healthy replica
+# per session (chosen in turn) or to the primary when none is healthy.
+#
+# Every statement on a routed engine is timed per route (the primary and each
+# replica by name) into a DDSketch, as in perforce_latency; metrics() returns
+# counts, errors, mean and p50/p95/p99 per route with the routing decisions
+# and the last lag seen on each replica. Engines shared with other code are
+# timed for all their statements; pass URLs to give the router its own.
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+from perforce_latency import DDSketch
+from perforce_model import Jnlack, create_engine
+
+log = logging.getLogger(__name__)
+
+PRIMARY = 'primary'
+QUANTILES = (0.5, 0.95, 0.99)
+
+# execution option that keeps the lag checks out of the route timings
+_CHECK = 'routing_check'
+
+
+def _engine(bind):
+    return create_engine(bind) if isinstance(bind, str) else bind
+
+
+# True when a statement may write and so has to run on the primary
+def _writes(clause):
+    if clause is None or isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().lower().startswith('select')
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+class _RouteStats(object):
+    def __init__(self):
+        self.reset()
+
+    # in place: the engine listeners hold on to this object
+    def reset(self):
+        self.statements = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.sketch = DDSketch()
+
+    def add(self, ms):
+        self.statements += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.sketch.add(ms)
+
+    def summary(self):
+        out = OrderedDict([('statements', self.statements), ('errors', self.errors),
+                           ('mean_ms', round(self.total_ms / self.statements, 2)
+                            if self.statements else None)])
+        for q in QUANTILES:
+            value = self.sketch.quantile(q)
+            out['p%g_ms' % (q * 100)] = (round(min(value, self.max_ms), 2)
+                                         if value is not None else None)
+        out['max_ms'] = round(self.max_ms, 2) if self.statements else None
+        return out
+
+
+class Replica(object):
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.healthy = False
+        self.lag_bytes = None
+        self.lag_seconds = None
+        self.checked = None
+        self.error = None
+
+    def state(self):
+        return OrderedDict([('healthy', self.healthy), ('lag_bytes', self.lag_bytes),
+                            ('lag_seconds', self.lag_seconds), ('checked', self.checked),
+                            ('error', self.error)])
+
+
+class Router(object):
+    def __init__(self, primary, replicas=(), server_id='mirror', max_lag_bytes=1 << 20,
+                 max_lag_seconds=5, check_interval=2.0):
+        self.primary = _engine(primary)
+        if isinstance(replicas, dict):
+            replicas = sorted(replicas.items())
+        else:
+            replicas = [('replica%d' % (i + 1), r) for i, r in enumerate(replicas)]
+        self.replicas = [Replica(name, _engine(bind)) for name, bind in replicas]
+        self.server_id = server_id
+        self.max_lag_bytes = max_lag_bytes
+        self.max_lag_seconds = max_lag_seconds
+        self.check_interval = check_interval
+        self.decisions = OrderedDict((k, 0) for k in ('replica', 'primary_write', 'primary_pinned',
+                                                      'primary_fallback'))
+        self._stats = OrderedDict()
+        self._lock = threading.Lock()
+        self._checking = threading.Lock()
+        self._next_check = 0
+        self._turn = itertools.count()
+        self._instrument(PRIMARY, self.primary)
+        for replica in self.replicas:
+            self._instrument(replica.name, replica.engine)
+
+    def _instrument(self, name, engine):
+        stats = self._stats[name] = _RouteStats()
+        lock = self._lock
+
+        def timed(context):
+            return context is None or not context.execution_options.get(_CHECK)
+
+        @event.listens_for(engine, 'before_cursor_execute')
+        def before(conn, cursor, statement, parameters, context, executemany):
+            if timed(context):
+                conn.info.setdefault('routing_started', []).append(time.perf_counter())
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def after(conn, cursor, statement, parameters, context, executemany):
+            if timed(context):
+                ms = (time.perf_counter() - conn.info['routing_started'].pop()) * 1000
+                with lock:
+                    stats.add(ms)
+
+        @event.listens_for(engine, 'handle_error')
+        def failed(exception_context):
+            conn = exception_context.connection
+            if conn is None or not timed(exception_context.execution_context):
+                return
+            started = conn.info.get('routing_started')
+            if started:
+                started.pop()
+                with lock:
+                    stats.errors += 1
+
+    def _position(self, engine):
+        with engine.connect() as conn:
+            return conn.execution_options(**{_CHECK: True}).execute(
+                select([Jnlack.appliedJnl, Jnlack.appliedPos, Jnlack.lastUpdate]).where(
+                    Jnlack.serverId == self.server_id)).first()
+
+    # (healthy, lag_bytes, lag_seconds, error) of a replica against the
+    # primary position
+    def _evaluate(self, replica, primary):
+        try:
+            row = self._position(replica.engine)
+        except Exception as e:
+            log.warning('replica %s unavailable: %s', replica.name, e)
+            return False, None, None, str(e)
+        if primary is None or row is None or row.appliedJnl is None:
+            return False, None, None, 'no %s position in jnlack' % self.server_id
+        lag_bytes = lag_seconds = None
+        if row.appliedJnl == primary.appliedJnl:
+            lag_bytes = max(0, (primary.appliedPos or 0) - (row.appliedPos or 0))
+        elif row.appliedJnl > primary.appliedJnl:
+            lag_bytes = 0
+        if primary.lastUpdate is not None and row.lastUpdate is not None:
+            lag_seconds = max(0, primary.lastUpdate - row.lastUpdate)
+        healthy = (
+            (self.max_lag_bytes is None or (lag_bytes is not None and
+                                            lag_bytes <= self.max_lag_bytes)) and
+            (self.max_lag_seconds is None or (lag_seconds is not None and
+                                              lag_seconds <= self.max_lag_seconds)))
+        return healthy, lag_bytes, lag_seconds, None
+
+    # Re-read the applied positions and mark each replica in or out of bounds
+    def check(self):
+        now = time.time()
+        try:
+            primary = self._position(self.primary)
+        except Exception as e:
+            log.warning('cannot read the primary position: %s', e)
+            primary = None
+        for replica in self.replicas:
+            # routing threads read these while we check, so a replica keeps
+            # its previous state until the new one is assigned at once
+            healthy, lag_bytes, lag_seconds, error = self._evaluate(replica, primary)
+            (replica.healthy, replica.lag_bytes, replica.lag_seconds, replica.error,
+             replica.checked) = healthy, lag_bytes, lag_seconds, error, now
+        self._next_check = time.time() + self.check_interval
+        return [r.name for r in self.replicas if r.healthy]
+
+    def _refresh(self):
+        # one thread checks; the others route on the previous result meanwhile
+        if time.time() >= self._next_check and self._checking.acquire(False):
+            try:
+                self.check()
+            finally:
+                self._checking.release()
+
+    def _count(self, decision):
+        with self._lock:
+            self.decisions[decision] += 1
+
+    # Next healthy replica in turn, or None
+    def replica(self):
+        self._refresh()
+        healthy = [r for r in self.replicas if r.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._turn) % len(healthy)]
+
+    def route(self, session, clause):
+        if session._flushing or _writes(clause):
+            session._pinned = True
+            self._count('primary_write')
+            return self.primary
+        if session._pinned:
+            self._count('primary_pinned')
+            return self.primary
+        replica = session._replica
+        if replica is None or not replica.healthy:
+            self._refresh()
+            replica = session._replica = self.replica()
+        if replica is None:
+            self._count('primary_fallback')
+            return self.primary
+        self._count('replica')
+        return replica.engine
+
+    def session(self, **kwargs):
+        return RoutingSession(router=self, **kwargs)
+
+    def sessionmaker(self, **kwargs):
+        return sessionmaker(class_=RoutingSession, router=self, **kwargs)
+
+    def metrics(self, reset=False):
+        with self._lock:
+            out = OrderedDict([
+                ('routes', OrderedDict((name, stats.summary())
+                                       for name, stats in self._stats.items())),
+                ('decisions', OrderedDict(self.decisions)),
+                ('replicas', OrderedDict((r.name, r.state()) for r in self.replicas)),
+            ])
+            if reset:
+                for stats in self._stats.values():
+                    stats.reset()
+                for key in self.decisions:
+                    self.decisions[key] = 0
+        return out
+
+
+class RoutingSession(Session):
+    def __init__(self, router=None, **kwargs):
+        if router is None:
+            raise TypeError('RoutingSession needs a router')
+        kwargs.setdefault('bind', router.primary)
+        super(RoutingSession, self).__init__(**kwargs)
+        self.router = router
+        self._pinned = False
+        self._replica = None
+
+    def get_bind(self, mapper=None, clause=None):
+        return self.router.route(self, clause)
+
+    # Send everything after this to the primary, e.g. before reading data
+    # another session has just written
+    def use_primary(self):
+        self._pinned = True
+
+    def close(self):
+        super(RoutingSession, self).close()
+        self._pinned = False
+        self._replica = None
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import random
+
+    from sqlalchemy import func
+
+    from perforce_model import Change
+
+    parser = argparse.ArgumentParser(description='Route change lookups across read replicas')
+    parser.add_argument('primary')
+    parser.add_argument('replicas', nargs='*', help='URL or name=URL')
+    parser.add_argument('--server-id', default='mirror')
+    parser.add_argument('--max-lag-bytes', type=int, default=1 << 20)
+    parser.add_argument('--max-lag-seconds', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    replicas = OrderedDict()
+    for i, spec in enumerate(args.replicas):
+        name, _, url = spec.partition('=') if '=' in spec.split('://', 1)[0] else ('', '', spec)
+        replicas[name or 'replica%d' % (i + 1)] = url
+    router = Router(args.primary, replicas, server_id=args.server_id,
+                    max_lag_bytes=args.max_lag_bytes, max_lag_seconds=args.max_lag_seconds)
+    session = router.session()
+    top = session.query(func.max(Change.change)).scalar() or 0
+    for _ in range(args.requests):
+        session.query(Change).filter(Change.change == random.randint(1, max(top, 1))).first()
+        session.expunge_all()
+    session.close()
+    print(json.dumps(router.metrics(), indent=2, default=str))
@@ -0,0 +1,142 @@
+# Keyset-paginated scans over the large tables (rev, have, label, integed, ...).
+#
+#   scan = KeysetScan(engine, Rev, columns=('depotFile', 'depotRev', 'digest'))
+#   for depot_file, depot_rev, digest in scan:
+#       ...
+#   scan.last_key                       # ['//depot/x.c', 4]: pass as after= to resume
+#
+# Rows are read in primary key order, a page at a time, each page starting
+# after the last key of the one before (WHERE (k1, k2) > (:k1, :k2) ORDER BY
+# k1, k2 LIMIT n), so a pass never uses OFFSET and every page is an index
+# range scan. On PostgreSQL a page streams through a server-side cursor;
+# elsewhere it is fetched whole and the cursor closed before rows are handed
+# out, so the caller can write to the database (SQLite would otherwise lock).
+# Memory stays at one page whatever the table size.
+#
+# Rows come back as plain tuples in the requested column order, in lists of
+# batch_size (batches()), or as pyarrow RecordBatches (record_batches(),
+# typed as in perforce_export).
+from sqlalchemy import and_, select, tuple_
+
+from perforce_export import arrow_type, arrow_values
+
+
+class KeysetScan(object):
+    def __init__(self, engine, model, columns=None, where=None, key=None, batch_size=10000,
+                 page_batches=10, after=None):
+        self.engine = engine
+        self.table = getattr(model, '__table__', model)
+        table = self.table
+        self.columns = [table.c[c] if isinstance(c, str) else c
+                        for c in (columns or table.columns)]
+        # the key must be unique; the primary key unless told otherwise
+        self.key = [table.c[c] if isinstance(c, str) else c
+                    for c in (key or [c.name for c in table.primary_key.columns])]
+        self.where = where
+        self.batch_size = batch_size
+        self.page_size = batch_size * page_batches
+        self.last_key = list(after) if after is not None else None
+        self.rows = 0
+        selected = list(self.columns)
+        for column in self.key:
+            if column not in selected:
+                selected.append(column)
+        self._selected = selected
+        self._key_index = [selected.index(c) for c in self.key]
+        self._width = len(self.columns)
+
+    def _statement(self):
+        stmt = select(self._selected).order_by(*self.key).limit(self.page_size)
+        where = [self.where] if self.where is not None else []
+        if self.last_key is not None:
+            where.append(tuple_(*self.key) > tuple_(*self.last_key))
+        return stmt.where(and_(*where)) if where else stmt
+
+    def _pages(self):
+        streaming = self.engine.dialect.name == 'postgresql'
+        while True:
+            count = 0
+            with self.engine.connect() as conn:
+                if streaming:
+                    result = conn.execution_options(stream_results=True).execute(
+                        self._statement())
+                    while True:
+                        rows = result.fetchmany(self.batch_size)
+                        if not rows:
+                            break
+                        count += len(rows)
+                        yield rows
+                else:
+                    rows = conn.execute(self._statement()).fetchall()
+            if not streaming:
+                for i in range(0, len(rows), self.batch_size):
+                    yield rows[i:i + self.batch_size]
+                count = len(rows)
+            if count < self.page_size:
+                return
+
+    # Lists of up to batch_size tuples; last_key follows each batch handed out
+    def batches(self):
+        width = self._width
+        key_index = self._key_index
+        for rows in self._pages():
+            batch = [tuple(row)[:width] for row in rows]
+            last = rows[-1]
+            self.last_key = [last[i] for i in key_index]
+            self.rows += len(batch)
+            yield batch
+
+    def __iter__(self):
+        for batch in self.batches():
+            for row in batch:
+                yield row
+
+    def record_batches(self):
+        import pyarrow as pa
+
+        fields = [pa.field(c.name, arrow_type(c)) for c in self.columns]
+        schema = pa.schema(fields)
+        for batch in self.batches():
+            arrays = [pa.array(arrow_values(column, values), type=field.type)
+                      for column, values, field in zip(self.columns, zip(*batch), fields)]
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def scan(engine, model, **kwargs):
+    return KeysetScan(engine, model, **kwargs)
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import sys
+    import time
+
+    from perforce_model import create_engine
+    from perforce_model import table as model_table
+
+    parser = argparse.ArgumentParser(description='Stream a table in primary key order')
+    parser.add_argument('url')
+    parser.add_argument('table')
+    parser.add_argument('--columns', help='comma separated (default all)')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--after', help='JSON list of the key to resume after')
+    parser.add_argument('--jsonl', action='store_true', help='write the rows as JSON lines')
+    args = parser.parse_args()
+
+    table = model_table(args.table)
+    if table is None:
+        parser.error('unknown table %s' % args.table)
+    columns = args.columns.split(',') if args.columns else None
+    after = json.loads(args.after) if args.after else None
+    scanner = KeysetScan(create_engine(args.url), table, columns=columns,
+                         batch_size=args.batch_size, after=after)
+    started = time.time()
+    for batch in scanner.batches():
+        if args.jsonl:
+            for row in batch:
+                sys.stdout.write(json.dumps(row, default=str) + '\n')
+    elapsed = time.time() - started
+    sys.stderr.write('%d rows in %.2fs (%.0f rows/s), last key %s\n' % (
+        scanner.rows, elapsed, scanner.rows / elapsed if elapsed else 0,
+        json.dumps(scanner.last_key, default=str)))
@@ -0,0 +1,426 @@
+# Full-text search over changelist descriptions (perforce.desc) and job text
+# (perforce.job description plus its perforce.bodtext fields).
+#
+#   search = TextSearch(engine).update()
+#   search.changes('crash fix', user='alice', since=1700000000, limit=20)
+#   search.jobs('login timeout', status='open')
+#
+# On PostgreSQL the database does the work: create_indexes() builds GIN
+# indexes on to_tsvector(<config>, text) and queries rank with ts_rank_cd,
+# so the indexes follow every insert by themselves. Elsewhere (SQLite,
+# offline copies) an in-process posting-list index is built from the tables:
+# per word a sorted array of document ids and term counts, ranked with BM25.
+# update() adds descriptions past the highest descKey seen so far and jobs
+# touched since the last update; journal_listener() keeps it current between
+# updates. Rewritten documents are tombstoned in the main arrays and kept in
+# a small delta until the next compact(), as in perforce_integ_graph.
+#
+# Queries match all words. Filters (user, stream, date range) are applied in
+# SQL against perforce.change / perforce.job, best ranked candidates first.
+import bisect
+import math
+import pickle
+import re
+from array import array
+from collections import Counter, OrderedDict
+
+from sqlalchemy import and_, func, literal_column, or_, select
+
+from perforce_model import Bodtext, Change, Desc, Job
+
+_WORD = re.compile(r'[a-z0-9_]+')
+_CONFIG = re.compile(r'^[a-z_]+$')
+
+# the most common words of PostgreSQL's english stop list
+STOP_WORDS = frozenset((
+    'a an and are as at be but by for from had has have he her his i if in into is it its '
+    'me my no not of on or our she so that the their them then there these they this to '
+    'was we were what when which who will with you your').split())
+
+# BM25 parameters
+K1, B = 1.2, 0.75
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in STOP_WORDS]
+
+
+class PostingIndex(object):
+    def __init__(self, compact_ratio=0.1):
+        self.compact_ratio = compact_ratio
+        self.docs = {}
+        self.freqs = {}
+        self.lengths = array('I')
+        self.count = 0
+        self.total_length = 0
+        self.last = -1
+        self.removed = set()
+        self.delta = {}
+        self._delta_terms = {}
+
+    def __len__(self):
+        return self.count
+
+    def _length(self, doc):
+        return self.lengths[doc] if doc < len(self.lengths) else 0
+
+    def add(self, doc, text):
+        if self._length(doc):
+            self.remove(doc)
+        terms = Counter(tokenize(text))
+        if not terms:
+            return
+        if doc >= len(self.lengths):
+            self.lengths.extend([0] * (doc + 1 - len(self.lengths)))
+        length = sum(terms.values())
+        self.lengths[doc] = length
+        self.count += 1
+        self.total_length += length
+        if doc > self.last:
+            # ascending ids (the usual descKey order) append to the main arrays
+            for word, tf in terms.items():
+                docs = self.docs.get(word)
+                if docs is None:
+                    docs = self.docs[word] = array('q')
+                    self.freqs[word] = array('H')
+                docs.append(doc)
+                self.freqs[word].append(min(tf, 65535))
+            self.last = doc
+        else:
+            for word, tf in terms.items():
+                self.delta.setdefault(word, {})[doc] = tf
+            self._delta_terms[doc] = list(terms)
+            if len(self._delta_terms) > self.compact_ratio * max(self.count, 1000):
+                self.compact()
+
+    def remove(self, doc):
+        length = self._length(doc)
+        if not length:
+            return
+        self.lengths[doc] = 0
+        self.count -= 1
+        self.total_length -= length
+        for word in self._delta_terms.pop(doc, ()):
+            postings = self.delta[word]
+            del postings[doc]
+            if not postings:
+                del self.delta[word]
+        if doc <= self.last:
+            self.removed.add(doc)
+
+    # Fold the delta into the main arrays and drop tombstoned entries
+    def compact(self):
+        for word in set(self.docs) | set(self.delta):
+            merged = {}
+            docs, freqs = self.docs.get(word, ()), self.freqs.get(word, ())
+            for doc, tf in zip(docs, freqs):
+                if doc not in self.removed:
+                    merged[doc] = tf
+            merged.update(self.delta.get(word, {}))
+            if not merged:
+                self.docs.pop(word, None)
+                self.freqs.pop(word, None)
+                continue
+            order = sorted(merged)
+            self.docs[word] = array('q', order)
+            self.freqs[word] = array('H', (min(merged[d], 65535) for d in order))
+        self.removed.clear()
+        self.delta.clear()
+        self._delta_terms.clear()
+
+    def _postings(self, word):
+        docs, freqs = self.docs.get(word), self.freqs.get(word)
+        if docs is not None:
+            removed = self.removed
+            for doc, tf in zip(docs, freqs):
+                if doc not in removed:
+                    yield doc, tf
+        for doc, tf in self.delta.get(word, {}).items():
+            yield doc, tf
+
+    def _tf(self, word, doc):
+        tf = self.delta.get(word, {}).get(doc)
+        if tf is not None:
+            return tf
+        docs = self.docs.get(word)
+        if docs is None or doc in self.removed:
+            return None
+        i = bisect.bisect_left(docs, doc)
+        if i < len(docs) and docs[i] == doc:
+            return self.freqs[word][i]
+        return None
+
+    def _df(self, word):
+        return len(self.docs.get(word, ())) + len(self.delta.get(word, ()))
+
+    # (score, doc) of the documents holding every word of the query, unordered
+    def candidates(self, query):
+        words = sorted(set(tokenize(query)), key=self._df)
+        if not words or not self.count:
+            return
+        n = float(self.count)
+        avg = self.total_length / n
+        idf = dict((w, math.log(1 + (n - self._df(w) + 0.5) / (self._df(w) + 0.5))) for w in words)
+        first, rest = words[0], words[1:]
+        for doc, tf in self._postings(first):
+            norm = K1 * (1 - B + B * self.lengths[doc] / avg)
+            score = idf[first] * tf * (K1 + 1) / (tf + norm)
+            for word in rest:
+                other = self._tf(word, doc)
+                if other is None:
+                    break
+                score += idf[word] * other * (K1 + 1) / (other + norm)
+            else:
+                yield score, doc
+
+
+class TextSearch(object):
+    def __init__(self, engine, config='english', backend=None, chunk_size=1000):
+        if not _CONFIG.match(config):
+            raise ValueError('bad text search configuration %r' % config)
+        self.engine = engine
+        self.config = config
+        self.backend = backend or ('postgresql' if engine.dialect.name == 'postgresql'
+                                   else 'memory')
+        self.chunk_size = chunk_size
+        self.desc_index = PostingIndex()
+        self.job_index = PostingIndex()
+        self.job_ids = {}
+        self.job_names = []
+        self.last_desc_key = None
+        self.last_job_date = None
+        self._dirty_jobs = set()
+
+    # --- PostgreSQL ---------------------------------------------------------
+
+    def _vector(self, column):
+        return func.to_tsvector(literal_column("'%s'" % self.config), column)
+
+    def _query(self, text):
+        return func.plainto_tsquery(literal_column("'%s'" % self.config), text)
+
+    # GIN indexes matching the expressions the queries use
+    def create_indexes(self):
+        if self.engine.dialect.name != 'postgresql':
+            return []
+        built = []
+        with self.engine.begin() as conn:
+            for table, column in ((Desc.__table__, 'description'), (Job.__table__, 'description'),
+                                  (Bodtext.__table__, 'text')):
+                name = 'idx_%s_%s_tsv' % (table.name, column)
+                conn.execute('CREATE INDEX IF NOT EXISTS %s ON %s."%s" USING gin '
+                             "(to_tsvector('%s', \"%s\"))"
+                             % (name, table.schema, table.name, self.config, column))
+                built.append(name)
+        return built
+
+    def _sql_changes(self, query, filters, limit):
+        tsq = self._query(query)
+        vector = self._vector(Desc.description)
+        rank = func.ts_rank_cd(vector, tsq).label('score')
+        stmt = select([Change.change, Change.descKey, Change.user, Change.date, Change.stream,
+                       rank]).select_from(Desc.__table__.join(
+                           Change.__table__, Change.descKey == Desc.descKey)).where(
+            and_(vector.op('@@')(tsq), *filters)).order_by(rank.desc(), Change.change.desc())
+        with self.engine.connect() as conn:
+            return [OrderedDict(r.items()) for r in conn.execute(stmt.limit(limit))]
+
+    def _sql_jobs(self, query, filters, limit):
+        tsq = self._query(query)
+        vector = self._vector(Job.description)
+        in_fields = select([Bodtext.key]).where(self._vector(Bodtext.text).op('@@')(tsq))
+        rank = func.ts_rank_cd(vector, tsq).label('score')
+        stmt = select([Job.job, Job.xuser, Job.xdate, Job.xstatus, rank]).where(and_(
+            or_(vector.op('@@')(tsq), Job.job.in_(in_fields)), *filters)).order_by(
+            rank.desc(), Job.job)
+        with self.engine.connect() as conn:
+            return [OrderedDict(r.items()) for r in conn.execute(stmt.limit(limit))]
+
+    # --- in-process index ---------------------------------------------------
+
+    def _job_id(self, name):
+        doc = self.job_ids.get(name)
+        if doc is None:
+            doc = self.job_ids[name] = len(self.job_names)
+            self.job_names.append(name)
+        return doc
+
+    # Index descriptions past last_desc_key and jobs changed since the last run
+    def update(self):
+        if self.backend != 'memory':
+            return self
+        desc = Desc.__table__
+        with self.engine.connect() as conn:
+            while True:
+                stmt = select([desc.c.descKey, desc.c.description]).order_by(
+                    desc.c.descKey).limit(self.chunk_size * 10)
+                if self.last_desc_key is not None:
+                    stmt = stmt.where(desc.c.descKey > self.last_desc_key)
+                rows = conn.execute(stmt).fetchall()
+                for key, text in rows:
+                    self.desc_index.add(key, text)
+                if rows:
+                    self.last_desc_key = rows[-1][0]
+                if len(rows) < self.chunk_size * 10:
+                    break
+            stmt = select([Job.job, Job.xdate])
+            if self.last_job_date is not None:
+                stmt = stmt.where(Job.xdate >= self.last_job_date)
+            for name, xdate in conn.execute(stmt).fetchall():
+                self._dirty_jobs.add(name)
+                if xdate is not None and (self.last_job_date is None or xdate > self.last_job_date):
+                    self.last_job_date = xdate
+            self._reindex_jobs(conn)
+        return self
+
+    def _reindex_jobs(self, conn):
+        names = sorted(self._dirty_jobs)
+        self._dirty_jobs.clear()
+        for i in range(0, len(names), self.chunk_size):
+            chunk = names[i:i + self.chunk_size]
+            texts = dict((name, [description]) for name, description in conn.execute(
+                select([Job.job, Job.description]).where(Job.job.in_(chunk))))
+            for key, text in conn.execute(select([Bodtext.key, Bodtext.text]).where(
+                    Bodtext.key.in_(chunk)).order_by(Bodtext.key, Bodtext.attr)):
+                if key in texts:
+                    texts[key].append(text)
+            for name in chunk:
+                doc = self._job_id(name)
+                if name in texts:
+                    self.job_index.add(doc, ' '.join(t for t in texts[name] if t))
+                else:
+                    self.job_index.remove(doc)
+
+    # Listener for JournalTailer; job text is re-read on the next update()
+    def journal_listener(self, op, table, rows):
+        if self.backend != 'memory':
+            return
+        if table.name == 'desc':
+            for row in rows:
+                if op == 'dv':
+                    self.desc_index.remove(row['descKey'])
+                else:
+                    self.desc_index.add(row['descKey'], row.get('description'))
+        elif table.name == 'job':
+            self._dirty_jobs.update(row['job'] for row in rows)
+        elif table.name == 'bodtext':
+            self._dirty_jobs.update(row['key'] for row in rows)
+
+    # Best ranked candidates first, kept when the filters pass in SQL
+    def _ranked(self, index, query, limit, fetch):
+        candidates = sorted(index.candidates(query), reverse=True)
+        found = []
+        for i in range(0, len(candidates), self.chunk_size):
+            chunk = candidates[i:i + self.chunk_size]
+            rows = fetch([doc for _, doc in chunk])
+            for score, doc in chunk:
+                for row in rows.get(doc, ()):
+                    found.append(OrderedDict(list(row.items()) + [('score', score)]))
+            if limit and len(found) >= limit:
+                break
+        return found[:limit] if limit else found
+
+    def _memory_changes(self, query, filters, limit):
+        def fetch(keys):
+            stmt = select([Change.change, Change.descKey, Change.user, Change.date,
+                           Change.stream]).where(and_(Change.descKey.in_(keys), *filters))
+            rows = {}
+            with self.engine.connect() as conn:
+                for row in conn.execute(stmt):
+                    rows.setdefault(row.descKey, []).append(row)
+            return rows
+        return self._ranked(self.desc_index, query, limit, fetch)
+
+    def _memory_jobs(self, query, filters, limit):
+        def fetch(docs):
+            names = dict((self.job_names[d], d) for d in docs)
+            stmt = select([Job.job, Job.xuser, Job.xdate, Job.xstatus]).where(
+                and_(Job.job.in_(list(names)), *filters))
+            with self.engine.connect() as conn:
+                return dict((names[row.job], [row]) for row in conn.execute(stmt))
+        return self._ranked(self.job_index, query, limit, fetch)
+
+    # --- queries ------------------------------------------------------------
+
+    def changes(self, query, user=None, stream=None, since=None, until=None, limit=20):
+        filters = []
+        if user is not None:
+            filters.append(Change.user == user)
+        if stream is not None:
+            filters.append(Change.stream == stream)
+        if since is not None:
+            filters.append(Change.date >= since)
+        if until is not None:
+            filters.append(Change.date < until)
+        if self.backend == 'postgresql':
+            return self._sql_changes(query, filters, limit)
+        return self._memory_changes(query, filters, limit)
+
+    def jobs(self, query, user=None, status=None, since=None, until=None, limit=20):
+        filters = []
+        if user is not None:
+            filters.append(Job.xuser == user)
+        if status is not None:
+            filters.append(Job.xstatus == status)
+        if since is not None:
+            filters.append(Job.xdate >= since)
+        if until is not None:
+            filters.append(Job.xdate < until)
+        if self.backend == 'postgresql':
+            return self._sql_jobs(query, filters, limit)
+        return self._memory_jobs(query, filters, limit)
+
+    # The in-process index survives restarts as a pickle; update() resumes
+    def save(self, path):
+        state = dict((k, getattr(self, k)) for k in (
+            'config', 'desc_index', 'job_index', 'job_ids', 'job_names', 'last_desc_key',
+            'last_job_date', '_dirty_jobs'))
+        with open(path, 'wb') as fh:
+            pickle.dump(state, fh, pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        with open(path, 'rb') as fh:
+            self.__dict__.update(pickle.load(fh))
+        return self
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+    import os
+
+    from perforce_model import create_engine
+
+    parser = argparse.ArgumentParser(description='Search changelist descriptions and jobs')
+    parser.add_argument('url')
+    parser.add_argument('query', nargs='?')
+    parser.add_argument('--jobs', action='store_true', help='search jobs instead of changes')
+    parser.add_argument('--user')
+    parser.add_argument('--stream')
+    parser.add_argument('--since', type=int, help='epoch seconds')
+    parser.add_argument('--until', type=int, help='epoch seconds')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--memory', action='store_true', help='use the in-process index')
+    parser.add_argument('--index-file', help='load/save the in-process index here')
+    parser.add_argument('--create-indexes', action='store_true', help='build the GIN indexes')
+    args = parser.parse_args()
+
+    search = TextSearch(create_engine(args.url), backend='memory' if args.memory else None)
+    if args.create_indexes:
+        print('\n'.join(search.create_indexes()))
+    if search.backend == 'memory':
+        if args.index_file and os.path.exists(args.index_file):
+            search.load(args.index_file)
+        search.update()
+        if args.index_file:
+            search.save(args.index_file)
+    if args.query:
+        if args.jobs:
+            found = search.jobs(args.query, user=args.user, since=args.since, until=args.until,
+                                limit=args.limit)
+        else:
+            found = search.changes(args.query, user=args.user, stream=args.stream,
+                                   since=args.since, until=args.until, limit=args.limit)
+        print(json.dumps(found, indent=2))
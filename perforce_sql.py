@@ -0,0 +1,38 @@
+# Dialect-aware bulk statements shared by the loaders and replication.
+from sqlalchemy import and_, bindparam
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+
+def primary_key(table):
+    return list(table.primary_key.columns)
+
+
+# INSERT ... ON CONFLICT DO UPDATE on PostgreSQL, INSERT OR REPLACE elsewhere
+def upsert_statement(dialect, table):
+    if dialect.name == 'postgresql':
+        stmt = pg_insert(table)
+        keys = primary_key(table)
+        others = [c for c in table.columns if not c.primary_key]
+        if not others:
+            return stmt.on_conflict_do_nothing(index_elements=keys)
+        return stmt.on_conflict_do_update(
+            index_elements=keys, set_=dict((c.name, stmt.excluded[c.name]) for c in others))
+    return table.insert().prefix_with('OR REPLACE')
+
+
+# rows are dicts keyed by column key
+def upsert(conn, table, rows):
+    if rows:
+        conn.execute(upsert_statement(conn.dialect, table), rows)
+
+
+def delete_statement(table):
+    keys = primary_key(table)
+    return table.delete().where(and_(*[c == bindparam('pk_' + c.key) for c in keys]))
+
+
+def delete(conn, table, rows):
+    if rows:
+        keys = [c.key for c in primary_key(table)]
+        conn.execute(delete_statement(table),
+                     [dict(('pk_' + k, row[k]) for k in keys) for row in rows])
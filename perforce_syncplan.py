@@ -0,0 +1,193 @@
+# Offline sync planning: what `p4 sync @change` would transfer for a client
+# and how it would spread over net.parallel threads.
+#
+#   planner = SyncPlanner(engine, threads=8)
+#   plan = planner.plan('build-ws', 123456)
+#   planner.write_sendq(plan)
+#
+# The client view (perforce_mapping) selects depot files: each mapping line's
+# literal depot prefix becomes a range scan over rev for the highest rev at
+# or below the change, or over headrev (joined to rev for the archive
+# columns) when planning to head. The result is diffed against the client's
+# have list (clientFile range '//<client>/') into adds, updates and deletes.
+# Transfers are bin-packed by size onto the threads largest first, each going
+# to the least loaded thread (LPT).
+#
+# plan_many() plans many clients at the same change in one pass: target revs
+# are fetched once per distinct view prefix and shared between clients.
+import heapq
+from collections import OrderedDict
+
+from sqlalchemy import and_, func, select
+
+from perforce_headrev import is_deleted
+from perforce_mapping import UNMAP, ViewCache
+from perforce_model import Have, HeadRev, Rev, Sendq
+from perforce_paths import prefix_range
+
+_REV_COLUMNS = ('depotFile', 'depotRev', 'type', 'action', 'change', 'date', 'digest',
+                'size', 'lbrFile', 'lbrRev', 'lbrType')
+
+
+class SyncPlan(object):
+    def __init__(self, client, change, threads):
+        self.client = client
+        self.change = change
+        self.adds = []
+        self.updates = []
+        self.deletes = []
+        self.threads = [[] for _ in range(threads)]
+        self.loads = [0] * threads
+
+    @property
+    def transfers(self):
+        return self.adds + self.updates
+
+    def assign(self):
+        heap = [(0, i) for i in range(len(self.threads))]
+        for entry in sorted(self.transfers, key=lambda e: -(e['size'] or 0)):
+            load, i = heapq.heappop(heap)
+            self.threads[i].append(entry)
+            load += entry['size'] or 0
+            self.loads[i] = load
+            heapq.heappush(heap, (load, i))
+
+    def report(self):
+        total = sum(self.loads)
+        mean = total / float(len(self.loads)) if self.loads else 0
+        return OrderedDict([
+            ('client', self.client),
+            ('change', self.change),
+            ('adds', len(self.adds)),
+            ('updates', len(self.updates)),
+            ('deletes', len(self.deletes)),
+            ('bytes', total),
+            ('threads', [OrderedDict([('thread', i), ('files', len(files)), ('bytes', load)])
+                         for i, (files, load) in enumerate(zip(self.threads, self.loads))]),
+            # 1.0 is a perfect split; the sync takes as long as the fullest thread
+            ('imbalance', round(max(self.loads) / mean, 3) if mean else 1.0),
+        ])
+
+
+class SyncPlanner(object):
+    def __init__(self, engine, threads=4, views=None):
+        self.engine = engine
+        self.threads = threads
+        self.views = views or ViewCache(engine)
+        self._targets = {}
+
+    # {depotFile: rev row dict} of the highest rev <= change under prefix
+    def _target_revs(self, conn, prefix, change):
+        key = (prefix, change)
+        cached = self._targets.get(key)
+        if cached is not None:
+            return cached
+        rev = Rev.__table__
+        if change is None:
+            head = HeadRev.__table__
+            rows = conn.execute(select(
+                [head.c[k] for k in _REV_COLUMNS if k in head.c] +
+                [rev.c[k] for k in _REV_COLUMNS if k not in head.c]).select_from(
+                    head.join(rev, and_(Rev.depotFile == HeadRev.depotFile,
+                                        Rev.depotRev == HeadRev.depotRev))).where(
+                prefix_range(HeadRev.depotFile, prefix)))
+        else:
+            latest = select([Rev.depotFile, func.max(Rev.depotRev).label('depotRev')]).where(
+                and_(prefix_range(Rev.depotFile, prefix), Rev.change <= change)) \
+                .group_by(Rev.depotFile).alias('latest')
+            rows = conn.execute(select([rev.c[k] for k in _REV_COLUMNS]).select_from(
+                rev.join(latest, and_(Rev.depotFile == latest.c.depotFile,
+                                      Rev.depotRev == latest.c.depotRev))))
+        found = self._targets[key] = dict((r['depotFile'], dict(r)) for r in rows)
+        return found
+
+    def _have(self, conn, client):
+        rows = conn.execute(select([Have.clientFile, Have.depotPath.label('depotFile'),
+                                    Have.haveRev]).where(
+            prefix_range(Have.clientFile, '//%s/' % client)))
+        return dict((r.depotFile, (r.clientFile, r.haveRev)) for r in rows)
+
+    def plan(self, client, change=None):
+        return self.plan_many([client], change)[0]
+
+    def plan_many(self, clients, change=None):
+        self._targets = {}
+        plans = []
+        with self.engine.connect() as conn:
+            for client in clients:
+                view = self.views.client(client)
+                target = {}
+                for line in view.lines:
+                    if line.flag != UNMAP and line.left.prefix:
+                        target.update(self._target_revs(conn, line.left.prefix, change))
+                plans.append(self._diff(client, change, view, target, self._have(conn, client)))
+        self._targets = {}
+        return plans
+
+    def _diff(self, client, change, view, target, have):
+        plan = SyncPlan(client, change, self.threads)
+        for depot_file, rev in target.items():
+            client_file = view.translate(depot_file)
+            if client_file is None:
+                continue
+            had = have.pop(depot_file, None)
+            deleted = is_deleted(rev['action'])
+            if deleted:
+                if had is not None:
+                    plan.deletes.append({'depotFile': depot_file, 'clientFile': had[0]})
+                continue
+            entry = dict(rev, clientFile=client_file, haveRev=had[1] if had else None)
+            if had is None:
+                plan.adds.append(entry)
+            elif had[1] != rev['depotRev']:
+                plan.updates.append(entry)
+        # had but no longer in the view or gone at the change
+        for depot_file, (client_file, _) in have.items():
+            plan.deletes.append({'depotFile': depot_file, 'clientFile': client_file})
+        plan.assign()
+        return plan
+
+    # Queue the plan's transfers as sendq rows under a new taskid; handle
+    # holds the thread number, seq runs in transfer order within a thread.
+    def write_sendq(self, plan):
+        with self.engine.begin() as conn:
+            taskid = (conn.scalar(select([func.max(Sendq.taskid)])) or 0) + 1
+            rows = []
+            seq = 0
+            for thread, entries in enumerate(plan.threads):
+                for e in entries:
+                    rows.append({
+                        'taskid': taskid, 'seq': seq, 'handle': str(thread),
+                        'depotFile': e['depotFile'], 'clientFile': e['clientFile'],
+                        'haveRev': e['haveRev'], 'type': e['type'], 'modtime': e.get('date'),
+                        'digest': e['digest'], 'size': e['size'], 'lbrFile': e.get('lbrFile'),
+                        'lbrRev': e.get('lbrRev'), 'lbrType': e.get('lbrType'), 'flags': 0,
+                        'clientType': e['type'], 'depotRev': e['depotRev'],
+                        'change': e['change'], 'date': e.get('date'),
+                    })
+                    seq += 1
+            if rows:
+                conn.execute(Sendq.__table__.insert(), rows)
+        return taskid
+
+
+if __name__ == '__main__':
+    import argparse
+    import json
+
+    from perforce_model import create_engine
+
+    parser = argparse.ArgumentParser(description='Plan a parallel sync from the metadata')
+    parser.add_argument('url')
+    parser.add_argument('clients', nargs='+')
+    parser.add_argument('--change', type=int, help='target change (default head)')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--sendq', action='store_true', help='write the plans to perforce.sendq')
+    args = parser.parse_args()
+
+    planner = SyncPlanner(create_engine(args.url), threads=args.threads)
+    for plan in planner.plan_many(args.clients, args.change):
+        report = plan.report()
+        if args.sendq:
+            report['taskid'] = planner.write_sendq(plan)
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,85 @@
+# Follow a file that the server appends to and periodically rotates
+# (journal, structured logs). Only complete lines are handed out; a rotation
+# is detected by the path pointing at a new inode or shrinking below the
+# current offset, and the old handle is drained before switching over.
+import os
+
+
+class FileFollower(object):
+    def __init__(self, path, offset=0, chunk_size=1 << 20):
+        self.path = path
+        self.offset = offset
+        self.chunk_size = chunk_size
+        self.rotations = 0
+        self._fh = None
+        self.inode = None
+        self._partial = b''
+
+    def open(self):
+        self._fh = open(self.path, 'rb')
+        self.inode = os.fstat(self._fh.fileno()).st_ino
+        self._fh.seek(self.offset)
+        self._partial = b''
+
+    def close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    # Complete lines appended since the last call; [] at end of file
+    def read(self):
+        if self._fh is None:
+            if not os.path.exists(self.path):
+                return []
+            self.open()
+        chunk = self._fh.read(self.chunk_size)
+        if not chunk:
+            return []
+        data = self._partial + chunk
+        cut = data.rfind(b'\n') + 1
+        self._partial = data[cut:]
+        self.offset = self._fh.tell() - len(self._partial)
+        return data[:cut].splitlines(True)
+
+    def rotated(self):
+        if self._fh is None:
+            return False
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return st.st_ino != self.inode or st.st_size < self.offset
+
+    # Switch to the new file at the path, starting from its beginning
+    def reopen(self):
+        self.close()
+        self.offset = 0
+        self.rotations += 1
+        if os.path.exists(self.path):
+            self.open()
+
+    # Yield lists of lines (one read(), at most chunk_size bytes) until the
+    # file is exhausted, following rotations; offset is just past the last
+    # line of each list when it is handed out. on_rotate is called between
+    # the last lines of the old file and the first of the new.
+    def chunks(self, on_rotate=None):
+        while True:
+            lines = self.read()
+            if lines:
+                yield lines
+                continue
+            if not self.rotated():
+                return
+            lines = self.read()
+            if lines:
+                yield lines
+                continue
+            self.reopen()
+            if on_rotate is not None:
+                on_rotate()
+
+    # The same, a line at a time
+    def lines(self, on_rotate=None):
+        for lines in self.chunks(on_rotate):
+            for line in lines:
+                yield line
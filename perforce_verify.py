@@ -0,0 +1,270 @@
+# Archive verification against perforce.storage / perforce.storagesh.
+#
+#   python perforce_verify.py postgresql://... /p4/root --workers 16 --report bad.jsonl
+#
+# Every librarian record (file, rev) is resolved under the archive root the
+# way p4d lays it out:
+#   <root>/<lbrFile>,d/<rev>.gz   compressed full file (gunzipped, then hashed)
+#   <root>/<lbrFile>,d/<rev>      uncompressed full file
+#   <root>/<lbrFile>,v            RCS file holding many revs (existence only)
+# and its MD5 and size compared with the recorded digest and size. Hashing
+# runs in a thread pool (hashlib and zlib drop the GIL on large buffers) or a
+# process pool, reading in large sequential chunks or through mmap.
+#
+# Records are read in primary key order, a page at a time, and results are
+# consumed in the same order, so the last contiguous key is a safe resume
+# point. It is saved in perforce.scanctl (depotPath '<name>:<table>', report
+# = last key, files = records done) after every page and on exit; the next
+# run picks up after it until the scan is finished (state 'done').
+#
+# Problems are streamed to the --report file as JSON lines, flushed before
+# each progress save; memory keeps only the counts and the first sample_size
+# problems (problems), however many files the scan covers.
+import hashlib
+import json
+import logging
+import mmap
+import os
+import time
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from sqlalchemy import select, tuple_
+
+from perforce_model import Scanctl, Storage, Storagesh
+from perforce_sql import upsert
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 8 * 1024 * 1024
+TABLES = (Storage.__table__, Storagesh.__table__)
+
+
+def archive_paths(root, lbr_file, lbr_rev):
+    base = os.path.join(root, lbr_file.lstrip('/'))
+    return (('gzip', '%s,d%s%s.gz' % (base, os.sep, lbr_rev)),
+            ('full', '%s,d%s%s' % (base, os.sep, lbr_rev)),
+            ('rcs', base + ',v'))
+
+
+# (kind, path, md5 hex or None, size or None); kind None when nothing exists
+def hash_archive(root, lbr_file, lbr_rev, chunk_size=CHUNK_SIZE, use_mmap=False):
+    for kind, path in archive_paths(root, lbr_file, lbr_rev):
+        try:
+            fh = open(path, 'rb', buffering=0)
+        except (IOError, OSError):
+            continue
+        with fh:
+            if kind == 'rcs':
+                return kind, path, None, None
+            digest = hashlib.md5()
+            size = 0
+            if kind == 'gzip':
+                inflate = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                buf = bytearray(chunk_size)
+                while True:
+                    n = fh.readinto(buf)
+                    if not n:
+                        break
+                    data = inflate.decompress(memoryview(buf)[:n])
+                    digest.update(data)
+                    size += len(data)
+                data = inflate.flush()
+                digest.update(data)
+                size += len(data)
+            elif use_mmap and os.fstat(fh.fileno()).st_size:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    digest.update(mm)
+                    size = len(mm)
+            else:
+                buf = bytearray(chunk_size)
+                view = memoryview(buf)
+                while True:
+                    n = fh.readinto(buf)
+                    if not n:
+                        break
+                    digest.update(view[:n])
+                    size += n
+            return kind, path, digest.hexdigest().upper(), size
+    return None, None, None, None
+
+
+class VerifyStats(object):
+    def __init__(self):
+        self.records = 0
+        self.ok = 0
+        self.missing = 0
+        self.mismatch = 0
+        self.unverified = 0
+        self.bytes = 0
+        self.started = time.time()
+
+    def as_dict(self):
+        seconds = time.time() - self.started
+        return OrderedDict([
+            ('records', self.records), ('ok', self.ok), ('missing', self.missing),
+            ('mismatch', self.mismatch), ('unverified', self.unverified),
+            ('bytes', self.bytes), ('seconds', round(seconds, 1)),
+            ('mb_per_sec', round(self.bytes / 1048576.0 / seconds, 1) if seconds else 0),
+        ])
+
+
+class ArchiveVerifier(object):
+    def __init__(self, engine, root, name='verify', workers=8, processes=False,
+                 chunk_size=CHUNK_SIZE, use_mmap=False, checkpoint=1000, report=None,
+                 sample_size=100):
+        self.engine = engine
+        self.root = root
+        self.name = name
+        self.workers = workers
+        self.processes = processes
+        self.chunk_size = chunk_size
+        self.use_mmap = use_mmap
+        self.checkpoint = checkpoint
+        self.report = report
+        self.sample_size = sample_size
+        self.stats = VerifyStats()
+        self.problems = []
+
+    def _scan_key(self, table):
+        return '%s:%s' % (self.name, table.name)
+
+    def _position(self, table):
+        with self.engine.connect() as conn:
+            row = conn.execute(Scanctl.__table__.select().where(
+                Scanctl.depotPath == self._scan_key(table))).first()
+        if row is None or row.state == 'done' or not row.report:
+            return None, 0
+        return tuple(json.loads(row.report)), row.files or 0
+
+    def _save(self, table, state, last, done):
+        with self.engine.begin() as conn:
+            upsert(conn, Scanctl.__table__, [{
+                'depotPath': self._scan_key(table), 'state': state, 'seq': None, 'dirs': None,
+                'files': done, 'zeros': self.stats.missing, 'dirserr': self.stats.mismatch,
+                'pri': None, 'reqpause': None, 'err': None, 'filesnonlbr': self.stats.unverified,
+                'filesage': None, 'report': json.dumps(last) if last else None,
+                'target': self.root, 'flags': None, 'reqage': None,
+            }])
+
+    def reset(self):
+        with self.engine.begin() as conn:
+            conn.execute(Scanctl.__table__.delete().where(Scanctl.depotPath.in_(
+                [self._scan_key(t) for t in TABLES])))
+
+    def run(self, tables=TABLES):
+        pool_class = ProcessPoolExecutor if self.processes else ThreadPoolExecutor
+        out = open(self.report, 'a') if self.report else None
+        try:
+            with pool_class(self.workers) as pool:
+                for table in tables:
+                    self._verify_table(pool, table, out)
+        finally:
+            if out is not None:
+                out.close()
+        return self.stats.as_dict()
+
+    def _page(self, table, after):
+        key = (table.c.file, table.c.rev, table.c.type)
+        stmt = select([table.c.file, table.c.rev, table.c.type, table.c.digest,
+                       table.c.size]).order_by(*key).limit(self.checkpoint)
+        if after is not None:
+            stmt = stmt.where(tuple_(*key) > tuple_(*after))
+        with self.engine.connect() as conn:
+            return conn.execute(stmt).fetchall()
+
+    # Pages of checkpoint records are read by key and kept two deep in the
+    # pool; no cursor stays open while progress is written.
+    def _verify_table(self, pool, table, out):
+        last, done = self._position(table)
+        if last is not None:
+            log.info('%s: resuming after %s (%d done)', table.name, last[0], done)
+        after = last
+        pending = deque()
+        exhausted = False
+        try:
+            while True:
+                if not exhausted and len(pending) < 2 * self.checkpoint:
+                    rows = self._page(table, after)
+                    exhausted = len(rows) < self.checkpoint
+                    for row in rows:
+                        pending.append((row, pool.submit(hash_archive, self.root, row[0], row[1],
+                                                         self.chunk_size, self.use_mmap)))
+                    if rows:
+                        after = list(rows[-1][:3])
+                    continue
+                if not pending:
+                    break
+                for _ in range(min(self.checkpoint, len(pending))):
+                    last = self._consume(pending.popleft(), out)
+                    done += 1
+                if out is not None:
+                    out.flush()
+                self._save(table, 'running', last, done)
+        except BaseException:
+            # results already consumed are safe to skip next time
+            for _, future in pending:
+                future.cancel()
+            if out is not None:
+                out.flush()
+            self._save(table, 'running', last, done)
+            raise
+        self._save(table, 'done', None, done)
+
+    def _consume(self, item, out):
+        row, future = item
+        kind, path, digest, size = future.result()
+        stats = self.stats
+        stats.records += 1
+        problem = None
+        if kind is None:
+            stats.missing += 1
+            problem = 'missing'
+        elif kind == 'rcs':
+            stats.unverified += 1
+        else:
+            stats.bytes += size
+            if row.digest and digest != row.digest.upper():
+                problem = 'digest'
+            elif row.size is not None and row.size >= 0 and size != row.size:
+                problem = 'size'
+            if problem:
+                stats.mismatch += 1
+            else:
+                stats.ok += 1
+        if problem:
+            entry = OrderedDict([('problem', problem), ('file', row.file), ('rev', row.rev),
+                                 ('path', path), ('expected_digest', row.digest),
+                                 ('actual_digest', digest), ('expected_size', row.size),
+                                 ('actual_size', size)])
+            if len(self.problems) < self.sample_size:
+                self.problems.append(entry)
+            if out is not None:
+                out.write(json.dumps(entry) + '\n')
+        return [row.file, row.rev, row.type]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from perforce_model import create_engine
+
+    parser = argparse.ArgumentParser(description='Verify archive files against perforce.storage')
+    parser.add_argument('url')
+    parser.add_argument('root')
+    parser.add_argument('--name', default='verify', help='scan name used for resuming')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--processes', action='store_true', help='hash in worker processes')
+    parser.add_argument('--mmap', action='store_true', help='hash uncompressed files via mmap')
+    parser.add_argument('--report', help='append problems as JSON lines to this file')
+    parser.add_argument('--restart', action='store_true', help='discard saved progress')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    verifier = ArchiveVerifier(create_engine(args.url), args.root, name=args.name,
+                               workers=args.workers, processes=args.processes,
+                               use_mmap=args.mmap, report=args.report)
+    if args.restart:
+        verifier.reset()
+    print(json.dumps(verifier.run(), indent=2))
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perforce_model import Base, create_engine  # noqa: E402
+
+
+# Every perforce table, in a fresh in-memory SQLite database
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+# The same on a file, for tests that need more than one connection
+@pytest.fixture
+def file_engine(tmp_path):
+    engine = create_engine('sqlite:///%s' % (tmp_path / 'perforce.db'))
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
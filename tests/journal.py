@@ -0,0 +1,27 @@
+# Helpers to write P4D journal records for the tests
+from sqlalchemy import BigInteger, Integer, SmallInteger
+
+from perforce_journal import journal_columns
+
+
+def record(op, table, **values):
+    fields = ['@%s@' % op, '9', '@db.%s@' % table.name]
+    for column in journal_columns(table):
+        value = values.get(column.key)
+        if isinstance(column.type, (Integer, BigInteger, SmallInteger)):
+            fields.append(str(value or 0))
+        else:
+            fields.append('@%s@' % ('' if value is None else str(value).replace('@', '@@')))
+    return ' '.join(fields) + '\n'
+
+
+def rev(op, depot_file, depot_rev, change, action='edit'):
+    from perforce_model import Rev
+
+    return record(op, Rev.__table__, depotFile=depot_file, depotRev=depot_rev, change=change,
+                  action=action, type='text', date=1000 + change)
+
+
+def append(path, *records):
+    with open(str(path), 'a') as fh:
+        fh.write(''.join(records))
@@ -0,0 +1,76 @@
+# Path-dictionary mode cases; test_paths.py runs them under PERFORCE_PATH_IDS=1
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from journal import append, rev
+from perforce_loader import CheckpointLoader
+from perforce_model import Have, IntegEd, Paths, Rev, path_ids
+from perforce_paths import PathDictionary
+from perforce_replication import JournalTailer
+
+
+def _paths(engine):
+    return dict((p, (i, parent)) for i, p, parent in engine.execute(
+        select([Paths.id, Paths.path, Paths.parent_id])))
+
+
+def test_mode_keys_on_the_ids():
+    assert path_ids()
+    assert list(Rev.__table__.primary_key.columns.keys()) == ['depotFileId', 'depotRev']
+    assert list(IntegEd.__table__.primary_key.columns.keys())[:2] == ['toFileId', 'fromFileId']
+    assert Have.__table__.c.clientFile.nullable
+
+
+def test_encode_interns_parents(engine):
+    paths = PathDictionary(engine)
+    a, b, none = paths.encode(['//depot/a/x.c', '//depot/a/y.c', None])
+    assert none is None and a != b
+    stored = _paths(engine)
+    assert stored['//depot/a/x.c'] == (a, stored['//depot/a/'][0])
+    assert stored['//depot/a/'][1] == stored['//depot/'][0]
+    assert paths.encode(['//depot/a/x.c']) == [a]
+
+
+def test_encode_is_stable_past_the_cache(engine):
+    paths = PathDictionary(engine, cache_size=2)
+    first = paths.encode(['//depot/%d/f' % i for i in range(10)])
+    assert len(paths._ids) == 2
+    assert paths.encode(['//depot/%d/f' % i for i in range(10)]) == first
+    # a fresh dictionary finds the ids already stored
+    assert PathDictionary(engine).encode(['//depot/3/f']) == [first[3]]
+    assert len(_paths(engine)) == 21
+
+
+def test_transform_keeps_strings_by_default(engine):
+    table = Have.__table__
+    columns = [table.c.clientFile, table.c.depotFile, table.c.haveRev]
+    rows = [('//ws/a.c', '//depot/a.c', 1)]
+    out_columns, out_rows = PathDictionary(engine).transform(table, columns, rows)
+    assert out_columns[:3] == columns
+    assert set(out_columns[3:]) == {table.c.clientFileId, table.c.depotFileId}
+    assert out_rows[0][:3] == rows[0] and None not in out_rows[0]
+
+
+def test_drop_strings_loads_and_reads_through_the_hybrid(file_engine, tmp_path):
+    path = tmp_path / 'checkpoint.1'
+    append(path, rev('pv', '//depot/a.c', 1, 1), rev('pv', '//depot/a.c', 2, 2))
+    loader = CheckpointLoader(file_engine)
+    loader.add_transform(PathDictionary(file_engine, drop_strings=True).transform)
+    loader.load(str(path))
+    assert file_engine.execute(select([Rev.depotFile]).distinct()).fetchall() == [(None,)]
+    session = Session(bind=file_engine)
+    revs = session.query(Rev).filter(Rev.depotPath == '//depot/a.c').all()
+    assert sorted(r.depotRev for r in revs) == [1, 2]
+    assert revs[0].depotPath == '//depot/a.c'
+    session.close()
+
+
+def test_journal_deletes_go_by_id(file_engine, tmp_path):
+    path = tmp_path / 'journal'
+    append(path, rev('pv', '//depot/a.c', 1, 1), rev('pv', '//depot/a.c', 2, 2))
+    tailer = JournalTailer(file_engine, str(path))
+    tailer.add_transform(PathDictionary(file_engine, drop_strings=True).tail_transform)
+    assert tailer.poll() == 2
+    append(path, rev('dv', '//depot/a.c', 1, 1))
+    assert tailer.poll() == 1
+    assert file_engine.execute(select([Rev.depotRev, Rev.depotFile])).fetchall() == [(2, None)]
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from sqlalchemy import bindparam, select
+
+import perforce_async
+from perforce_async import QUERIES, AsyncCorrelation, Query, SyncCorrelation, _dsn
+from perforce_log_model import CommandChange, CommandEvents
+from perforce_model import Change, Desc, Rev, User
+
+
+# Stands in for AsyncDatabase: runs the statements on the SQLite engine
+class _Database(object):
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def fetch(self, query, **params):
+        return self.engine.execute(query.stmt, params).fetchall()
+
+    async def fetchrow(self, query, **params):
+        return self.engine.execute(query.stmt, params).first()
+
+    async def fetchval(self, query, **params):
+        return self.engine.execute(query.stmt, params).scalar()
+
+
+def populate(engine):
+    engine.execute(CommandEvents.__table__.insert(), [
+        dict(cmdident='c1', user_name='alice', func='user-submit', command_start_timestamp=1,
+             is_complete=True, error_events=[]),
+        dict(cmdident='c2', user_name='bob', func='user-sync', command_start_timestamp=2,
+             is_complete=True, error_events=[])])
+    engine.execute(CommandChange.__table__.insert().values(cmdident='c1', change=7,
+                                                           source='submit'))
+    engine.execute(Change.__table__.insert().values(change=7, descKey=7, user='alice'))
+    engine.execute(Desc.__table__.insert().values(descKey=7, description='Fix it'))
+    engine.execute(User.__table__.insert().values(user='alice', email='a@example.com'))
+    engine.execute(Rev.__table__.insert(), [
+        dict(depotFile='//depot/%s' % f, depotRev=1, change=7, action='edit') for f in 'cba'])
+
+
+def test_queries_compile_to_numbered_placeholders():
+    query = Query(select([Rev.depotFile]).where(Rev.change == bindparam('change')).where(
+        Rev.depotRev > bindparam('rev', 0)))
+    assert '$1' in query.sql and '$2' in query.sql and ':' not in query.sql
+    assert query.args({'change': 5}) == [5, 0]
+    with pytest.raises(ValueError):
+        Query(select([Rev.depotFile]).where(Rev.change.in_(bindparam('c', expanding=True))))
+    assert _dsn('postgresql+psycopg2://u@h/db') == 'postgresql://u@h/db'
+
+
+def test_async_trace_matches_the_sync_trace(engine):
+    populate(engine)
+    correlation = AsyncCorrelation(_Database(engine), max_files=2)
+    traces = asyncio.run(correlation.trace_many(['c1', 'c2', 'missing'], concurrency=2))
+    expected = [SyncCorrelation(engine, max_files=2).trace(i) for i in ('c1', 'c2', 'missing')]
+    assert traces == expected
+    assert traces[0]['change']['description'] == 'Fix it'
+    assert [f['depotFile'] for f in traces[0]['files']] == ['//depot/a', '//depot/b']
+    assert traces[0]['user']['email'] == 'a@example.com'
+    assert traces[1]['resolution'] is None and traces[2]['command'] is None
+    assert set(QUERIES) == {'command', 'command_change', 'change', 'files', 'desc', 'user'}
+
+
+def test_database_needs_asyncpg(monkeypatch):
+    monkeypatch.setattr(perforce_async, 'asyncpg', None)
+    with pytest.raises(RuntimeError):
+        perforce_async.AsyncDatabase('postgresql://localhost/p4')
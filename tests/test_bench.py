@@ -0,0 +1,30 @@
+from collections import OrderedDict
+
+from sqlalchemy import func, select
+
+from perforce_bench import compare, populate, run_queries
+from perforce_model import Base, Rev, create_engine
+
+PARAMS = OrderedDict([('users', 5), ('changes', 50), ('files', 40), ('revs_per_file', 3),
+                      ('clients', 3), ('branch_ratio', 0.3), ('seed', 1)])
+
+
+def test_populate_is_seeded_and_queries_run(file_engine, tmp_path):
+    gen, populated = populate(file_engine, PARAMS)
+    assert populated['rev']['rows'] == file_engine.execute(
+        select([func.count()]).select_from(Rev.__table__)).scalar() > 0
+    assert all(result['rows'] > 0 for result in populated.values())
+    results = run_queries(file_engine, gen, runs=2)
+    assert set(results) >= {'cmdident_to_change', 'integration_history', 'files_in_change'}
+    assert all(r['runs'] == 2 and r['min_ms'] <= r['median_ms'] for r in results.values())
+
+    other = create_engine('sqlite:///%s' % (tmp_path / 'again.db'))
+    Base.metadata.create_all(other)
+    assert populate(other, PARAMS)[1]['rev']['rows'] == populated['rev']['rows']
+
+
+def test_compare_reports_median_ratios():
+    old = {'queries': {'q': {'median_ms': 2.0}, 'gone': {'median_ms': 1.0}}}
+    new = {'queries': {'q': {'median_ms': 1.0}, 'added': {'median_ms': 1.0}}}
+    lines = compare(old, new).splitlines()
+    assert len(lines) == 2 and lines[1].split()[0] == 'q' and lines[1].endswith('0.50x')
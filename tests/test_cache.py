@@ -0,0 +1,73 @@
+import pickle
+
+from perforce_cache import SpecCache
+from perforce_model import Depot, Domain, Protect, User
+
+
+def insert(engine, model, **values):
+    engine.execute(model.__table__.insert().values(**values))
+
+
+def test_read_through_and_lru(engine):
+    insert(engine, User, user='alice', updateDate=1)
+    insert(engine, User, user='bob', updateDate=1)
+    cache = SpecCache(engine, maxsize=1)
+    assert cache.get(User, 'alice').user == 'alice'
+    assert cache.get(User, 'alice').user == 'alice'
+    assert cache.get(User, 'nobody') is None
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 2, 1)
+    assert len(cache) == 1
+
+
+def test_entries_expire(engine):
+    insert(engine, User, user='alice', updateDate=1)
+    cache = SpecCache(engine, ttl=-1)
+    cache.get(User, 'alice')
+    cache.get(User, 'alice')
+    assert (cache.stats.hits, cache.stats.expirations) == (0, 1)
+
+
+def test_cached_specs_pickle(engine):
+    insert(engine, User, user='alice', email='a@example.com', updateDate=1)
+    user = pickle.loads(pickle.dumps(SpecCache(engine).get(User, 'alice')))
+    assert (user.user, user.email) == ('alice', 'a@example.com')
+
+
+def test_journal_listener_invalidates_rows_and_domain_specs(engine):
+    insert(engine, Depot, name='depot', type='local')
+    cache = SpecCache(engine)
+    cache.get(Depot, 'depot')
+    cache.journal_listener('pv', Domain.__table__, [{'name': 'depot', 'type': '100'}])
+    assert len(cache) == 0 and cache.stats.invalidations == 1
+    cache.journal_listener('pv', Domain.__table__, [{'name': 'other', 'type': '99'}])
+    assert cache.stats.invalidations == 1
+
+
+def test_refresh_drops_changed_specs(engine):
+    insert(engine, User, user='alice', updateDate=10)
+    insert(engine, Protect, seq=1, user='*', perm='write', depotFile='//...', update=10)
+    cache = SpecCache(engine)
+    assert cache.refresh() == 0
+    cache.get(User, 'alice')
+    cache.get(Protect, 1)
+    engine.execute(User.__table__.update().values(updateDate=20))
+    insert(engine, Protect, seq=2, user='*', perm='read', depotFile='//...', update=10)
+    assert cache.refresh() == 2
+    assert len(cache) == 0
+    assert cache.refresh() == 0
+
+
+def test_refresh_catches_updates_in_the_same_second(engine):
+    insert(engine, User, user='alice', updateDate=10)
+    insert(engine, Depot, name='depot', type='local')
+    cache = SpecCache(engine)
+    assert cache.refresh() == 0
+    insert(engine, User, user='bob', updateDate=10)
+    insert(engine, Domain, name='depot', type='100', updateDate=10)
+    cache.get(User, 'bob')
+    cache.get(Depot, 'depot')
+    assert cache.refresh() == 2
+    assert len(cache) == 0
+    cache.get(User, 'alice')
+    assert cache.refresh() == 0
+    assert len(cache) == 0
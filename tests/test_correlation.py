@@ -0,0 +1,47 @@
+import pytest
+
+from perforce_correlation import CorrelationIndex, parse_change_hint
+from perforce_model import Change, Rev
+
+
+@pytest.mark.parametrize('args, change', [
+    ('-c:1234', 1234),
+    ('-c1234://depot/...', 1234),
+    ('change=42:file1.txt', 42),
+    ('//depot/...@=77', 77),
+    ('//depot/...@1234', None),        # a revision spec, not the command's change
+    ('-f://depot/a.c@5', None),
+    ('', None),
+])
+def test_parse_change_hint(args, change):
+    assert parse_change_hint(args) == change
+
+
+def _cmd(ident, args='', audits=(), user='u', start=None):
+    return {'cmdident': ident, 'args': args, 'user_name': user,
+            'command_start_timestamp': start, 'command_end_timestamp': start,
+            'audit_events': [{'file': f, 'rev': r, 'filesize': 10} for f, r in audits]}
+
+
+def test_resolution_sources(engine):
+    engine.execute(Rev.__table__.insert(), [
+        dict(depotFile='//d/a', depotRev=1, change=5, size=10),
+        dict(depotFile='//d/b', depotRev=1, change=5, size=20)])
+    engine.execute(Change.__table__.insert(), [dict(change=9, descKey=9, user='t', date=1000)])
+    index = CorrelationIndex(engine)
+    index.add_commands([
+        _cmd('submit', '-c:7'),
+        _cmd('sync', '//d/...@5', audits=[('//d/a', 1), ('//d/b', 1)]),
+        _cmd('change', user='t', start=1010),
+        _cmd('late', audits=[('//d/c', 1)]),
+    ])
+    assert (index.lookup('submit').change, index.lookup('submit').source) == (7, 'args')
+    sync = index.lookup('sync')
+    assert (sync.change, sync.source, sync.file_count, sync.total_bytes) == (5, 'rev', 2, 30)
+    assert (index.lookup('change').change, index.lookup('change').source) == (9, 'time')
+    assert index.lookup('late') is None
+
+    # the rev row arrives from the journal tail
+    index.journal_listener('pv', Rev.__table__, [
+        dict(depotFile='//d/c', depotRev=1, change=6, size=1)])
+    assert index.lookup('late').change == 6
@@ -0,0 +1,57 @@
+import hashlib
+
+from sqlalchemy import and_, select
+
+from perforce_dedup import SOURCES, DedupAnalyzer, digest_ranges, path_prefix
+from perforce_model import Storage, Storageg
+
+
+def test_digest_ranges_cover_the_space():
+    ranges = digest_ranges(4)
+    assert ranges == [('00', '40'), ('40', '80'), ('80', 'C0'), ('C0', None)]
+    assert len(digest_ranges(1000)) == 256
+
+
+def test_path_prefix():
+    assert path_prefix('//depot/a/b/c.txt', 1) == '//depot/'
+    assert path_prefix('//depot/a/b/c.txt', 2) == '//depot/a/'
+    assert path_prefix('//depot/c.txt', 3) == '//depot/'
+
+
+def test_passes_scan_the_digest_indexes(engine):
+    for name, (table, _, _, digest, _, _) in SOURCES.items():
+        query = select([table]).where(and_(table.c[digest] >= 'A0', table.c[digest] < 'B0'))
+        sql = str(query.compile(engine, compile_kwargs={'literal_binds': True}))
+        plan = ' '.join(str(r) for r in engine.execute('EXPLAIN QUERY PLAN ' + sql))
+        assert 'USING INDEX idx_%s_' % name in plan, plan
+
+
+def test_lowercase_digests_spread_over_the_passes(engine):
+    shas = [hashlib.sha1(str(i).encode()).hexdigest() for i in range(64)]
+    engine.execute(Storageg.__table__.insert(), [
+        dict(repo=repo, sha=sha, type='blob', refCount=1)
+        for repo in ('//repo/a', '//repo/b') for sha in shas])
+    analyzer = DedupAnalyzer(engine, passes=4, sources=['storageg'])
+    with engine.connect() as conn:
+        per_pass = [len(list(analyzer._records(conn, lo, hi))) for lo, hi in digest_ranges(4)]
+    assert sum(per_pass) == 128 and max(per_pass) < 64
+    report = analyzer.run()
+    assert report['duplicate_groups'] == 64 and report['duplicate_records'] == 64
+
+
+def test_reclaimable_bytes(engine, tmp_path):
+    digest = 'A' * 32
+    engine.execute(Storage.__table__.insert(), [
+        dict(file='//depot/a/x', rev='1.1', type=0, digest=digest, size=100, serverSize=40,
+             refCount=2),
+        dict(file='//depot/b/x', rev='1.1', type=0, digest=digest.lower(), size=100,
+             serverSize=None, refCount=0),
+        dict(file='//depot/c/y', rev='1.1', type=0, digest='B' * 32, size=5, serverSize=None,
+             refCount=0)])
+    candidates = str(tmp_path / 'lazy.jsonl')
+    report = DedupAnalyzer(engine, passes=2, sources=['storage']).run(candidates)
+    assert report['duplicate_groups'] == 1
+    assert report['reclaimable_bytes'] == 100
+    assert report['by_depot'] == {'//depot/': 100}
+    with open(candidates) as fh:
+        assert '"file": "//depot/b/x"' in fh.read()
@@ -0,0 +1,69 @@
+import pytest
+
+from perforce_model import Rev
+
+pq = pytest.importorskip('pyarrow.parquet')
+
+from perforce_export import ParquetExporter, is_epoch  # noqa: E402
+
+
+def _revs(engine, *rows):
+    engine.execute(Rev.__table__.insert(), [
+        dict(depotFile=f, depotRev=1, change=1, date=d, action=0) for f, d in rows])
+
+
+def _exported(root):
+    table = pq.read_table(str(root / 'rev'), partitioning=None)
+    return sorted(table.column('depotFile').to_pylist())
+
+
+def test_f_timestamp2_is_not_epoch():
+    from perforce_log_model import RawEvents
+
+    assert is_epoch(RawEvents.__table__.c.f_timestamp)
+    assert not is_epoch(RawEvents.__table__.c.f_timestamp2)
+
+
+def test_incremental_picks_up_rows_in_the_same_second(engine, tmp_path):
+    exporter = ParquetExporter(engine, str(tmp_path), partitions={})
+    _revs(engine, ('//d/a', 100), ('//d/b', 200))
+    assert exporter.export(Rev, incremental=True)['rows'] == 2
+    _revs(engine, ('//d/c', 200), ('//d/d', 300))
+    second = exporter.export(Rev, incremental=True)
+    assert second['rows'] == 2 and second['mark'] == 300
+    assert exporter.export(Rev, incremental=True)['rows'] == 0
+    assert _exported(tmp_path) == ['//d/a', '//d/b', '//d/c', '//d/d']
+
+
+def test_null_key_does_not_reset_the_mark(engine, tmp_path):
+    exporter = ParquetExporter(engine, str(tmp_path), partitions={})
+    _revs(engine, ('//d/a', 100), ('//d/n', None))
+    assert exporter.export(Rev, incremental=True)['mark'] == 100
+    assert exporter.export(Rev, incremental=True)['rows'] == 0
+    assert exporter.state(Rev.__table__)['mark'] == 100
+
+
+def test_json_and_large_binary_columns(engine, tmp_path):
+    from perforce_log_model import CommandEvents, LatencySketch
+
+    engine.execute(CommandEvents.__table__.insert(), [
+        dict(cmdident='c1', command_start_timestamp=86400 * 40, func='user-sync',
+             is_complete=True, error_events=[{'f_severity': 3}], audit_events=None)])
+    engine.execute(LatencySketch.__table__.insert(), [
+        dict(bucket=0, func='user-sync', user_name='', host='', serverid='', count=1,
+             sketch=b'\x01\x00\xff')])
+    exporter = ParquetExporter(engine, str(tmp_path))
+    assert exporter.export(CommandEvents, incremental=True)['rows'] == 1
+    assert exporter.export(LatencySketch)['rows'] == 1
+    events = pq.read_table(str(tmp_path / 'command_events'), partitioning=None)
+    assert events.column('error_events').to_pylist() == ['[{"f_severity": 3}]']
+    assert events.column('audit_events').to_pylist() == [None]
+    sketches = pq.read_table(str(tmp_path / 'latency_sketch'))
+    assert sketches.column('sketch').to_pylist() == [b'\x01\x00\xff']
+
+
+def test_advance_with_nulls_last():
+    # PostgreSQL sorts NULLs after every value
+    keys = set()
+    rows, mark = ParquetExporter._advance([('a', 5), ('b', 7), ('c', None)], 1, [0], None, keys)
+    assert len(rows) == 3 and mark == 7 and keys == {('b',)}
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import select
+
+from journal import append, rev
+from perforce_headrev import HeadRevIndex
+from perforce_model import HeadRev, Rev
+from perforce_replication import JournalTailer
+
+
+def _heads(engine):
+    return dict((f, (r, d)) for f, r, d in engine.execute(
+        select([HeadRev.depotFile, HeadRev.depotRev, HeadRev.isDeleted])))
+
+
+def test_add_and_remove_revs(engine):
+    heads = HeadRevIndex(engine)
+    revs = [dict(depotFile='//d/a', depotRev=r, change=r, action='edit') for r in (1, 2)]
+    engine.execute(Rev.__table__.insert(), revs)
+    heads.add_revs(revs)
+    heads.add_revs([dict(revs[0])])               # never moves back
+    assert _heads(engine) == {'//d/a': (2, 0)}
+    engine.execute(Rev.__table__.delete().where(Rev.depotRev == 2))
+    heads.remove_revs([revs[1]])
+    assert _heads(engine) == {'//d/a': (1, 0)}
+
+
+def test_rebuild(engine):
+    engine.execute(Rev.__table__.insert(), [
+        dict(depotFile='//d/a', depotRev=1, change=1, action='add'),
+        dict(depotFile='//d/a', depotRev=2, change=2, action='delete'),
+        dict(depotFile='//d/b', depotRev=1, change=1, action='add')])
+    assert HeadRevIndex(engine).rebuild() == 2
+    assert _heads(engine) == {'//d/a': (2, 1), '//d/b': (1, 0)}
+
+
+def test_numeric_delete_actions(engine, file_engine, tmp_path):
+    heads = HeadRevIndex(engine)
+    heads.add_revs([dict(depotFile='//d/a', depotRev=1, change=1, action=2),
+                    dict(depotFile='//d/b', depotRev=1, change=1, action='8'),
+                    dict(depotFile='//d/c', depotRev=1, change=1, action='1')])
+    assert _heads(engine) == {'//d/a': (1, 1), '//d/b': (1, 1), '//d/c': (1, 0)}
+
+    # as a journal carries them
+    path = tmp_path / 'journal'
+    append(path, rev('pv', '//d/a', 1, 1, action='0'), rev('pv', '//d/a', 2, 2, action='2'))
+    tailer = JournalTailer(file_engine, str(path))
+    tailer.add_writer(HeadRevIndex(file_engine).journal_writer)
+    tailer.poll()
+    assert _heads(file_engine) == {'//d/a': (2, 1)}
+    assert HeadRevIndex(file_engine).rebuild() == 1
+    assert _heads(file_engine) == {'//d/a': (2, 1)}
+
+
+def test_depot_file_sorts_bytewise_on_postgresql():
+    from sqlalchemy.dialects import postgresql
+    from sqlalchemy.schema import CreateTable
+
+    ddl = str(CreateTable(HeadRev.__table__).compile(dialect=postgresql.dialect()))
+    assert '"depotFile" VARCHAR COLLATE "C"' in ddl
+
+
+def test_journal_writer_commits_with_the_revs(file_engine, tmp_path, monkeypatch):
+    path = tmp_path / 'journal'
+    append(path, rev('pv', '//d/a', 1, 1), rev('pv', '//d/a', 2, 2), rev('pv', '//d/b', 1, 3))
+    heads = HeadRevIndex(file_engine)
+
+    def crash(*args):
+        raise RuntimeError('crash while updating heads')
+    monkeypatch.setattr(heads, '_add_heads', crash)
+    tailer = JournalTailer(file_engine, str(path))
+    tailer.add_writer(heads.journal_writer)
+    with pytest.raises(RuntimeError):
+        tailer.poll()
+    assert file_engine.execute(select([Rev.depotFile])).fetchall() == []
+    monkeypatch.undo()
+
+    # the restart replays the batch, heads included
+    tailer = JournalTailer(file_engine, str(path))
+    tailer.add_writer(heads.journal_writer)
+    tailer.poll()
+    assert _heads(file_engine) == {'//d/a': (2, 0), '//d/b': (1, 0)}
+
+    append(path, rev('dv', '//d/a', 2, 2))
+    tailer.poll()
+    assert _heads(file_engine) == {'//d/a': (1, 0), '//d/b': (1, 0)}
@@ -0,0 +1,49 @@
+import os
+import re
+
+from sqlalchemy import Column, Index, Integer, MetaData, Table
+from sqlalchemy.dialects import postgresql
+
+from perforce_indexes import create_index_sql, create_indexes, existing_indexes, secondary_indexes
+from perforce_model import Revsh, load_all
+
+README = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'README_metadata_indexs.md')
+
+
+def test_readme_indexes_are_declared():
+    metadata = load_all()
+    missing = []
+    with open(README) as fh:
+        for name, table, cols in re.findall(
+                r'CREATE (?:UNIQUE )?INDEX (\w+) ON db\.(\w+) \(([^)]*)\)', fh.read()):
+            cols = [c.strip().strip('"') for c in cols.split(',')]
+            declared = [[c.name for c in i.columns] for i in
+                        metadata.tables['perforce.' + table].indexes]
+            # a declared index with these columns, or starting with them
+            if not any(d[:len(cols)] == cols for d in declared):
+                missing.append(name)
+    assert missing == []
+
+
+def test_revsh_change_index():
+    assert 'idx_revsh_change' in [i.name for i in Revsh.__table__.indexes]
+
+
+def test_create_indexes_on_bare_tables(engine):
+    names = [i.name for i in secondary_indexes(['revsh'])]
+    assert names == ['idx_revsh_change']
+    assert 'idx_revsh_change' in existing_indexes(engine, Revsh.__table__)
+    create_indexes(engine, tables=['revsh'])    # already there: nothing to do
+
+
+def test_concurrent_index_sql():
+    dialect = postgresql.dialect()
+    index = next(i for i in secondary_indexes() if i.name == 'idx_revsh_change')
+    assert create_index_sql(index, dialect, True).startswith(
+        'CREATE INDEX CONCURRENTLY idx_revsh_change ON perforce.revsh')
+    assert create_index_sql(index, dialect).startswith('CREATE INDEX idx_revsh_change')
+    table = Table('t', MetaData(), Column('a', Integer), schema='perforce')
+    unique = Index('idx_t_a', table.c.a, unique=True)
+    assert create_index_sql(unique, dialect, True).startswith(
+        'CREATE UNIQUE INDEX CONCURRENTLY idx_t_a ON perforce.t')
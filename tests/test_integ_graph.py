@@ -0,0 +1,37 @@
+import pytest
+
+from perforce_model import IntegEd
+from perforce_integ_graph import IntegrationGraph
+
+
+def _integ(from_file, to_file, how, change, from_rev=1, to_rev=1):
+    return dict(fromFile=from_file, toFile=to_file, how=how, change=change,
+                startFromRev=from_rev - 1, endFromRev=from_rev, startToRev=to_rev - 1,
+                endToRev=to_rev)
+
+
+@pytest.mark.parametrize('branch, merge, into', [
+    ('branch from', 'merge from', 'branch into'),
+    (2, 0, 3),
+    ('2', '0', '3'),
+])
+def test_how_codes(branch, merge, into):
+    graph = IntegrationGraph()
+    graph.add_records([
+        _integ('//d/main/a.c', '//d/rel/a.c', branch, 10),
+        _integ('//d/rel/a.c', '//d/main/a.c', into, 10),
+        _integ('//d/rel/a.c', '//d/dev/a.c', merge, 11),
+    ])
+    graph.compact()
+    assert len(graph) == 2
+    assert list(graph.ancestors('//d/dev/a.c')) == ['//d/rel/a.c', '//d/main/a.c']
+    assert set(graph.descendants('//d/main/a.c')) == {'//d/rel/a.c', '//d/dev/a.c'}
+
+
+def test_load_numeric_codes(engine):
+    engine.execute(IntegEd.__table__.insert(), [
+        _integ('//d/main/a.c', '//d/rel/a.c', '2', 10),
+        _integ('//d/rel/a.c', '//d/main/a.c', '3', 10)])
+    graph = IntegrationGraph(engine).load()
+    assert len(graph) == 1
+    assert list(graph.ancestors('//d/rel/a.c')) == ['//d/main/a.c']
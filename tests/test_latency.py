@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from perforce_latency import DDSketch, LatencyRollup
+from perforce_log_model import CommandEvents
+
+
+def test_sketch_quantiles_within_relative_error():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(3, 1) for _ in range(20000))
+    sketch = DDSketch(alpha=0.01)
+    for v in values:
+        sketch.add(v)
+    for q in (0.5, 0.95, 0.99):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.011 * exact
+    assert DDSketch().quantile(0.5) is None
+
+
+def test_sketch_merge_and_encoding():
+    a, b = DDSketch(), DDSketch()
+    for v in range(1, 501):
+        a.add(v)
+    for v in range(501, 1001):
+        b.add(v)
+    b.add(0)
+    a.merge(DDSketch.decode(b.encode()))
+    assert a.count == 1001
+    assert abs(a.quantile(0.5) - 500) <= 0.011 * 500
+
+
+def test_flush_merges_into_stored_rows(engine):
+    rollup = LatencyRollup(engine, bucket_seconds=60)
+    for lapse in range(1, 101):
+        rollup.add(30, lapse, func='user-sync', host='a')
+    rollup.add(90, 1000, func='user-sync', host='b')
+    assert rollup.flush() == 2
+    rollup.add(40, 500, func='user-sync', host='a')
+    assert rollup.flush() == 1
+    total = rollup.quantiles()
+    assert (total['count'], total['min_ms'], total['max_ms']) == (102, 1, 1000)
+    by_host = rollup.quantiles(group_by='host', func='user-sync')
+    assert by_host['a']['count'] == 101 and by_host['b']['p50'] == 1000
+    assert rollup.quantiles(since=60)['count'] == 1
+    assert rollup.quantiles(func='user-edit') == {'count': 0}
+    with pytest.raises(ValueError):
+        rollup.quantiles(group_by='client')
+
+
+def test_backfill_replaces_the_window(engine):
+    engine.execute(CommandEvents.__table__.insert(), [
+        dict(cmdident='c%d' % i, command_start_timestamp=t, command_end_timestamp=t,
+             func='user-sync', user_name='u', host='h', lapse_ms=lapse, is_complete=True,
+             error_events=[])
+        for i, (t, lapse) in enumerate(((10, 5), (20, 15), (70, 25)))])
+    rollup = LatencyRollup(engine, bucket_seconds=60)
+    rollup.add(30, 99999, func='user-sync', user='u', host='h')
+    rollup.flush()
+    assert rollup.backfill(0, 120) == 2
+    total = rollup.quantiles()
+    assert (total['count'], total['max_ms']) == (3, 25)
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import func, select
+
+from journal import append, record, rev
+from perforce_loader import CheckpointLoader, _copy_value
+from perforce_model import Change, Rev
+
+
+def test_copy_values_are_escaped():
+    assert _copy_value(None) == '\\N'
+    assert _copy_value('a\tb\\c\nd') == 'a\\tb\\\\c\\nd'
+    assert _copy_value(b'\x01\xff') == '\\\\x01ff'
+    assert _copy_value(7) == '7'
+
+
+def test_load_checkpoint_in_batches(file_engine, tmp_path):
+    path = tmp_path / 'checkpoint.1'
+    append(path, *[rev('pv', '//depot/f%d' % i, 1, i) for i in range(25)])
+    append(path, record('pv', Change.__table__, change=1, descKey=1, user='alice'),
+           rev('dv', '//depot/f0', 1, 0), '@pv@ 1 @db.nosuchtable@ @x@\n')
+    loader = CheckpointLoader(file_engine, batch_size=10, workers=2)
+    report = loader.load(str(path))
+    assert dict((r['table'], (r['rows'], r['batches'])) for r in report) == {
+        'rev': (25, 3), 'change': (1, 1)}
+    assert loader.skipped == 1 and loader.unknown == {'db.nosuchtable'}
+    assert file_engine.execute(select([func.count()]).select_from(Rev.__table__)).scalar() == 25
+    assert file_engine.execute(Change.__table__.select()).first().user == 'alice'
+
+
+def test_tables_filter_and_transforms(file_engine, tmp_path):
+    path = tmp_path / 'checkpoint.1'
+    append(path, rev('pv', '//depot/a', 1, 1),
+           record('pv', Change.__table__, change=1, descKey=1, user='alice'))
+    seen = []
+
+    def upper(table, columns, rows):
+        seen.append(table.name)
+        index = [c.key for c in columns].index('depotFile')
+        return columns, [row[:index] + (row[index].upper(),) + row[index + 1:] for row in rows]
+
+    loader = CheckpointLoader(file_engine, tables=['rev'])
+    loader.add_transform(upper)
+    loader.load(str(path))
+    assert seen == ['rev']
+    assert file_engine.execute(Rev.__table__.select()).first().depotFile == '//DEPOT/A'
+    assert file_engine.execute(select([func.count()]).select_from(Change.__table__)).scalar() == 0
+
+
+def test_write_errors_are_raised(file_engine, tmp_path):
+    path = tmp_path / 'checkpoint.1'
+    append(path, rev('pv', '//depot/a', 1, 1), rev('pv', '//depot/a', 1, 1))
+    with pytest.raises(Exception):
+        CheckpointLoader(file_engine).load(str(path))
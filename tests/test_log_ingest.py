@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+import pytest
+
+from perforce_log_ingest import COMMON_FIELDS, CommandIngester, lapse_ms
+from perforce_log_model import CommandEvents
+
+
+def _event(etype, ts, ident, *suffix, **fields):
+    row = dict((f, '') for f in COMMON_FIELDS)
+    row.update(f_eventtype=etype, f_timestamp=str(ts), f_cmdident=ident, f_user='u',
+               f_func='user-sync', f_host='h', f_serverid='s1', **fields)
+    out = io.StringIO()
+    csv.writer(out).writerow([row[f] for f in COMMON_FIELDS] + list(suffix))
+    return out.getvalue()
+
+
+def _commands(engine):
+    return dict((r.cmdident, r) for r in engine.execute(select([CommandEvents.__table__])))
+
+
+def _log(path, count, start=0):
+    with open(str(path), 'a', newline='') as fh:
+        for i in range(start, start + count):
+            fh.write(_event('1', 1000 + i, 'c%d' % i))
+            fh.write(_event('2', 1000 + i, 'c%d' % i, '500'))
+
+
+def test_ingest_file(engine, tmp_path):
+    path = tmp_path / 'all.csv'
+    with open(str(path), 'w', newline='') as fh:
+        fh.write(_event('1', 100, 'a'))
+        fh.write(_event('6', 101, 'a', 'sync', '//d/x', '3', '10'))
+        fh.write(_event('1', 102, 'b'))
+        fh.write(_event('2', 103, 'a', '1250'))
+    ingester = CommandIngester(engine)
+    assert ingester.ingest_file(str(path)) == 4
+    rows = _commands(engine)
+    assert rows['a'].is_complete and rows['a'].lapse_ms == 1250 and rows['a'].event_count == 3
+    assert len(rows['a'].audit_events) == 1
+    assert not rows['b'].is_complete
+
+
+def test_follow_reads_in_chunks_and_resumes(file_engine, tmp_path):
+    path, state = tmp_path / 'all.csv', str(tmp_path / 'offset.json')
+    _log(path, 50)
+    seen = []
+    ingester = CommandIngester(file_engine, allowed_lateness=0)
+    ingester.ingest_lines = lambda lines, ingest=ingester.ingest_lines: (
+        seen.append(len(lines)), ingest(lines))[1]
+    ingester.follow(str(path), stop=lambda: ingester.events >= 100, state_path=state,
+                    chunk_size=1024)
+    assert len(seen) > 1 and max(seen) < 100
+    assert json.load(open(state))['offset'] == path.stat().st_size
+
+    _log(path, 10, start=50)
+    again = CommandIngester(file_engine, allowed_lateness=0)
+    again.follow(str(path), stop=lambda: again.events >= 20, state_path=state)
+    assert again.events == 20
+    assert len(_commands(file_engine)) == 60
+
+
+def test_lapse_is_milliseconds():
+    assert lapse_ms('2') == lapse_ms('2.0') == 2
+    assert lapse_ms('1250.6') == 1251
+    assert lapse_ms('') is None and lapse_ms('n/a') is None
+
+
+def test_late_events_merge_into_written_commands(engine):
+    ingester = CommandIngester(engine, allowed_lateness=0)
+    ingester.ingest_lines([_event('1', 100, 'a'), _event('2', 101, 'a', '40')])
+    ingester.flush()
+    ingester.ingest_lines([_event('6', 99, 'a', 'sync', '//d/x', '3', '10')])
+    ingester.close()
+    row = _commands(engine)['a']
+    assert row.is_complete and row.lapse_ms == 40 and row.event_count == 3
+    assert row.command_start_timestamp == 99 and row.command_end_timestamp == 101
+    assert len(row.audit_events) == 1
+
+
+class _Crash(Exception):
+    pass
+
+
+def test_resume_from_the_oldest_unwritten_command(file_engine, tmp_path):
+    path, state = tmp_path / 'all.csv', str(tmp_path / 'offset.json')
+    with open(str(path), 'w', newline='') as fh:
+        fh.write(_event('1', 999, 'long'))
+    _log(path, 50)
+    ingester = CommandIngester(file_engine, allowed_lateness=0, batch_size=5)
+
+    def crash():
+        if ingester.events >= 60:
+            raise _Crash()
+    with pytest.raises(_Crash):
+        ingester.follow(str(path), stop=crash, state_path=state, chunk_size=1024)
+    saved = json.load(open(state))
+    assert saved['offset'] == 0
+    assert 0 < len(saved['written']) < 50 and 'long' not in saved['written']
+
+    with open(str(path), 'a', newline='') as fh:
+        fh.write(_event('2', 2000, 'long', '1001000'))
+    again = CommandIngester(file_engine, allowed_lateness=0, batch_size=5)
+    again.follow(str(path), stop=lambda: again.watermark >= 2000, state_path=state,
+                 chunk_size=1024)
+    rows = _commands(file_engine)
+    assert len(rows) == 51
+    assert all(r.is_complete and r.event_count == 2 for r in rows.values())
+    assert rows['long'].command_start_timestamp == 999
+    assert json.load(open(state))['offset'] == path.stat().st_size
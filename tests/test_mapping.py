@@ -0,0 +1,47 @@
+from perforce_mapping import MapTable, ViewCache
+from perforce_model import Streamviewx, View, ViewRp
+
+
+def test_translate_wildcards_and_exclusions():
+    view = MapTable([
+        ('0', '//depot/main/...', '//ws/...'),
+        ('1', '//depot/main/secret/...', '//ws/secret/...'),
+        ('0', '//depot/main/%%1/%%2.c', '//ws/src/%%2/%%1.c'),
+        ('0', '//depot/tools/*.py', '//ws/bin/*.py'),
+    ])
+    assert view.translate('//depot/main/a/b.txt') == '//ws/a/b.txt'
+    assert view.translate('//depot/main/secret/key') is None
+    assert view.translate('//depot/main/x/y.c') == '//ws/src/y/x.c'
+    assert view.translate('//depot/tools/run.py') == '//ws/bin/run.py'
+    assert view.translate('//depot/tools/sub/run.py') is None
+    assert view.translate_back('//ws/a/b.txt') == '//depot/main/a/b.txt'
+    assert view.translate_many(['//depot/main/a', None, '//other/a']) == ['//ws/a', None, None]
+
+
+def test_later_line_hides_earlier_unless_overlay():
+    hidden = MapTable([('0', '//depot/a/...', '//ws/...'), ('0', '//depot/b/...', '//ws/...')])
+    assert hidden.translate('//depot/a/f') is None
+    overlay = MapTable([('0', '//depot/a/...', '//ws/...'), ('2', '//depot/b/...', '//ws/...')])
+    assert overlay.translate('//depot/a/f') == '//ws/f'
+
+
+def test_view_cache_kinds(engine):
+    engine.execute(View.__table__.insert(), [
+        dict(name='ws', seq=0, mapFlag='0', depotFile='//depot/...', viewFile='//ws/...')])
+    engine.execute(ViewRp.__table__.insert(), [
+        dict(name='ro', seq=0, mapFlag='0', depotFile='//depot/...', viewFile='//ro/...'),
+        dict(name='ro', seq=1, mapFlag='1', depotFile='//depot/x/...', viewFile='//ro/x/...')])
+    engine.execute(Streamviewx.__table__.insert(), [
+        dict(stream='//s/main', depotPath='//s/main/lib/...', viewPath='lib/...', mapFlag='1'),
+        dict(stream='//s/main', depotPath='//s/main/...', viewPath='...', mapFlag='0')])
+    views = ViewCache(engine)
+    assert views.client('ws').translate('//depot/a') == '//ws/a'
+    ro = views.get('client_rp', 'ro')
+    assert ro.translate('//depot/a') == '//ro/a' and ro.translate('//depot/x/a') is None
+    expanded = views.get('stream_expanded', '//s/main')
+    assert expanded.translate('//s/main/a.c') == 'a.c'
+    assert expanded.translate('//s/main/lib/b.c') is None
+
+    engine.execute(View.__table__.update().values(viewFile='//other/...'))
+    views.journal_listener('pv', View.__table__, [{'name': 'ws'}])
+    assert views.client('ws').translate('//depot/a') == '//other/a'
@@ -0,0 +1,64 @@
+import pickle
+import subprocess
+import sys
+
+import perforce_model
+from perforce_model import Change, Rev, create_engine, table
+
+
+def test_models_are_module_level_names():
+    assert Rev.__qualname__ == 'Rev' and Rev.__module__ == 'perforce_model'
+    assert getattr(perforce_model, 'Rev') is Rev
+    assert table('rev') is Rev.__table__ and table('perforce.rev') is Rev.__table__
+    assert table('no_such_table') is None
+
+
+def test_instances_pickle(engine):
+    from sqlalchemy.orm import Session
+
+    session = Session(bind=engine)
+    session.add(Change(change=1, descKey=1, user='u'))
+    session.commit()
+    change = session.query(Change).get(1)
+    copy = pickle.loads(pickle.dumps(change))
+    assert (copy.change, copy.user) == (1, 'u')
+    session.close()
+
+
+# Runs code in a new interpreter, where no model has been defined yet
+def fresh(code, data=None):
+    code = 'import sys; sys.path.insert(0, %r)\n%s' % (sys.path[0], code)
+    return subprocess.run([sys.executable, '-c', code], input=data, capture_output=True,
+                          check=True).stdout.split()
+
+
+def test_unpickle_defines_the_model_in_a_fresh_process():
+    data = pickle.dumps(Rev(depotFile='//d/a', depotRev=3))
+    assert fresh('import pickle\n'
+                 'rev = pickle.loads(sys.stdin.buffer.read())\n'
+                 'print(rev.depotFile, rev.depotRev)', data) == [b'//d/a', b'3']
+
+
+def test_star_import_exports_every_model():
+    assert fresh('from perforce_model import *\n'
+                 'print(Rev.__tablename__, IntegEd.__tablename__, Base.__name__)') == [
+        b'rev', b'integed', b'Base']
+    assert {'Rev', 'Change', 'create_engine', 'load_all'} <= set(perforce_model.__all__)
+    assert 'threading' not in perforce_model.__all__
+
+
+def test_create_all_emits_every_table():
+    out = fresh('import perforce_model\n'
+                'engine = perforce_model.create_engine("sqlite://")\n'
+                'perforce_model.Base.metadata.create_all(engine)\n'
+                'print(len(engine.table_names(schema="perforce")), '
+                'len(perforce_model._factories), len(perforce_model.Base.metadata.tables))\n'
+                'perforce_model.Base.metadata.drop_all(engine)\n'
+                'print(len(engine.table_names(schema="perforce")))')
+    created, models, tables, left = map(int, out)
+    assert created == tables >= models > 100 and left == 0
+
+
+def test_sqlite_engine_attaches_the_schema():
+    engine = create_engine('sqlite://')
+    assert engine.execute("SELECT name FROM pragma_database_list WHERE name = 'perforce'").scalar()
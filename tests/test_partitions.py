@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from perforce_partitions import PartitionManager
+
+
+def test_names_and_bounds(engine):
+    daily = PartitionManager(engine)
+    assert daily.bounds(86400 * 3 + 5) == (86400 * 3, 86400 * 4)
+    assert daily.name(0) == 'raw_events_p19700101'
+    assert daily.start_of('raw_events_p19700104') == 86400 * 3
+    hourly = PartitionManager(engine, interval='hour')
+    assert hourly.name(7200) == 'raw_events_p1970010102'
+    assert hourly.start_of(hourly.name(7200)) == 7200
+    with pytest.raises(ValueError):
+        PartitionManager(engine, interval='week')
+
+
+def test_no_op_outside_postgresql(engine):
+    manager = PartitionManager(engine, retention=timedelta(days=1))
+    assert not manager.enabled
+    assert manager.existing() == {}
+    assert manager.maintain(now=86400 * 10) == ([], [])
+
+
+class _Recorder(object):
+    # Stands in for a PostgreSQL engine and its connections: records the SQL
+    # and answers the pg_inherits query with the attached partitions
+    def __init__(self, partitions):
+        self.dialect = postgresql.dialect()
+        self.partitions = partitions
+        self.statements = []
+
+    def connect(self):
+        return self
+
+    begin = connect
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, **params):
+        sql = ' '.join(str(sql).split())
+        self.statements.append(sql)
+        if 'pg_inherits' in sql:
+            assert params == {'schema': 'perforce', 'table': 'raw_events'}
+            return [(name,) for name in self.partitions]
+        return []
+
+
+def test_maintain_creates_and_expires_partitions():
+    engine = _Recorder(['raw_events_p19700101', 'raw_events_p19700109', 'other_p19700101'])
+    manager = PartitionManager(engine, retention=timedelta(days=7), ahead=1, brin=True)
+    assert manager.enabled
+    created, dropped = manager.maintain(now=86400 * 8 + 5)
+    assert created == ['raw_events_p19700110']
+    assert dropped == ['raw_events_p19700101']
+    ddl = [s for s in engine.statements if 'pg_inherits' not in s]
+    assert ddl == [
+        'CREATE TABLE IF NOT EXISTS perforce.raw_events_p19700110 PARTITION OF '
+        'perforce.raw_events FOR VALUES FROM (777600) TO (864000)',
+        'CREATE INDEX IF NOT EXISTS raw_events_p19700110_brin ON '
+        'perforce.raw_events_p19700110 USING BRIN (f_timestamp)',
+        'ALTER TABLE perforce.raw_events DETACH PARTITION perforce.raw_events_p19700101',
+        'DROP TABLE perforce.raw_events_p19700101',
+    ]
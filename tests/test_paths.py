@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from perforce_model import Have, Rev, path_ids
+from perforce_paths import PathDictionary, parent_path
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_parent_path():
+    assert parent_path('//depot/a/b.c') == '//depot/a/'
+    assert parent_path('//depot/a/') == '//depot/'
+    assert parent_path('//depot/') is None
+
+
+def test_tables_are_unchanged_outside_path_mode(engine):
+    assert not path_ids()
+    assert list(Rev.__table__.primary_key.columns.keys()) == ['depotFile', 'depotRev']
+    assert 'depotFileId' not in Have.__table__.c
+    assert not any(i.name.endswith('_file_id') for i in Have.__table__.indexes)
+    with pytest.raises(RuntimeError):
+        PathDictionary(engine)
+
+
+# The models are defined once per process, so the mode runs in its own
+def test_path_dictionary_mode():
+    env = dict(os.environ, PERFORCE_PATH_IDS='1')
+    result = subprocess.run(
+        [sys.executable, '-m', 'pytest', '-q', '-p', 'no:cacheprovider', 'paths_mode.py'],
+        cwd=HERE, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    assert result.returncode == 0, result.stdout.decode()
@@ -0,0 +1,88 @@
+from perforce_model import Group, Protect
+from perforce_protect import Protections, level_of, GRANTS
+
+
+def protect(engine, *lines):
+    engine.execute(Protect.__table__.insert(), [
+        {'seq': seq, 'isGroup': is_group, 'user': user, 'host': host, 'perm': perm,
+         'mapFlag': flag, 'depotFile': path, 'update': 1}
+        for seq, (is_group, user, host, perm, flag, path) in enumerate(lines)])
+
+
+def test_levels_follow_table_order(engine):
+    protect(engine,
+            (0, '*', '*', 'write', '0', '//...'),
+            (0, '*', '*', 'list', '1', '//secret/...'),
+            (0, '*', '*', 'write', '1', '//release/...'),
+            (0, 'alice', '*', 'read', '0', '//secret/docs/...'),
+            (0, 'admin*', '*', 'super', '0', '//...'))
+    protections = Protections(engine)
+    paths = ['//depot/a.c', '//secret/x', '//secret/docs/y', '//release/z']
+    assert protections.levels('bob', paths) == ['write', None, None, 'open']
+    assert protections.levels('alice', paths) == ['write', None, 'read', 'open']
+    assert protections.check('alice', paths, 'write') == [True, False, False, False]
+    assert protections.levels('admin1', paths) == ['super'] * 4
+
+
+def test_groups_subgroups_and_hosts(engine):
+    engine.execute(Group.__table__.insert(), [
+        {'user': 'alice', 'group': 'dev', 'type': '0'},
+        {'user': 'dev', 'group': 'eng', 'type': '1'},
+    ])
+    protect(engine,
+            (1, 'eng', '*', 'open', '0', '//depot/...'),
+            (0, '*', '10.0.*', 'read', '0', '//lab/...'))
+    protections = Protections(engine)
+    assert protections.groups_of('alice') == {'dev', 'eng'}
+    assert protections.levels('alice', ['//depot/a']) == ['open']
+    assert protections.levels('bob', ['//depot/a']) == [None]
+    assert protections.check_group('dev', ['//depot/a'], 'open') == [True]
+    assert protections.check('bob', ['//lab/x'], host='10.0.0.1') == [True]
+    assert protections.check('bob', ['//lab/x'], host='192.168.0.1') == [False]
+    assert protections.check('bob', ['//lab/x']) == [False]
+
+
+def test_exclusion_removes_level_and_above():
+    assert level_of(GRANTS['write'] & ~GRANTS['=write']) == 'open'
+    assert level_of(0) is None
+
+
+def test_refresh_and_listener_drop_compiled_tables(engine):
+    protect(engine, (0, '*', '*', 'read', '0', '//...'))
+    protections = Protections(engine)
+    assert protections.levels('bob', ['//a']) == ['read']
+    assert protections.refresh() is False
+    engine.execute(Protect.__table__.update().values(perm='write', update=2))
+    assert protections.levels('bob', ['//a']) == ['read']
+    assert protections.refresh() is True
+    assert protections.levels('bob', ['//a']) == ['write']
+    engine.execute(Protect.__table__.update().values(perm='list'))
+    protections.journal_listener('pv', Protect.__table__, [{}])
+    assert protections.levels('bob', ['//a']) == ['list']
+
+
+def test_numeric_perm_modes(engine):
+    protect(engine,
+            (0, '*', '*', 15, '0', '//...'),
+            (0, '*', '*', '1', '1', '//secret/...'),
+            (0, 'alice', '*', '3', '0', '//secret/docs/...'),
+            (0, 'admin*', '*', '63', '0', '//...'),
+            (0, '*', '*', '999', '0', '//...'))
+    protections = Protections(engine)
+    paths = ['//depot/a.c', '//secret/x', '//secret/docs/y']
+    assert protections.levels('bob', paths) == ['write', None, None]
+    assert protections.levels('alice', paths) == ['write', None, 'read']
+    assert protections.levels('admin1', paths) == ['super'] * 3
+
+
+def test_compile_survives_invalidate(engine, monkeypatch):
+    protect(engine, (0, '*', '*', 'read', '0', '//...'))
+    protections = Protections(engine)
+    groups_of = protections.groups_of
+
+    def invalidating_groups_of(*args):
+        protections.invalidate()
+        return groups_of(*args)
+    monkeypatch.setattr(protections, 'groups_of', invalidating_groups_of)
+    assert protections.levels('bob', ['//a']) == ['read']
+    assert protections._compiled == {}
@@ -0,0 +1,66 @@
+import pickle
+
+import pytest
+from sqlalchemy.engine import default, result
+
+from perforce_model import Change, Rev
+from perforce_records import read_columns, read_records, record_type, scan_records
+
+
+@pytest.fixture
+def changes(engine):
+    engine.execute(Change.__table__.insert(), [
+        dict(change=i, descKey=i, user='u%d' % (i % 2), client='c', date=1000 + i, status=1)
+        for i in range(1, 6)])
+    return engine
+
+
+def test_record_type_fields_and_pickle():
+    record = record_type(Change)
+    assert record is record_type(Change)
+    assert record.__name__ == 'ChangeRecord'
+    assert record._fields[:2] == ('change', 'descKey')
+    row = record(*range(len(record._fields)))
+    assert pickle.loads(pickle.dumps(row)) == row
+
+
+def test_read_records(changes):
+    rows = list(read_records(changes, Change, Change.change > 2, batch_size=2))
+    assert [r.change for r in rows] == [3, 4, 5]
+    assert rows[0].user == 'u1'
+
+
+def test_read_records_buffered_result_keeps_first_row(changes, monkeypatch):
+    # what stream_results gives on PostgreSQL: a proxy that pre-fetches rows
+    monkeypatch.setattr(default.DefaultExecutionContext, 'get_result_proxy',
+                        lambda self: result.BufferedRowResultProxy(self))
+    assert [r.change for r in read_records(changes, Change)] == [1, 2, 3, 4, 5]
+
+
+def test_scan_records_resumes(changes):
+    scanner, records = scan_records(changes, Change, batch_size=2, page_batches=1)
+    assert [r.change for r in records] == [1, 2, 3, 4, 5]
+    assert scanner.last_key == [5]
+    with pytest.raises(TypeError):
+        scan_records(changes, Change, columns=['change'])
+
+
+def test_read_columns(engine):
+    engine.execute(Rev.__table__.insert(), [
+        dict(depotFile='//d/a', depotRev=1, change=1, size=10),
+        dict(depotFile='//d/b', depotRev=1, change=2, size=None)])
+    cols = read_columns(engine, Rev, columns=('change', 'size', 'depotFile'))
+    assert cols['change'].typecode == 'q' and list(cols['change']) == [1, 2]
+    assert cols['size'] == [10, None]
+    assert cols['depotFile'] == ['//d/a', '//d/b']
+
+
+def test_read_columns_in_batches(engine):
+    engine.execute(Rev.__table__.insert(), [
+        dict(depotFile='//d/%d' % i, depotRev=1, change=i, size=None if i == 3 else i)
+        for i in range(5)])
+    cols = read_columns(engine, Rev, Rev.change > 0, columns=('change', 'size'), batch_size=2)
+    assert cols['change'].typecode == 'q' and list(cols['change']) == [1, 2, 3, 4]
+    assert cols['size'] == [1, 2, None, 4]
+    empty = read_columns(engine, Rev, Rev.change > 9, columns=('change',))
+    assert list(empty['change']) == []
@@ -0,0 +1,53 @@
+import pytest
+from sqlalchemy import select
+
+from journal import append, rev
+from perforce_model import Jnlack, Rev
+from perforce_replication import JournalTailer
+
+
+def _revs(engine):
+    return sorted(tuple(r) for r in engine.execute(select([Rev.depotFile, Rev.depotRev])))
+
+
+def _position(engine):
+    row = engine.execute(select([Jnlack.appliedJnl, Jnlack.appliedPos])).first()
+    return tuple(row) if row is not None else None
+
+
+def test_apply_and_resume(file_engine, tmp_path):
+    path = tmp_path / 'journal'
+    append(path, rev('pv', '//d/a', 1, 1), rev('pv', '//d/a', 2, 2))
+    tailer = JournalTailer(file_engine, str(path))
+    assert tailer.poll() == 2
+    assert _revs(file_engine) == [('//d/a', 1), ('//d/a', 2)]
+    assert _position(file_engine) == (0, path.stat().st_size)
+
+    append(path, rev('dv', '//d/a', 1, 1))
+    resumed = JournalTailer(file_engine, str(path))
+    assert resumed.poll() == 1
+    assert _revs(file_engine) == [('//d/a', 2)]
+
+
+def test_writers_share_the_batch_transaction(file_engine, tmp_path):
+    path = tmp_path / 'journal'
+    append(path, rev('pv', '//d/a', 1, 1))
+    seen = []
+
+    def failing(conn, op, table, rows):
+        seen.append(conn.execute(select([Rev.depotFile])).fetchall())
+        raise RuntimeError('writer failed')
+
+    tailer = JournalTailer(file_engine, str(path))
+    tailer.add_writer(failing)
+    with pytest.raises(RuntimeError):
+        tailer.poll()
+    # the writer saw the run, and the records and position rolled back with it
+    assert seen == [[('//d/a',)]]
+    assert _revs(file_engine) == [] and _position(file_engine) is None
+
+    replay = JournalTailer(file_engine, str(path))
+    replay.add_writer(lambda conn, op, table, rows: seen.append((op, table.name, len(rows))))
+    assert replay.poll() == 1
+    assert seen[-1] == ('pv', 'rev', 1)
+    assert _revs(file_engine) == [('//d/a', 1)]
@@ -0,0 +1,38 @@
+from perforce_log_model import CommandEvents
+from perforce_rollup import DAY, HOUR, MINUTE, CommandRollup, plan
+
+
+def _commands(engine, *rows):
+    engine.execute(CommandEvents.__table__.insert(), [
+        dict(cmdident=ident, command_start_timestamp=ts, func=func, user_name='u', host='h',
+             lapse_ms=lapse, is_complete=True, error_events=[])
+        for ident, ts, func, lapse in rows])
+
+
+def test_plan_uses_the_coarsest_pieces():
+    assert plan(DAY - 120, 2 * DAY + HOUR + 60) == [
+        (MINUTE, DAY - 120, DAY), (DAY, DAY, 2 * DAY), (HOUR, 2 * DAY, 2 * DAY + HOUR),
+        (MINUTE, 2 * DAY + HOUR, 2 * DAY + HOUR + 60)]
+    assert plan(10, 10) == []
+
+
+def test_start_timestamp_is_indexed():
+    indexed = [list(i.columns) for i in CommandEvents.__table__.indexes]
+    assert [CommandEvents.__table__.c.command_start_timestamp] in indexed
+
+
+def test_refresh_and_query(engine):
+    _commands(engine, ('a', 30, 'user-sync', 100), ('b', 90, 'user-sync', 300),
+              ('c', HOUR + 5, 'user-submit', 50), ('d', DAY + 5, 'user-sync', 10))
+    cubes = CommandRollup(engine)
+    cubes.rebuild()
+    totals = cubes.query(0, 2 * DAY, group_by=('func',))
+    assert [(r['func'], r['commands'], r['lapse_sum_ms']) for r in totals] == [
+        ('user-submit', 1, 50), ('user-sync', 3, 410)]
+    assert cubes.query(0, 60)[0]['commands'] == 1
+
+    # a late command below the last minute is picked up by refresh()
+    _commands(engine, ('e', DAY + 1, 'user-sync', 20))
+    cubes.refresh()
+    day = cubes.query(DAY, 2 * DAY, func='user-sync')[0]
+    assert day['commands'] == 2 and day['avg_lapse_ms'] == 15.0
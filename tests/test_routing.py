@@ -0,0 +1,100 @@
+import shutil
+import time
+
+import pytest
+from sqlalchemy import text
+
+from perforce_model import Change, Jnlack, create_engine, load_all
+from perforce_routing import Router
+
+
+def _position(engine, pos):
+    with engine.begin() as conn:
+        conn.execute(Jnlack.__table__.delete())
+        conn.execute(Jnlack.__table__.insert(), serverId='mirror', appliedJnl=1,
+                     appliedPos=pos, lastUpdate=int(time.time()))
+
+
+@pytest.fixture
+def router(tmp_path):
+    primary = str(tmp_path / 'primary.db')
+    engine = create_engine('sqlite:///' + primary)
+    load_all().create_all(engine, tables=[Change.__table__, Jnlack.__table__])
+    engine.execute(Change.__table__.insert(), [
+        dict(change=i, descKey=i, user='u', client='c', date=i, status=1) for i in range(1, 6)])
+    _position(engine, 1000)
+    engine.dispose()
+    shutil.copy(primary, str(tmp_path / 'replica.db'))
+    router = Router('sqlite:///' + primary, {'r1': 'sqlite:///%s' % (tmp_path / 'replica.db')},
+                    max_lag_bytes=100, max_lag_seconds=None, check_interval=0)
+    yield router
+    router.primary.dispose()
+    for replica in router.replicas:
+        replica.engine.dispose()
+
+
+def _statements(router):
+    return dict((name, route['statements']) for name, route in router.metrics()['routes'].items())
+
+
+def test_reads_go_to_a_replica(router):
+    session = router.session()
+    assert session.query(Change).get(2).user == 'u'
+    assert session.get_bind(clause=Change.__table__.select()) is router.replicas[0].engine
+    assert _statements(router) == {'primary': 0, 'r1': 1}
+    session.close()
+
+
+def test_writes_pin_the_session_to_the_primary(router):
+    session = router.session()
+    change = session.query(Change).get(3)
+    change.user = 'v'
+    session.commit()
+    assert session.query(Change).get(3).user == 'v'
+    decisions = router.metrics()['decisions']
+    assert decisions['primary_write'] >= 1 and decisions['primary_pinned'] == 1
+    session.close()
+    assert router.session().query(Change).get(3).user == 'u'   # the stale replica copy
+
+
+def test_write_statements_route_to_the_primary(router):
+    session = router.session()
+    assert session.get_bind(clause=Change.__table__.update()) is router.primary
+    assert session.get_bind(clause=text('DELETE FROM change')) is router.primary
+    assert session.get_bind(clause=Change.__table__.select().with_for_update()) is router.primary
+    assert session.get_bind() is router.primary
+
+
+def test_lagging_replica_falls_back_to_the_primary(router):
+    _position(router.primary, 5000)
+    session = router.session()
+    session.query(Change).get(1)
+    metrics = router.metrics()
+    assert metrics['decisions']['primary_fallback'] == 1
+    assert metrics['replicas']['r1']['healthy'] is False
+    assert metrics['replicas']['r1']['lag_bytes'] == 4000
+
+
+def test_metrics_reset_keeps_counting(router):
+    session = router.session()
+    session.query(Change).get(1)
+    router.metrics(reset=True)
+    assert _statements(router) == {'primary': 0, 'r1': 0}
+    session.query(Change).get(2)
+    session.query(Change).get(3)
+    assert _statements(router) == {'primary': 0, 'r1': 2}
+    assert router.metrics()['decisions']['replica'] == 2
+
+
+def test_replica_stays_routable_while_it_is_checked(router, monkeypatch):
+    assert router.check() == ['r1']
+    replica, position = router.replicas[0], router._position
+    seen = []
+
+    def observed(engine):
+        if engine is replica.engine:
+            seen.append((replica.healthy, replica.lag_bytes))
+        return position(engine)
+    monkeypatch.setattr(router, '_position', observed)
+    assert router.check() == ['r1']
+    assert seen == [(True, 0)]
@@ -0,0 +1,56 @@
+import pytest
+
+from perforce_model import Rev
+from perforce_scan import KeysetScan
+
+
+def populate(engine):
+    engine.execute(Rev.__table__.insert(), [
+        {'depotFile': '//depot/%s' % name, 'depotRev': r, 'change': c, 'digest': 'D%d' % c}
+        for c, (name, r) in enumerate(((n, r) for n in 'abc' for r in (1, 2, 3)), 1)])
+
+
+def test_pages_in_key_order(engine):
+    populate(engine)
+    scan = KeysetScan(engine, Rev, columns=('depotFile', 'depotRev', 'change'), batch_size=2,
+                      page_batches=2)
+    rows = list(scan)
+    assert len(rows) == 9 and scan.rows == 9
+    assert rows == sorted(rows)
+    assert rows[0] == ('//depot/a', 1, 1)
+    assert scan.last_key == ['//depot/c', 3]
+    assert [len(b) for b in KeysetScan(engine, Rev, batch_size=4).batches()] == [4, 4, 1]
+
+
+def test_resume_after_a_key(engine):
+    populate(engine)
+    first = KeysetScan(engine, Rev, columns=('change',), batch_size=4)
+    batches = first.batches()
+    next(batches)
+    resumed = KeysetScan(engine, Rev, columns=('change',), after=first.last_key)
+    assert [c for c, in resumed] == [5, 6, 7, 8, 9]
+
+
+def test_where_and_writes_while_scanning(engine):
+    populate(engine)
+    scan = KeysetScan(engine, Rev, columns=('depotFile', 'depotRev'),
+                      where=Rev.depotRev == 3, batch_size=1, page_batches=1)
+    for depot_file, depot_rev in scan:
+        engine.execute(Rev.__table__.update().where(Rev.depotFile == depot_file).values(
+            digest='X'))
+    assert scan.rows == 3
+    assert engine.execute("SELECT count(*) FROM perforce.rev WHERE digest = 'X'").scalar() == 9
+
+
+def test_record_batches_of_json_and_binary_columns(engine):
+    pytest.importorskip('pyarrow')
+    from perforce_log_model import CommandEvents, LatencySketch
+
+    engine.execute(CommandEvents.__table__.insert().values(
+        cmdident='c1', command_start_timestamp=1, is_complete=True, error_events=[1, 2]))
+    engine.execute(LatencySketch.__table__.insert().values(
+        bucket=0, func='', user_name='', host='', serverid='', sketch=b'\x00\x01'))
+    events = KeysetScan(engine, CommandEvents, columns=('cmdident', 'error_events'))
+    assert next(events.record_batches()).column(1).to_pylist() == ['[1, 2]']
+    sketches = KeysetScan(engine, LatencySketch, columns=('sketch',))
+    assert next(sketches.record_batches()).column(0).to_pylist() == [b'\x00\x01']
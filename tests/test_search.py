@@ -0,0 +1,80 @@
+from perforce_model import Bodtext, Change, Desc, Job
+from perforce_search import PostingIndex, TextSearch, tokenize
+
+
+def test_tokenize_drops_stop_words_and_single_letters():
+    assert tokenize('Fix the crash in X11 login_page') == ['fix', 'crash', 'x11', 'login_page']
+    assert tokenize(None) == []
+
+
+def test_posting_index_matches_all_words_and_handles_rewrites():
+    index = PostingIndex()
+    index.add(1, 'crash on startup')
+    index.add(2, 'crash crash on exit')
+    index.add(3, 'startup time')
+    assert sorted(doc for _, doc in index.candidates('crash startup')) == [1]
+    ranked = sorted(index.candidates('crash'), reverse=True)
+    assert [doc for _, doc in ranked] == [2, 1]
+
+    index.add(1, 'memory leak')          # rewritten: tombstoned plus delta
+    assert list(index.candidates('crash startup')) == []
+    assert [doc for _, doc in index.candidates('leak')] == [1]
+    index.remove(3)
+    index.compact()
+    assert not index.removed and not index.delta
+    assert [doc for _, doc in index.candidates('leak')] == [1]
+    assert list(index.candidates('time')) == []
+    assert len(index) == 2
+
+
+def populate(engine):
+    engine.execute(Desc.__table__.insert(), [
+        {'descKey': 1, 'description': 'Fix crash in the login page'},
+        {'descKey': 2, 'description': 'Speed up login'},
+        {'descKey': 3, 'description': 'Fix crash on exit'},
+    ])
+    engine.execute(Change.__table__.insert(), [
+        {'change': c, 'descKey': c, 'user': u, 'date': 1000 * c, 'stream': '//s/main'}
+        for c, u in ((1, 'alice'), (2, 'bob'), (3, 'bob'))])
+    engine.execute(Job.__table__.insert(), [
+        {'job': 'job1', 'xuser': 'alice', 'xdate': 10, 'xstatus': 'open',
+         'description': 'Login times out'},
+        {'job': 'job2', 'xuser': 'bob', 'xdate': 20, 'xstatus': 'closed',
+         'description': 'Crash report'},
+    ])
+    engine.execute(Bodtext.__table__.insert(), [
+        {'key': 'job2', 'attr': 105, 'text': 'seen after login'}])
+
+
+def test_changes_and_jobs_in_memory(engine):
+    populate(engine)
+    search = TextSearch(engine).update()
+    assert search.backend == 'memory'
+    assert sorted(r['change'] for r in search.changes('fix crash')) == [1, 3]
+    assert [r['change'] for r in search.changes('fix crash', user='bob')] == [3]
+    assert [r['change'] for r in search.changes('login', until=2000)] == [1]
+    assert sorted(r['job'] for r in search.jobs('login')) == ['job1', 'job2']
+    assert [r['job'] for r in search.jobs('login', status='open')] == ['job1']
+
+
+def test_listener_and_incremental_update(engine):
+    populate(engine)
+    search = TextSearch(engine).update()
+    search.journal_listener('dv', Desc.__table__, [{'descKey': 3}])
+    assert [r['change'] for r in search.changes('crash')] == [1]
+    engine.execute(Desc.__table__.insert().values(descKey=4, description='Another crash'))
+    engine.execute(Change.__table__.insert().values(change=4, descKey=4, user='carol', date=4000))
+    engine.execute(Job.__table__.update().where(Job.job == 'job1').values(
+        xdate=30, description='Crash at login'))
+    search.update()
+    assert sorted(r['change'] for r in search.changes('crash')) == [1, 4]
+    assert sorted(r['job'] for r in search.jobs('crash')) == ['job1', 'job2']
+
+
+def test_save_and_load(engine, tmp_path):
+    populate(engine)
+    path = str(tmp_path / 'search.idx')
+    TextSearch(engine).update().save(path)
+    search = TextSearch(engine).load(path)
+    assert search.last_desc_key == 3
+    assert sorted(r['change'] for r in search.changes('crash')) == [1, 3]
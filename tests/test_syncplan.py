@@ -0,0 +1,79 @@
+from perforce_headrev import HeadRevIndex
+from perforce_model import Have, Rev, Sendq, View
+from perforce_syncplan import SyncPlan, SyncPlanner
+
+
+def revs(engine, *rows):
+    engine.execute(Rev.__table__.insert(), [
+        {'depotFile': f, 'depotRev': r, 'change': c, 'action': a, 'type': 'text', 'date': c,
+         'digest': 'D%d' % c, 'size': s, 'lbrFile': f, 'lbrRev': '1.%d' % c, 'lbrType': 'text'}
+        for f, r, c, a, s in rows])
+
+
+def setup(engine):
+    engine.execute(View.__table__.insert(), [
+        dict(name='ws', seq=0, mapFlag='0', depotFile='//depot/main/...', viewFile='//ws/...'),
+        dict(name='ws', seq=1, mapFlag='1', depotFile='//depot/main/big/...',
+             viewFile='//ws/big/...')])
+    revs(engine,
+         ('//depot/main/a', 1, 1, 'add', 10),
+         ('//depot/main/a', 2, 5, 'edit', 20),
+         ('//depot/main/b', 1, 1, 'add', 30),
+         ('//depot/main/c', 1, 2, 'add', 40),
+         ('//depot/main/c', 2, 6, '2', 0),
+         ('//depot/main/d', 1, 3, 'add', 50),
+         ('//depot/main/big/x', 1, 1, 'add', 1000),
+         ('//depot/other/e', 1, 1, 'add', 60))
+    engine.execute(Have.__table__.insert(), [
+        {'clientFile': '//ws/a', 'depotFile': '//depot/main/a', 'haveRev': 1},
+        {'clientFile': '//ws/b', 'depotFile': '//depot/main/b', 'haveRev': 1},
+        {'clientFile': '//ws/c', 'depotFile': '//depot/main/c', 'haveRev': 1},
+        {'clientFile': '//ws/gone', 'depotFile': '//depot/main/gone', 'haveRev': 1}])
+
+
+def test_plan_diffs_the_have_list(engine):
+    setup(engine)
+    plan = SyncPlanner(engine, threads=2).plan('ws', 6)
+    assert [e['depotFile'] for e in plan.adds] == ['//depot/main/d']
+    assert [(e['depotFile'], e['haveRev'], e['depotRev']) for e in plan.updates] == [
+        ('//depot/main/a', 1, 2)]
+    assert sorted(e['clientFile'] for e in plan.deletes) == ['//ws/c', '//ws/gone']
+    earlier = SyncPlanner(engine).plan('ws', 4)
+    assert [e['depotFile'] for e in earlier.adds] == ['//depot/main/d']
+    assert earlier.updates == []
+    assert [e['clientFile'] for e in earlier.deletes] == ['//ws/gone']
+
+
+def test_transfers_are_packed_largest_first():
+    plan = SyncPlan('ws', None, 2)
+    plan.adds = [{'size': s} for s in (5, 4, 3, 3, 3)]
+    plan.assign()
+    assert sorted(plan.loads) == [8, 10]
+    report = plan.report()
+    assert report['bytes'] == 18 and report['imbalance'] == round(10 / 9.0, 3)
+
+
+def test_write_sendq(engine):
+    setup(engine)
+    planner = SyncPlanner(engine, threads=2)
+    plan = planner.plan('ws', 6)
+    assert planner.write_sendq(plan) == 1
+    rows = engine.execute(Sendq.__table__.select().order_by(Sendq.seq)).fetchall()
+    assert [(r.depotFile, r.depotRev) for r in rows] == [('//depot/main/d', 1),
+                                                         ('//depot/main/a', 2)]
+    assert sorted(r.handle for r in rows) == ['0', '1']
+    assert planner.write_sendq(plan) == 2
+
+
+def test_plan_to_head_carries_the_archive_columns(engine):
+    setup(engine)
+    HeadRevIndex(engine).rebuild()
+    planner = SyncPlanner(engine)
+    plan = planner.plan('ws')
+    assert [e['depotFile'] for e in plan.adds] == ['//depot/main/d']
+    assert sorted(e['clientFile'] for e in plan.deletes) == ['//ws/c', '//ws/gone']
+    planner.write_sendq(plan)
+    rows = engine.execute(Sendq.__table__.select().order_by(Sendq.depotFile)).fetchall()
+    assert [(r.depotFile, r.lbrFile, r.lbrRev, r.lbrType) for r in rows] == [
+        ('//depot/main/a', '//depot/main/a', '1.5', 'text'),
+        ('//depot/main/d', '//depot/main/d', '1.3', 'text')]
@@ -0,0 +1,49 @@
+import gzip
+import hashlib
+import json
+import os
+
+from sqlalchemy import select
+
+from perforce_model import Scanctl, Storage
+from perforce_verify import ArchiveVerifier, hash_archive
+
+
+def _archive(root, lbr_file, rev, data, compress=False):
+    directory = os.path.join(str(root), lbr_file.lstrip('/') + ',d')
+    os.makedirs(directory, exist_ok=True)
+    if compress:
+        with gzip.open(os.path.join(directory, rev + '.gz'), 'wb') as fh:
+            fh.write(data)
+    else:
+        with open(os.path.join(directory, rev), 'wb') as fh:
+            fh.write(data)
+    return dict(file=lbr_file, rev=rev, type=0, digest=hashlib.md5(data).hexdigest().upper(),
+                size=len(data))
+
+
+def test_hash_archive(tmp_path):
+    record = _archive(tmp_path, '//d/a.c', '1.1', b'hello', compress=True)
+    kind, _, digest, size = hash_archive(str(tmp_path), '//d/a.c', '1.1')
+    assert (kind, digest, size) == ('gzip', record['digest'], 5)
+    assert hash_archive(str(tmp_path), '//d/none', '1.1') == (None, None, None, None)
+
+
+def test_problems_stream_to_the_report(engine, tmp_path):
+    root = tmp_path / 'root'
+    rows = [_archive(root, '//d/f%02d' % i, '1.%d' % i, b'x' * i) for i in range(1, 11)]
+    rows[2]['digest'] = '0' * 32
+    rows.append(dict(file='//d/missing', rev='1.1', type=0, digest=None, size=1))
+    rows.append(dict(file='//d/missing2', rev='1.1', type=0, digest=None, size=1))
+    engine.execute(Storage.__table__.insert(), rows)
+    report = str(tmp_path / 'bad.jsonl')
+    verifier = ArchiveVerifier(engine, str(root), workers=2, checkpoint=4, report=report,
+                               sample_size=2)
+    stats = verifier.run(tables=(Storage.__table__,))
+    assert (stats['records'], stats['ok'], stats['mismatch'], stats['missing']) == (12, 9, 1, 2)
+    assert len(verifier.problems) == 2
+    with open(report) as fh:
+        problems = [json.loads(line) for line in fh]
+    assert sorted(p['problem'] for p in problems) == ['digest', 'missing', 'missing']
+    state = engine.execute(select([Scanctl.state, Scanctl.files])).first()
+    assert tuple(state) == ('done', 12)